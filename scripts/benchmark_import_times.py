@@ -0,0 +1,82 @@
+"""Measure the import time of each wisc_ecephys_tools submodule, and fail if any exceeds
+its budget.
+
+Each submodule is imported in a fresh interpreter, so times include everything the
+submodule pulls in (ecephys, pandas, ...). The best of several runs is compared with the
+budget, to reduce noise from the filesystem cache. Budgets are generous by design: they
+are meant to catch regressions like an eager import of brainglobe or matplotlib, not
+small fluctuations. Recalibrate them (e.g. with --scale) on slow machines.
+
+Exits with status 1 if any submodule is over budget.
+
+example:
+
+python benchmark_import_times.py --repeats 5
+python benchmark_import_times.py --scale 2.0 wisc_ecephys_tools.rats.utils
+"""
+
+import argparse
+import subprocess
+import sys
+
+# Budgets in milliseconds, for a cold interpreter on a cluster node.
+BUDGETS_MS = {
+    "wisc_ecephys_tools": 1500,
+    "wisc_ecephys_tools.rats": 1500,
+    "wisc_ecephys_tools.rats.constants": 1500,
+    "wisc_ecephys_tools.rats.utils": 2500,
+    "wisc_ecephys_tools.rats.manifest": 2500,
+    "wisc_ecephys_tools.rats.exp_hgs": 3000,
+    "wisc_ecephys_tools.rats.cnd_hgs": 3000,
+    "wisc_ecephys_tools.rats.sortings": 3000,
+    "wisc_ecephys_tools.rats.pipeline": 1500,
+}
+
+CODE = """
+import time
+t0 = time.perf_counter()
+import {module}
+print(time.perf_counter() - t0)
+"""
+
+
+def time_import(module: str) -> float:
+    out = subprocess.run(
+        [sys.executable, "-c", CODE.format(module=module)],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "modules", nargs="*", help="Submodules to check. Defaults to all budgeted ones."
+    )
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument(
+        "--scale", type=float, default=1.0, help="Multiply every budget by this."
+    )
+    args = parser.parse_args()
+
+    modules = args.modules or list(BUDGETS_MS)
+    over_budget = []
+    for module in modules:
+        best_ms = 1000 * min(time_import(module) for _ in range(args.repeats))
+        budget_ms = BUDGETS_MS.get(module, float("inf")) * args.scale
+        status = "OK" if best_ms <= budget_ms else "OVER BUDGET"
+        print(f"{module:<40} {best_ms:8.1f} ms  (budget {budget_ms:8.1f} ms)  {status}")
+        if best_ms > budget_ms:
+            over_budget.append(module)
+
+    if over_budget:
+        print(
+            f"\n{len(over_budget)} submodule(s) over budget: {', '.join(over_budget)}"
+        )
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
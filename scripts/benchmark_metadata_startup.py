@@ -0,0 +1,68 @@
+"""Compare the cost of building the project and subject libraries from their YAML and
+parquet sources with the cost of loading them from compiled bundles.
+
+Each measurement runs in a fresh interpreter, like a short-lived cluster job would.
+
+example:
+
+python benchmark_metadata_startup.py --repeats 5
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+
+SETUP = """
+import time
+from ecephys import wne
+from ecephys.wne import sglx
+from wisc_ecephys_tools import bundles, projects, subjects
+"""
+
+FROM_SOURCES = """
+t0 = time.perf_counter()
+projects_file = str(projects.projects.get_projects_file())
+sglx.SGLXProjectLibrary(projects_file)
+wne.ProjectLibrary(projects_file)
+sglx.SGLXSubjectLibrary(subjects.get_subjects_directory())
+print(time.perf_counter() - t0)
+"""
+
+FROM_BUNDLES = """
+t0 = time.perf_counter()
+projects_file = str(projects.projects.get_projects_file())
+projects.projects.get_sglx_project_library(projects_file)
+projects.projects.get_wne_project_library(projects_file)
+subjects.get_subject_library()
+print(time.perf_counter() - t0)
+"""
+
+
+def time_in_fresh_interpreter(code: str) -> float:
+    out = subprocess.run(
+        [sys.executable, "-c", SETUP + code],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    time_in_fresh_interpreter(FROM_BUNDLES)  # Make sure bundles are compiled.
+
+    for label, code in [("from sources", FROM_SOURCES), ("from bundles", FROM_BUNDLES)]:
+        times = [time_in_fresh_interpreter(code) for _ in range(args.repeats)]
+        print(
+            f"{label:>14}: median {1000 * statistics.median(times):8.1f} ms, "
+            f"min {1000 * min(times):8.1f} ms (n={args.repeats})"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""Bring the cohort-wide condition durations table up to date (see
+`wisc_ecephys_tools.rats.pipeline.get_condition_durations`), and print the durations of
+the requested conditions, one row per subject and column per probe.
+
+Only experiment-subjects whose source hypnograms, params, or condition parameters have
+changed since the table was last updated are recomputed.
+
+example:
+
+python build_condition_durations.py --max-workers 8 --conditions Early.REC.NREM Late.SD
+"""
+
+import argparse
+
+import pandas as pd
+
+from wisc_ecephys_tools.rats.constants import SleepDeprivationExperiments as Exps
+from wisc_ecephys_tools.rats.pipeline import get_condition_durations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--experiments", type=str, nargs="+", default=[e.value for e in Exps]
+    )
+    parser.add_argument("--conditions", type=str, nargs="*", default=[])
+    parser.add_argument("--max-workers", type=int, default=None)
+    args = parser.parse_args()
+
+    df = get_condition_durations.update_condition_durations(
+        experiment_filter=set(args.experiments), max_workers=args.max_workers
+    )
+    print(f"{len(df)} rows -> {get_condition_durations.get_condition_durations_file()}")
+    pd.set_option("display.max_rows", 500)
+    for condition in args.conditions:
+        table = df[df["condition"] == condition].pivot_table(
+            "duration", index=["experiment", "subject"], columns="probe"
+        )
+        print(f"\n{condition} (s):\n{table.round(1)}")
+
+
+if __name__ == "__main__":
+    main()
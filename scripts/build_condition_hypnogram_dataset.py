@@ -0,0 +1,42 @@
+"""Copy the per-probe and consensus condition hypnogram files of an experiment into the
+cohort-wide condition hypnogram dataset (see `wisc_ecephys_tools.rats.cnd_dataset`).
+
+Only needed for hypnograms computed before the pipeline started writing to the dataset
+itself. Condition names are normalized as they are copied.
+
+example:
+
+python build_condition_hypnogram_dataset.py novel_objects_deprivation
+"""
+
+import argparse
+
+import wisc_ecephys_tools as wet
+from wisc_ecephys_tools.rats import cnd_dataset, cnd_hgs, utils
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("experiment", type=str)
+    args = parser.parse_args()
+
+    s3 = wet.get_sglx_project("shared")
+    tuples = utils.get_subject_experiment_probe_tuples(
+        experiment_filter=args.experiment
+    )
+    subjects = sorted({(subject, experiment) for subject, experiment, _ in tuples})
+    targets = [(s, e, p) for s, e, p in tuples] + [(s, e, None) for s, e in subjects]
+    for subject, experiment, probe in targets:
+        try:
+            hgs = cnd_hgs.load_statistical_condition_hypnograms(
+                subject, experiment, probe, project=s3
+            )
+        except FileNotFoundError:
+            print(f"{subject} {probe or 'consensus'}: Skipped, no file found.")
+            continue
+        path = cnd_dataset.write_condition_hypnograms(hgs, experiment, subject, probe)
+        print(f"{subject} {probe or 'consensus'}: {len(hgs)} conditions -> {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Check that `CompactHypnogram`'s trim/keep_states/keep_first/keep_last match
+`FloatHypnogram`'s, on the conservative hypnogram of every subject/probe of an
+experiment, and report the time and memory taken by each.
+
+Each hypnogram is put through the same chains of operations used by
+`cnd_hgs.compute_statistical_condition_hypnograms`, over random windows. Exits with
+status 1 if any result differs.
+
+example:
+
+python compare_compact_hypnograms.py novel_objects_deprivation --n-windows 50
+"""
+
+import argparse
+import sys
+import time
+
+import numpy as np
+
+import wisc_ecephys_tools as wet
+from wisc_ecephys_tools.rats import exp_hgs, utils
+from wisc_ecephys_tools.rats.compact_hgs import CompactHypnogram
+
+_1h = 3600.0
+_10min = 600.0
+CHAINS = [
+    (["Wake", "NREM"], "keep_first", _1h),
+    (["Wake", "NREM"], "keep_last", _1h),
+    (["Wake"], "keep_first", _1h),
+    (["NREM"], "keep_last", _1h),
+    (["REM"], "keep_first", _10min),
+    (["REM"], "keep_last", _10min),
+]
+
+
+def _equal(a, b) -> bool:
+    a = a[["state", "start_time", "end_time"]].reset_index(drop=True)
+    b = b[["state", "start_time", "end_time"]].reset_index(drop=True)
+    return (
+        len(a) == len(b)
+        and (a["state"].to_numpy() == b["state"].to_numpy()).all()
+        and np.allclose(a["start_time"], b["start_time"])
+        and np.allclose(a["end_time"], b["end_time"])
+    )
+
+
+def _run(hg, windows):
+    out = []
+    for t1, t2 in windows:
+        trimmed = hg.trim(t1, t2)
+        for states, method, duration in CHAINS:
+            out.append(getattr(trimmed.keep_states(states), method)(duration))
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("experiment", type=str)
+    parser.add_argument("--n-windows", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    s3 = wet.get_sglx_project("shared")
+    rng = np.random.default_rng(args.seed)
+    n_mismatched = 0
+    t_float = 0.0
+    t_compact = 0.0
+    for subject, experiment, probe in utils.get_subject_experiment_probe_tuples(
+        experiment_filter=args.experiment
+    ):
+        sglx_subject = wet.get_sglx_subject(subject)
+        try:
+            hg = exp_hgs.get_conservative_hypnogram(s3, experiment, sglx_subject, probe)
+        except Exception as e:
+            print(f"{subject} {probe}: Skipped, could not load hypnogram ({e})")
+            continue
+        t_min, t_max = hg["start_time"].min(), hg["end_time"].max()
+        starts = rng.uniform(t_min, t_max, args.n_windows)
+        ends = starts + rng.uniform(0, 12 * _1h, args.n_windows)
+        windows = list(zip(starts, ends))
+
+        t0 = time.perf_counter()
+        expected = _run(hg, windows)
+        t1 = time.perf_counter()
+        chg = CompactHypnogram.from_hypnogram(hg)
+        actual = _run(chg, windows)
+        t2 = time.perf_counter()
+        t_float += t1 - t0
+        t_compact += t2 - t1
+
+        n_bad = sum(not _equal(e._df, a.to_frame()) for e, a in zip(expected, actual))
+        n_mismatched += n_bad
+        float_mb = sum(e._df.memory_usage(deep=True).sum() for e in expected) / 1e6
+        compact_mb = (
+            chg.start_time.nbytes + chg.end_time.nbytes + chg.codes.nbytes
+        ) / 1e6
+        print(
+            f"{subject} {probe}: {'OK' if not n_bad else f'{n_bad} MISMATCHED'} "
+            f"(FloatHypnogram {1000 * (t1 - t0):.0f} ms, {float_mb:.1f} MB; "
+            f"CompactHypnogram {1000 * (t2 - t1):.0f} ms, {compact_mb:.2f} MB base)"
+        )
+
+    print(
+        f"\nTotal: FloatHypnogram {t_float:.2f} s, CompactHypnogram {t_compact:.2f} s"
+    )
+    if n_mismatched:
+        print(f"{n_mismatched} result(s) differ.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""Check that `cnd_hgs.sweep_extended_wake` finds the same extended wake periods as
+`cnd_hgs.get_extended_wake_hypnogram` (i.e. `get_consolidated`), for every combination
+of kwargs in a grid, on the liberal hypnogram of every subject/probe of an experiment,
+and report the time taken by each.
+
+With --synthetic, compare the underlying `_ConsolidationSums.find_first` against
+`get_consolidated` directly instead, on random hypnograms. This needs no data, so it can
+be run anywhere ecephys is installed.
+
+Exits with status 1 if any period differs.
+
+example:
+
+python compare_extended_wake_sweep.py novel_objects_deprivation \\
+    --maximum-antistate-bout-duration 60 90 120
+
+python compare_extended_wake_sweep.py --synthetic 200
+"""
+
+import argparse
+import sys
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+import wisc_ecephys_tools as wet
+from ecephys import hypnogram as hyp
+from wisc_ecephys_tools.rats import cnd_hgs, exp_hgs, utils
+
+STATES = ["Wake", "Artifact", "Other"]
+
+
+def compare_cohort(experiment: str, grid: list[dict[str, float]]) -> int:
+    s3 = wet.get_sglx_project("shared")
+    n_mismatched = 0
+    t_reference = 0.0
+    t_sweep = 0.0
+    for subject, experiment, probe in utils.get_subject_experiment_probe_tuples(
+        experiment_filter=experiment
+    ):
+        sglx_subject = wet.get_sglx_subject(subject)
+        try:
+            hg = exp_hgs.get_liberal_hypnogram(s3, experiment, sglx_subject, probe)
+        except Exception as e:
+            print(f"{subject} {probe}: Skipped, could not load hypnogram ({e})")
+            continue
+
+        t0 = time.perf_counter()
+        expected = []
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")  # No-match warnings
+            for kwargs in grid:
+                ext_hg = cnd_hgs.get_extended_wake_hypnogram(
+                    hg, experiment, sglx_subject, **kwargs
+                )
+                expected.append(
+                    (np.nan, np.nan)
+                    if ext_hg is None or not len(ext_hg._df)
+                    else (ext_hg["start_time"].min(), ext_hg["end_time"].max())
+                )
+        t1 = time.perf_counter()
+        actual = cnd_hgs.sweep_extended_wake(hg, experiment, sglx_subject, grid)
+        t2 = time.perf_counter()
+        t_reference += t1 - t0
+        t_sweep += t2 - t1
+
+        bad = ~np.isclose(
+            np.array(expected),
+            actual[["start_time", "end_time"]].to_numpy(),
+            equal_nan=True,
+        ).all(axis=1)
+        n_mismatched += bad.sum()
+        print(
+            f"{subject} {probe}: {'OK' if not bad.any() else f'{bad.sum()} MISMATCHED'} "
+            f"(get_consolidated {1000 * (t1 - t0):.0f} ms, "
+            f"sweep {1000 * (t2 - t1):.0f} ms, {len(grid)} combinations)"
+        )
+        for i in np.flatnonzero(bad):
+            got = tuple(actual.loc[i, ["start_time", "end_time"]])
+            print(f"    {grid[i]}: expected {expected[i]}, got {got}")
+
+    print(f"\nTotal: get_consolidated {t_reference:.2f} s, sweep {t_sweep:.2f} s")
+    return n_mismatched
+
+
+def get_synthetic_hypnogram(rng: np.random.Generator) -> hyp.FloatHypnogram:
+    """Contiguous bouts of random states, with whole-second durations, so that ties
+    between candidate periods occur."""
+    n = rng.integers(1, 200)
+    states = rng.choice(
+        ["Wake", "Artifact", "Other", "NREM", "REM", "NoData"],
+        size=n,
+        p=[0.45, 0.05, 0.05, 0.25, 0.1, 0.1],
+    )
+    durations = np.ceil(rng.exponential(60, size=n))
+    ends = np.cumsum(durations)
+    return hyp.FloatHypnogram(
+        pd.DataFrame(
+            {
+                "state": states,
+                "start_time": ends - durations,
+                "end_time": ends,
+                "duration": durations,
+            }
+        )
+    )
+
+
+def compare_synthetic(n: int, grid: list[dict[str, float]], seed: int) -> int:
+    rng = np.random.default_rng(seed)
+    n_compared = 0
+    n_matched = 0
+    n_mismatched = 0
+    for k in range(n):
+        hg = get_synthetic_hypnogram(rng)
+        df = hg._df.sort_values("start_time", kind="stable")
+        starts = df["start_time"].to_numpy(np.float64)
+        ends = df["end_time"].to_numpy(np.float64)
+        sums = cnd_hgs._ConsolidationSums(
+            starts, ends, np.isin(df["state"].to_numpy(), STATES)
+        )
+        state_time = sums.state_time[-1]
+        for minimum_time in rng.uniform(0.05, 0.6, size=3) * state_time:
+            for kwargs in grid:
+                args = (
+                    kwargs["minimum_endpoint_bout_duration"],
+                    kwargs["maximum_antistate_bout_duration"],
+                    kwargs["minimum_fraction_of_final_match"],
+                )
+                matches = hg.get_consolidated(
+                    STATES,
+                    minimum_time=minimum_time,
+                    minimum_endpoint_bout_duration=args[0],
+                    maximum_antistate_bout_duration=args[1],
+                    frac=args[2],
+                )
+                expected = (
+                    (matches[0]["start_time"].min(), matches[0]["end_time"].max())
+                    if matches
+                    else (np.nan, np.nan)
+                )
+                match = sums.find_first(minimum_time, *args)
+                actual = (
+                    (starts[match[0]], ends[match[1]])
+                    if match is not None
+                    else (np.nan, np.nan)
+                )
+                n_compared += 1
+                n_matched += match is not None
+                if not np.allclose(expected, actual, equal_nan=True):
+                    n_mismatched += 1
+                    print(
+                        f"Hypnogram {k}, minimum_time={minimum_time:.0f}, {kwargs}: "
+                        f"expected {expected}, got {actual}"
+                    )
+    print(
+        f"{n_compared} comparisons ({n_matched} with a consolidated period), "
+        f"{n_mismatched} mismatched."
+    )
+    return n_mismatched
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("experiment", type=str, nargs="?")
+    parser.add_argument(
+        "--synthetic",
+        type=int,
+        metavar="N",
+        help="Compare on N random hypnograms, instead of an experiment's.",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--minimum-endpoint-bout-duration", type=float, nargs="+", default=[60, 120]
+    )
+    parser.add_argument(
+        "--maximum-antistate-bout-duration", type=float, nargs="+", default=[60, 95]
+    )
+    parser.add_argument(
+        "--minimum-fraction-of-final-match", type=float, nargs="+", default=[0.9, 0.95]
+    )
+    args = parser.parse_args()
+    if (args.experiment is None) == (args.synthetic is None):
+        parser.error("Give either an experiment or --synthetic, but not both.")
+    grid = cnd_hgs.get_extended_wake_grid(
+        minimum_endpoint_bout_duration=args.minimum_endpoint_bout_duration,
+        maximum_antistate_bout_duration=args.maximum_antistate_bout_duration,
+        minimum_fraction_of_final_match=args.minimum_fraction_of_final_match,
+    )
+
+    if args.synthetic is not None:
+        n_mismatched = compare_synthetic(args.synthetic, grid, args.seed)
+    else:
+        n_mismatched = compare_cohort(args.experiment, grid)
+    if n_mismatched:
+        print(f"{n_mismatched} period(s) differ.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
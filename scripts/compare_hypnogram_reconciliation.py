@@ -0,0 +1,83 @@
+"""Check that the single-sweep reconciliation in `exp_hgs.load_hypnogram` matches the
+old sequential `FloatHypnogram.reconcile` chain, for every subject/probe of an
+experiment, and report the time taken by each.
+
+Sources are loaded once per probe, so only reconciliation itself is timed. Exits with
+status 1 if any hypnogram differs.
+
+example:
+
+python compare_hypnogram_reconciliation.py novel_objects_deprivation
+"""
+
+import argparse
+import sys
+import time
+
+import numpy as np
+
+import wisc_ecephys_tools as wet
+from ecephys import hypnogram as hyp
+from wisc_ecephys_tools.rats import exp_hgs, reconcile, utils
+
+
+def _clean(df):
+    df = hyp.FloatHypnogram.clean(hyp.FloatHypnogram(df.reset_index(drop=True)))._df
+    return df[["state", "start_time", "end_time", "duration"]].reset_index(drop=True)
+
+
+def _equal(a, b) -> bool:
+    return (
+        len(a) == len(b)
+        and (a["state"].to_numpy() == b["state"].to_numpy()).all()
+        and np.allclose(a["start_time"], b["start_time"])
+        and np.allclose(a["end_time"], b["end_time"])
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("experiment", type=str)
+    args = parser.parse_args()
+
+    s3 = wet.get_sglx_project("shared")
+    n_mismatched = 0
+    t_sequential = 0.0
+    t_sweep = 0.0
+    for subject, experiment, probe in utils.get_subject_experiment_probe_tuples(
+        experiment_filter=args.experiment
+    ):
+        sglx_subject = wet.get_sglx_subject(subject)
+        try:
+            sources = exp_hgs.load_hypnogram_sources(
+                s3, experiment, sglx_subject, probe, fallback=True
+            )
+        except Exception as e:
+            print(f"{subject} {probe}: Skipped, could not load sources ({e})")
+            continue
+        dfs = [hg._df for _, hg in sources]
+
+        t0 = time.perf_counter()
+        expected = _clean(reconcile.reconcile_sequentially(dfs))
+        t1 = time.perf_counter()
+        actual = _clean(reconcile.reconcile_by_priority(dfs))
+        t2 = time.perf_counter()
+        t_sequential += t1 - t0
+        t_sweep += t2 - t1
+
+        ok = _equal(expected, actual)
+        n_mismatched += not ok
+        print(
+            f"{subject} {probe}: {'OK' if ok else 'MISMATCH'} "
+            f"({len(actual)} bouts, sequential {1000 * (t1 - t0):.0f} ms, "
+            f"sweep {1000 * (t2 - t1):.0f} ms)"
+        )
+
+    print(f"\nTotal: sequential {t_sequential:.2f} s, sweep {t_sweep:.2f} s")
+    if n_mismatched:
+        print(f"{n_mismatched} hypnogram(s) differ.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
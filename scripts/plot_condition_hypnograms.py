@@ -0,0 +1,39 @@
+"""Render every subject's condition hypnograms, one page per experiment-subject and one
+row per probe, into a multi-page PDF (see
+`wisc_ecephys_tools.rats.pipeline.plot_condition_hypnograms`).
+
+Hypnograms are read from the condition hypnogram dataset, so run
+build_condition_hypnogram_dataset.py first if it is not up to date.
+
+example:
+
+python plot_condition_hypnograms.py condition_hypnograms.pdf --max-workers 8
+"""
+
+import argparse
+
+from wisc_ecephys_tools.rats.constants import SleepDeprivationExperiments as Exps
+from wisc_ecephys_tools.rats.pipeline import plot_condition_hypnograms
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("path", type=str)
+    parser.add_argument(
+        "--experiments", type=str, nargs="+", default=[e.value for e in Exps]
+    )
+    parser.add_argument("--max-workers", type=int, default=None)
+    parser.add_argument("--dpi", type=int, default=150)
+    args = parser.parse_args()
+
+    path = plot_condition_hypnograms.render_cohort(
+        args.path,
+        experiment_filter=set(args.experiments),
+        max_workers=args.max_workers,
+        dpi=args.dpi,
+    )
+    print(f"Wrote {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Compiled metadata bundles.
+
+Building the project and subject libraries means parsing the multi-document
+projects.yaml, every subject YAML, and wne_sglx_cache.pqt. Short-lived cluster jobs pay
+this cost on every start. Instead, the built library objects are pickled into a bundle
+in the user cache directory, keyed by a hash of the contents of every source file.
+Loading a bundle takes a few milliseconds. Because the key is a content hash, a bundle
+is rebuilt automatically whenever any of its sources (or the installed ecephys code)
+change, and stale bundles are pruned.
+
+See scripts/benchmark_metadata_startup.py for before/after timings.
+"""
+
+import hashlib
+import importlib.util
+import json
+import os
+import pickle
+import sys
+import warnings
+from collections.abc import Callable, Sequence
+from functools import lru_cache
+from importlib import metadata
+from pathlib import Path
+from typing import TypeVar
+
+T = TypeVar("T")
+
+# Bump this if the way bundles are built or stored changes.
+BUNDLE_FORMAT_VERSION = 1
+
+
+def get_bundles_directory() -> Path:
+    # Deferred: core imports projects, which imports us.
+    from wisc_ecephys_tools import core
+
+    bundles_dir = core.get_cache_directory() / "bundles"
+    bundles_dir.mkdir(parents=True, exist_ok=True)
+    return bundles_dir
+
+
+def _hash_package_files(package: str) -> str:
+    """Hash the path, size, and mtime of every source file of a package, without
+    importing it."""
+    spec = importlib.util.find_spec(package)
+    if spec is None or not spec.submodule_search_locations:
+        return "unknown"
+    h = hashlib.sha256()
+    for location in spec.submodule_search_locations:
+        for f in sorted(Path(location).rglob("*.py")):
+            st = f.stat()
+            h.update(f"{f}:{st.st_size}:{st.st_mtime_ns}".encode())
+    return h.hexdigest()[:20]
+
+
+@lru_cache(maxsize=1)
+def _get_ecephys_fingerprint() -> str:
+    """Identify the installed ecephys code.
+
+    ecephys is installed from git (e.g. @develop), so its version does not change from
+    one commit to the next. Use the installed commit (PEP 610 direct_url.json) if there
+    is one. Otherwise (e.g. editable installs), the code can change without being
+    reinstalled, so hash its files.
+    """
+    try:
+        dist = metadata.distribution("ecephys")
+    except metadata.PackageNotFoundError:
+        return "unknown"
+    direct_url = json.loads(dist.read_text("direct_url.json") or "{}")
+    commit_id = direct_url.get("vcs_info", {}).get("commit_id")
+    if commit_id:
+        return f"{dist.version}:{commit_id}"
+    return f"{dist.version}:{_hash_package_files('ecephys')}"
+
+
+def _get_environment_fingerprint() -> str:
+    # Pickled library objects are only valid for the code that created them.
+    return f"{BUNDLE_FORMAT_VERSION}:{sys.version}:{_get_ecephys_fingerprint()}"
+
+
+def get_bundle_key(name: str, sources: Sequence[str | Path]) -> str:
+    """Hash the bundle name, the environment, and the path + content of each source."""
+    h = hashlib.sha256()
+    h.update(name.encode())
+    h.update(_get_environment_fingerprint().encode())
+    for src in sorted(os.fspath(s) for s in sources):
+        h.update(src.encode())
+        with open(src, "rb") as f:
+            h.update(hashlib.sha256(f.read()).digest())
+    return h.hexdigest()[:20]
+
+
+def _prune(name: str, keep: Path):
+    for f in get_bundles_directory().glob(f"{name}-*.pkl"):
+        if f != keep:
+            f.unlink(missing_ok=True)
+
+
+def load_bundle(name: str, sources: Sequence[str | Path], build: Callable[[], T]) -> T:
+    """Load the object produced by `build()` from its compiled bundle, compiling the
+    bundle first if the sources have changed since it was last built.
+
+    Args:
+        name: Name of the bundle, e.g. "sglx_subject_library".
+        sources: Every file that `build` reads. The bundle is keyed by their contents.
+        build: Builds the object from scratch. It must be picklable.
+
+    Returns:
+        The object returned by `build()`, possibly unpickled from an earlier call.
+    """
+    key = get_bundle_key(name, sources)
+    bundle_file = get_bundles_directory() / f"{name}-{key}.pkl"
+    if bundle_file.exists():
+        try:
+            with open(bundle_file, "rb") as f:
+                return pickle.load(f)
+        except Exception as e:  # Corrupt or incompatible bundle. Rebuild it.
+            warnings.warn(f"Could not load bundle {bundle_file}, rebuilding: {e}")
+
+    obj = build()
+    tmp_file = bundle_file.with_suffix(f".{os.getpid()}.tmp")
+    try:
+        with open(tmp_file, "wb") as f:
+            pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file, bundle_file)  # Atomic, in case of concurrent jobs
+    except (pickle.PicklingError, TypeError, AttributeError, OSError) as e:
+        tmp_file.unlink(missing_ok=True)
+        warnings.warn(f"Could not write bundle {bundle_file}: {e}")
+        return obj
+    _prune(name, keep=bundle_file)
+    return obj
+
+
+def clear_bundles():
+    """Delete all compiled bundles. They will be rebuilt on next use."""
+    for f in get_bundles_directory().glob("*.pkl"):
+        f.unlink(missing_ok=True)
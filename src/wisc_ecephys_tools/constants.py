@@ -2,4 +2,9 @@ from enum import StrEnum
 
 
 class Files(StrEnum):
+    # Read by `wne.Project.load_experiment_subject_params`.
+    EXPERIMENT_PARAMS = "experiment_params.json"
     HYPNOGRAM_EPHYVIEWER_EDITS = "hypnogram_ephyviewer_edits.csv"
+    # Journaled edits, see `wisc_ecephys_tools.rats.hypnogram_edits`.
+    HYPNOGRAM_EPHYVIEWER_EDITS_JOURNAL = "hypnogram_ephyviewer_edits.journal.csv"
+    HYPNOGRAM_EPHYVIEWER_EDITS_SNAPSHOT = "hypnogram_ephyviewer_edits.snapshot.parquet"
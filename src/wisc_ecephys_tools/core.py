@@ -1,6 +1,25 @@
+import os
+from pathlib import Path
+
 from ecephys.wne import sglx
 from wisc_ecephys_tools import projects
 
 
 def get_shared_project() -> sglx.SGLXProject:
     return projects.get_sglx_project("shared")
+
+
+def get_cache_directory() -> Path:
+    """Get the machine-local directory used for derived metadata caches.
+
+    Defaults to ~/.cache/wisc_ecephys_tools. Set the WISC_ECEPHYS_TOOLS_CACHE
+    environment variable to use a different location (e.g. local scratch on a node).
+    """
+    cache_dir = Path(
+        os.environ.get(
+            "WISC_ECEPHYS_TOOLS_CACHE",
+            Path.home() / ".cache" / "wisc_ecephys_tools",
+        )
+    )
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    return cache_dir
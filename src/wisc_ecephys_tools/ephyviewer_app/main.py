@@ -19,10 +19,11 @@ DF_OFF_FNAME_SUFFIX = "global_offs_bystate_conservative_0.05.htsv"
 def get_available_sortings(experiment, alias):
     # Import only when needed
     import wisc_ecephys_tools as wet
+    from wisc_ecephys_tools import projects
 
     # Get the available sortings
     s3 = wet.get_sglx_project("shared")
-    sortings_dir = s3.get_alias_directory(experiment, alias)
+    sortings_dir = projects.get_alias_directory(s3, experiment, alias)
     return {
         subj.name: [
             x.name.removeprefix("sorting.") for x in sorted(subj.glob("sorting.imec*"))
@@ -69,12 +70,13 @@ def run():
     import pandas as pd
     import rich
     import xarray as xr
-    from ephyviewer import CsvEpochSource, EpochEncoder
+    from ephyviewer import EpochEncoder
 
     import ecephys.plot
     import ecephys.utils.pandas as pd_utils
     import wisc_ecephys_tools as wet
     from ecephys import wne
+    from wisc_ecephys_tools import projects
 
     # Get the available sortings, per experiment
     s3 = wet.get_sglx_project("shared")
@@ -95,15 +97,15 @@ def run():
     has_stimulus_times = {}
     for experiment, alias in EXPERIMENT_ALIAS_LIST:
         has_hypnogram[(experiment, alias)] = {
-            subject: s3.get_experiment_subject_file(
-                experiment, subject, "hypnogram.htsv"
+            subject: projects.get_experiment_subject_file(
+                s3, experiment, subject, "hypnogram.htsv"
             ).exists()
             for subject in available_sortings[(experiment, alias)]
         }  # TODO: This should just be checked in the load_multiprobe_sorting function.... TB: Yes but it would require (slowish) loading of all sortings
         has_anatomy[(experiment, alias)] = {
             subject: {
-                probe: s3.get_experiment_subject_file(
-                    experiment, subject, f"{probe}.structures.htsv"
+                probe: projects.get_experiment_subject_file(
+                    s3, experiment, subject, f"{probe}.structures.htsv"
                 ).exists()
                 for probe in probes
             }
@@ -115,7 +117,9 @@ def run():
                 probe: len(
                     list(
                         (
-                            s3.get_experiment_subject_directory(experiment, subject)
+                            projects.get_experiment_subject_directory(
+                                s3, experiment, subject
+                            )
                             / "offs"
                         ).glob(f"{probe}{off_fname_glob}")
                     )
@@ -131,7 +135,9 @@ def run():
                 probe: len(
                     list(
                         (
-                            s3.get_experiment_subject_directory(experiment, subject)
+                            projects.get_experiment_subject_directory(
+                                s3, experiment, subject
+                            )
                             / "offs"
                         ).glob(f"{probe}{spatial_off_fname_glob}")
                     )
@@ -144,7 +150,9 @@ def run():
         has_scoring_sigs[(experiment, alias)] = {
             subject: all(
                 [
-                    nb.get_experiment_subject_file(experiment, subject, fname).exists()
+                    projects.get_experiment_subject_file(
+                        nb, experiment, subject, fname
+                    ).exists()
                     for fname in ["scoring_lfp.zarr", "scoring_emg.zarr"]
                 ]
             )
@@ -152,11 +160,11 @@ def run():
         }  # TODO: This should just be checked in the load_multiprobe_sorting function.... TB: Yes but it would require (slowish) loading of all sortings
         has_sharp_wave_ripples[(experiment, alias)] = {
             subject: (
-                nb.get_experiment_subject_file(
-                    experiment, subject, "postprocessed_spws.pqt"
+                projects.get_experiment_subject_file(
+                    nb, experiment, subject, "postprocessed_spws.pqt"
                 ).exists()
-                and nb.get_experiment_subject_file(
-                    experiment, subject, "postprocessed_ripples.pqt"
+                and projects.get_experiment_subject_file(
+                    nb, experiment, subject, "postprocessed_ripples.pqt"
                 ).exists()
             )
             for subject in available_sortings[(experiment, alias)]
@@ -165,9 +173,9 @@ def run():
             subject: {
                 probe: len(
                     list(
-                        nb.get_experiment_subject_directory(experiment, subject).glob(
-                            f"{probe}*mu_spindles*"
-                        )
+                        projects.get_experiment_subject_directory(
+                            nb, experiment, subject
+                        ).glob(f"{probe}*mu_spindles*")
                     )
                 )
                 > 0
@@ -177,8 +185,8 @@ def run():
         }
         has_stimulus_times[(experiment, alias)] = {
             subject: (
-                s3.get_experiment_subject_file(
-                    experiment, subject, "stimulus_times.htsv"
+                projects.get_experiment_subject_file(
+                    s3, experiment, subject, "stimulus_times.htsv"
                 ).exists()
             )
             for subject in available_sortings[(experiment, alias)]
@@ -328,7 +336,8 @@ def run():
                 ".".join(fpath.name.split(".")[2:])
                 # fname
                 for fpath in (
-                    s3.get_experiment_subject_directory(experiment, subject) / "offs"
+                    projects.get_experiment_subject_directory(s3, experiment, subject)
+                    / "offs"
                 ).glob(f"{probe}*global_offs*")
             ]
         )  # Nasty sh*t good luck lol
@@ -350,7 +359,8 @@ def run():
                 ".".join(fpath.name.split(".")[2:])
                 # fname
                 for fpath in (
-                    s3.get_experiment_subject_directory(experiment, subject) / "offs"
+                    projects.get_experiment_subject_directory(s3, experiment, subject)
+                    / "offs"
                 ).glob(f"{probe}*spatial_offs*")
             ]
         )  # Nasty sh*t good luck lol
@@ -413,11 +423,15 @@ def run():
     if has_scorsig and var_scorsig.get():
         print("Loading scoring signals")
         lfp = xr.open_dataarray(
-            nb.get_experiment_subject_file(experiment, subject, "scoring_lfp.zarr"),
+            projects.get_experiment_subject_file(
+                nb, experiment, subject, "scoring_lfp.zarr"
+            ),
             engine="zarr",
         )
         emg = xr.open_dataarray(
-            nb.get_experiment_subject_file(experiment, subject, "scoring_emg.zarr"),
+            projects.get_experiment_subject_file(
+                nb, experiment, subject, "scoring_emg.zarr"
+            ),
             engine="zarr",
         )
 
@@ -491,16 +505,16 @@ def run():
 
             return {"time": times, "duration": durations, "label": labels, "name": name}
 
-        spw_file = nb.get_experiment_subject_file(
-            experiment, subject, "postprocessed_spws.pqt"
+        spw_file = projects.get_experiment_subject_file(
+            nb, experiment, subject, "postprocessed_spws.pqt"
         )
         spws = (
             pd.read_parquet(spw_file).sort_values("start_time").reset_index(drop=True)
         )
         spw_epochs = get_ephyviewer_epochs_dict(spws, "SPW")
 
-        ripples_file = nb.get_experiment_subject_file(
-            experiment, subject, "postprocessed_ripples.pqt"
+        ripples_file = projects.get_experiment_subject_file(
+            nb, experiment, subject, "postprocessed_ripples.pqt"
         )
         ripples = (
             pd.read_parquet(ripples_file)
@@ -521,9 +535,9 @@ def run():
     if has_mu_spindles and var_muspins.get():
         print("Loading MU-spindles")
 
-        muspin_files = nb.get_experiment_subject_directory(experiment, subject).glob(
-            f"{probe}.*.mu_spindles.pqt"
-        )
+        muspin_files = projects.get_experiment_subject_directory(
+            nb, experiment, subject
+        ).glob(f"{probe}.*.mu_spindles.pqt")
         muspindles = (
             pd.concat([pd.read_parquet(muspin_file) for muspin_file in muspin_files])
             .sort_values(by="Start")
@@ -543,8 +557,8 @@ def run():
     if has_stims and var_stims.get():
         print("Loading stimulus times")
 
-        stims_file = s3.get_experiment_subject_file(
-            experiment, subject, "stimulus_times.htsv"
+        stims_file = projects.get_experiment_subject_file(
+            s3, experiment, subject, "stimulus_times.htsv"
         )
         stims = pd_utils.read_htsv(stims_file)
 
@@ -624,13 +638,12 @@ def run():
 
     if var_hypno_encoder.get():
         print("Add hypnogram edits encoder")
-        edits_fpath = s3.get_experiment_subject_file(
-            experiment, subject, wet.constants.Files.HYPNOGRAM_EPHYVIEWER_EDITS
-        )
+        # Saving appends to the edits journal, rather than rewriting a CSV.
+        edits_store = wet.rats.hypnogram_edits.get_edit_store(s3, experiment, subject)
 
         states = utils.EPHYVIEWER_STATE_ORDER
-        source_epoch = CsvEpochSource(
-            edits_fpath,
+        source_epoch = utils.JournaledEpochSource(
+            edits_store,
             states,
             color_labels=[
                 matplotlib.colors.rgb2hex(ecephys.plot.state_colors[state])
@@ -9,6 +9,7 @@ from tqdm import tqdm
 from ecephys import hypnogram as hyp
 from ecephys import plot as eplt
 from ecephys import units
+from wisc_ecephys_tools.rats import hypnogram_edits
 
 DEPTH_STEP = 20
 
@@ -398,3 +399,82 @@ def launch_interactive_raster_from_multiprobe_sorting(
 
     window.show()
     app.exec()
+
+
+class JournaledEpochSource(ephyviewer.WritableEpochSource):
+    """A writable epoch source backed by a `hypnogram_edits.HypnogramEditStore`, for use
+    with `ephyviewer.EpochEncoder` in place of `ephyviewer.CsvEpochSource`.
+
+    Labelling and deleting are recorded as journal operations, and saving only appends
+    the operations made since the last save. If the viewer's state can't be reproduced
+    from them (e.g. after "fill blank"), its full state is written as a new snapshot.
+
+    Parameters:
+    store: HypnogramEditStore
+    possible_labels, color_labels, channel_name, restrict_to_possible_labels:
+        As for `ephyviewer.CsvEpochSource`.
+    """
+
+    def __init__(
+        self,
+        store: hypnogram_edits.HypnogramEditStore,
+        possible_labels,
+        color_labels=None,
+        channel_name="",
+        restrict_to_possible_labels=False,
+    ):
+        self.store = store
+        self._saved = store.load("raw")
+        self._pending = []
+        epoch = {
+            "time": self._saved["start_time"].to_numpy(np.float64),
+            "duration": self._saved["duration"].to_numpy(np.float64),
+            "label": self._saved["state"].to_numpy().astype("U"),
+            "name": channel_name,
+        }
+        ephyviewer.WritableEpochSource.__init__(
+            self,
+            epoch=epoch,
+            possible_labels=possible_labels,
+            color_labels=color_labels,
+            channel_name=channel_name,
+            restrict_to_possible_labels=restrict_to_possible_labels,
+        )
+
+    def add_epoch(self, t1, duration, label):
+        ephyviewer.WritableEpochSource.add_epoch(self, t1, duration, label)
+        self._pending.append(("add", t1, duration, label))
+
+    def delete_in_between(self, t1, t2):
+        ephyviewer.WritableEpochSource.delete_in_between(self, t1, t2)
+        self._pending.append(("delete", t1, t2 - t1, ""))
+
+    def _get_current_edits(self) -> pd.DataFrame:
+        epochs = self.all[0]
+        ops = pd.DataFrame(
+            {
+                "op": "add",
+                "time": np.round(epochs["time"], 6),
+                "duration": np.round(epochs["duration"], 6),
+                "label": epochs["label"],
+            }
+        ).sort_values("time", kind="stable")
+        return hypnogram_edits.replay(self._saved.iloc[:0], ops)
+
+    def save(self):
+        ops = pd.DataFrame(self._pending, columns=["op", "time", "duration", "label"])
+        ops[["time", "duration"]] = ops[["time", "duration"]].round(6)
+        current = self._get_current_edits()
+        expected = hypnogram_edits.replay(self._saved, ops)
+        consistent = (
+            len(current) == len(expected)
+            and (current["state"].to_numpy() == expected["state"].to_numpy()).all()
+            and np.allclose(current["start_time"], expected["start_time"])
+            and np.allclose(current["end_time"], expected["end_time"])
+        )
+        if len(ops):
+            self.store.append(ops, compact=consistent)
+        if not consistent:
+            self.store.compact(raw=current)
+        self._saved = current
+        self._pending = []
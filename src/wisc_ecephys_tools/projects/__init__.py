@@ -1,3 +1,21 @@
-from .projects import get_sglx_project, get_wne_project
+from .projects import (
+    clear_caches,
+    get_alias_directory,
+    get_alias_subject_directory,
+    get_experiment_subject_directory,
+    get_experiment_subject_file,
+    get_project_directory,
+    get_sglx_project,
+    get_wne_project,
+)
 
-__all__ = ["get_sglx_project", "get_wne_project"]
+__all__ = [
+    "get_sglx_project",
+    "get_wne_project",
+    "get_project_directory",
+    "get_experiment_subject_file",
+    "get_experiment_subject_directory",
+    "get_alias_directory",
+    "get_alias_subject_directory",
+    "clear_caches",
+]
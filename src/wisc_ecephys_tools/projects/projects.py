@@ -12,12 +12,17 @@ You could name a project the same thing as an experiment, if you wanted to.
 """
 
 import os
+import threading
+from collections import OrderedDict
 from functools import lru_cache
 from pathlib import Path
 
+import yaml
 from ecephys import wne
 from ecephys.wne import sglx
 
+from wisc_ecephys_tools import bundles
+
 
 # TODO: Use importlib.resources and make YAML files hatch build artifacts.
 def get_projects_file() -> Path:
@@ -30,7 +35,11 @@ def get_sglx_project_library(projects_file: str) -> sglx.SGLXProjectLibrary:
     assert isinstance(projects_file, str), (
         f"projects_file must be str, got {type(projects_file)}"
     )
-    return sglx.SGLXProjectLibrary(projects_file)
+    return bundles.load_bundle(
+        "sglx_project_library",
+        [projects_file],
+        lambda: sglx.SGLXProjectLibrary(projects_file),
+    )
 
 
 @lru_cache(maxsize=8)
@@ -39,14 +48,126 @@ def get_wne_project_library(projects_file: str) -> wne.ProjectLibrary:
     assert isinstance(projects_file, str), (
         f"projects_file must be str, got {type(projects_file)}"
     )
-    return wne.ProjectLibrary(projects_file)
+    return bundles.load_bundle(
+        "wne_project_library",
+        [projects_file],
+        lambda: wne.ProjectLibrary(projects_file),
+    )
+
+
+# Project objects, memoized per name, and resolved paths, memoized per project. Both are
+# dropped whenever projects.yaml changes (see `_check_projects_file`).
+_projects_file_stamp: tuple[int, int] | None = None
+_sglx_projects: dict[str, sglx.SGLXProject] = {}
+_wne_projects: dict[str, wne.Project] = {}
+_path_cache: OrderedDict[tuple, tuple[object, Path]] = OrderedDict()
+_path_cache_lock = threading.Lock()  # Paths are resolved from thread pools
+_project_directories: dict[str, Path] = {}
+PATH_CACHE_MAXSIZE = 65536
+
+
+def clear_caches():
+    """Forget all project libraries, projects, and resolved paths."""
+    get_sglx_project_library.cache_clear()
+    get_wne_project_library.cache_clear()
+    _sglx_projects.clear()
+    _wne_projects.clear()
+    with _path_cache_lock:
+        _path_cache.clear()
+    _project_directories.clear()
+
+
+def _check_projects_file():
+    """Clear caches if projects.yaml changed (by mtime or size) since last checked."""
+    global _projects_file_stamp
+    st = os.stat(get_projects_file())
+    stamp = (st.st_mtime_ns, st.st_size)
+    if stamp != _projects_file_stamp:
+        clear_caches()
+        _projects_file_stamp = stamp
 
 
 def get_sglx_project(project_name: str) -> sglx.SGLXProject:
-    lib = get_sglx_project_library(str(get_projects_file()))
-    return lib.get_project(project_name=project_name)
+    """Get a project by name. The same object is returned until projects.yaml changes."""
+    _check_projects_file()
+    project = _sglx_projects.get(project_name)
+    if project is None:
+        lib = get_sglx_project_library(str(get_projects_file()))
+        project = _sglx_projects[project_name] = lib.get_project(
+            project_name=project_name
+        )
+    return project
 
 
 def get_wne_project(project_name: str) -> wne.Project:
-    lib = get_wne_project_library(str(get_projects_file()))
-    return lib.get_project(project_name=project_name)
+    """Get a project by name. The same object is returned until projects.yaml changes."""
+    _check_projects_file()
+    project = _wne_projects.get(project_name)
+    if project is None:
+        lib = get_wne_project_library(str(get_projects_file()))
+        project = _wne_projects[project_name] = lib.get_project(
+            project_name=project_name
+        )
+    return project
+
+
+def get_project_directory(project_name: str) -> Path:
+    """Get a project's root directory, as given in projects.yaml."""
+    _check_projects_file()
+    if not _project_directories:
+        with open(get_projects_file()) as f:
+            for doc in yaml.safe_load_all(f):
+                if doc and "project" in doc:
+                    _project_directories[doc["project"]] = Path(
+                        doc["project_directory"]
+                    )
+    try:
+        return _project_directories[project_name]
+    except KeyError:
+        raise ValueError(f"Project {project_name} not found in {get_projects_file()}")
+
+
+def _resolve(project: wne.Project, method: str, *args: str) -> Path:
+    """Call `project.<method>(*args)`, memoizing the result in an LRU cache.
+
+    Entries are keyed by project identity, and hold a reference to the project so that
+    its id cannot be reused by another object while the entry exists.
+    """
+    key = (id(project), method, *args)
+    with _path_cache_lock:
+        hit = _path_cache.get(key)
+        if hit is not None and hit[0] is project:
+            _path_cache.move_to_end(key)
+            return hit[1]
+    path = getattr(project, method)(*args)  # Not under the lock, as it may be slow
+    with _path_cache_lock:
+        _path_cache[key] = (project, path)
+        if len(_path_cache) > PATH_CACHE_MAXSIZE:
+            _path_cache.popitem(last=False)
+    return path
+
+
+def get_experiment_subject_file(
+    project: wne.Project, experiment: str, subject: str, fname: str
+) -> Path:
+    """Memoized `project.get_experiment_subject_file(experiment, subject, fname)`."""
+    return _resolve(project, "get_experiment_subject_file", experiment, subject, fname)
+
+
+def get_experiment_subject_directory(
+    project: wne.Project, experiment: str, subject: str
+) -> Path:
+    """Memoized `project.get_experiment_subject_directory(experiment, subject)`."""
+    return _resolve(project, "get_experiment_subject_directory", experiment, subject)
+
+
+def get_alias_directory(project: wne.Project, experiment: str, alias: str) -> Path:
+    """Memoized `project.get_alias_directory(experiment, alias)`."""
+    return _resolve(project, "get_alias_directory", experiment, alias)
+
+
+def get_alias_subject_directory(
+    project: wne.Project, experiment: str, alias: str, subject: str
+) -> Path:
+    """Memoized `project.get_alias_subject_directory(experiment, alias, subject)`."""
+    return _resolve(project, "get_alias_subject_directory", experiment, alias, subject)
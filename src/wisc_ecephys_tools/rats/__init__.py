@@ -1,3 +1,54 @@
-from . import cnd_hgs, constants, exp_hgs, pipeline, sortings, utils
+# Submodules are imported on first access (PEP 562), so that e.g.
+#   from wisc_ecephys_tools.rats import constants
+# does not pay for importing every other submodule.
+import importlib
+from typing import TYPE_CHECKING
 
-__all__ = ["constants", "cnd_hgs", "exp_hgs", "utils", "pipeline", "sortings"]
+if TYPE_CHECKING:
+    from . import (
+        cnd_dataset,
+        cnd_graph,
+        cnd_hgs,
+        compact_hgs,
+        consensus,
+        constants,
+        exp_hgs,
+        hg_index,
+        hypnogram_edits,
+        manifest,
+        masks,
+        pipeline,
+        reconcile,
+        sortings,
+        utils,
+    )
+
+__all__ = [
+    "constants",
+    "cnd_dataset",
+    "cnd_graph",
+    "cnd_hgs",
+    "compact_hgs",
+    "consensus",
+    "exp_hgs",
+    "hg_index",
+    "hypnogram_edits",
+    "manifest",
+    "masks",
+    "utils",
+    "pipeline",
+    "reconcile",
+    "sortings",
+]
+
+
+def __getattr__(name: str):
+    if name in __all__:
+        module = importlib.import_module(f"{__name__}.{name}")
+        globals()[name] = module
+        return module
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
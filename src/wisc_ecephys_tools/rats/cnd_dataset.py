@@ -0,0 +1,192 @@
+"""
+A cohort-wide, partitioned parquet dataset of statistical condition hypnograms.
+
+`cnd_hgs.save_statistical_condition_hypnograms` writes one file per subject/probe, in
+each experiment-subject directory, so a cohort query for one condition opens every file
+and then normalizes legacy condition names. This dataset instead lives in one directory
+tree (see `get_condition_dataset_directory`), hive-partitioned by experiment, subject,
+and probe:
+
+    condition_hypnograms/experiment=.../subject=.../probe=.../part-0.parquet
+
+Consensus hypnograms are stored under probe=`CONSENSUS_PROBE`. Within each file,
+condition names are already normalized, the condition and state columns are
+dictionary-encoded, and each condition is written as its own row group. So, when
+reading:
+
+- Experiment, subject, and probe filters prune whole directories.
+- Condition filters skip row groups using their min/max statistics.
+
+Example:
+    df = read_condition_hypnograms(
+        conditions=["Early.REC.NREM"], experiments=["novel_objects_deprivation"]
+    )
+"""
+
+import os
+from collections.abc import Mapping, Sequence
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from ecephys import hypnogram as hyp
+from wisc_ecephys_tools import projects
+from wisc_ecephys_tools.rats.cnd_hgs import _LEGACY_CONDITION_NAMES_MAP
+
+CONSENSUS_PROBE = "consensus"
+PARTITION_KEYS = ("experiment", "subject", "probe")
+
+_DICTIONARY = pa.dictionary(pa.int32(), pa.string())
+SCHEMA = pa.schema(
+    [
+        ("condition", _DICTIONARY),
+        ("state", _DICTIONARY),
+        ("start_time", pa.float64()),
+        ("end_time", pa.float64()),
+        ("duration", pa.float64()),
+    ]
+)
+_PARTITION_SCHEMA = pa.schema([(key, pa.string()) for key in PARTITION_KEYS])
+PARTITIONING = ds.partitioning(_PARTITION_SCHEMA, flavor="hive")
+
+
+def get_condition_dataset_directory(project_name: str = "shared") -> Path:
+    return projects.get_project_directory(project_name) / "condition_hypnograms"
+
+
+def get_partition_directory(
+    experiment: str, subject: str, probe: str | None, root: Path | None = None
+) -> Path:
+    root = root or get_condition_dataset_directory()
+    probe = probe or CONSENSUS_PROBE
+    return root / f"experiment={experiment}" / f"subject={subject}" / f"probe={probe}"
+
+
+def write_condition_hypnograms(
+    hgs: Mapping[str, hyp.FloatHypnogram],
+    experiment: str,
+    subject: str,
+    probe: str | None,
+    root: Path | None = None,
+) -> Path:
+    """Write one subject/probe's condition hypnograms to the dataset, replacing any
+    already there.
+
+    Args:
+        hgs: Condition hypnograms, keyed by condition name.
+        experiment, subject: The partition to write.
+        probe: The partition to write, or None for consensus hypnograms.
+        root: The dataset directory. Defaults to `get_condition_dataset_directory()`.
+
+    Returns:
+        The path of the written file.
+    """
+    partition_dir = get_partition_directory(experiment, subject, probe, root)
+    partition_dir.mkdir(parents=True, exist_ok=True)
+    path = partition_dir / "part-0.parquet"
+    # Dataset discovery ignores files starting with ".", so readers never see this.
+    tmp = partition_dir / f".part-0.{os.getpid()}.tmp"
+    with pq.ParquetWriter(tmp, SCHEMA) as writer:
+        for condition, hg in hgs.items():
+            condition = _LEGACY_CONDITION_NAMES_MAP.get(condition, condition)
+            df = hg._df
+            # One row group per condition, so that condition filters can skip the rest.
+            table = pa.table(
+                {
+                    "condition": pa.array([condition] * len(df), pa.string()),
+                    "state": pa.array(df["state"].astype(str), pa.string()),
+                    "start_time": pa.array(df["start_time"], pa.float64()),
+                    "end_time": pa.array(df["end_time"], pa.float64()),
+                    "duration": pa.array(df["duration"], pa.float64()),
+                }
+            ).cast(SCHEMA)
+            writer.write_table(table)
+    os.replace(tmp, path)  # Atomic, in case of concurrent readers
+    return path
+
+
+def _isin(field: str, values: Sequence[str] | str | None) -> ds.Expression | None:
+    if values is None:
+        return None
+    values = [values] if isinstance(values, str) else list(values)
+    return ds.field(field).isin(values)
+
+
+def read_condition_hypnograms(
+    conditions: Sequence[str] | str | None = None,
+    experiments: Sequence[str] | str | None = None,
+    subjects: Sequence[str] | str | None = None,
+    probes: Sequence[str] | str | None = None,
+    root: Path | None = None,
+) -> pd.DataFrame:
+    """Read condition hypnograms from the dataset, as one frame.
+
+    Args:
+        conditions, experiments, subjects, probes: If given, only read these. Use
+            `CONSENSUS_PROBE` to select consensus hypnograms.
+        root: The dataset directory. Defaults to `get_condition_dataset_directory()`.
+
+    Returns:
+        A frame with experiment, subject, probe, condition, and state columns (all
+        categorical), and start_time, end_time, and duration columns.
+    """
+    root = root or get_condition_dataset_directory()
+    dataset = ds.dataset(
+        root,
+        schema=pa.unify_schemas([SCHEMA, _PARTITION_SCHEMA]),
+        format="parquet",
+        partitioning=PARTITIONING,
+    )
+    filters = [
+        expr
+        for expr in [
+            _isin("condition", conditions),
+            _isin("experiment", experiments),
+            _isin("subject", subjects),
+            _isin("probe", probes),
+        ]
+        if expr is not None
+    ]
+    expr = None
+    for f in filters:
+        expr = f if expr is None else expr & f
+    columns = list(PARTITION_KEYS) + SCHEMA.names
+    df = dataset.to_table(columns=columns, filter=expr).to_pandas()
+    for key in PARTITION_KEYS:
+        df[key] = df[key].astype("category")
+    return df
+
+
+def load_condition_hypnograms(
+    experiment: str,
+    subject: str,
+    probe: str | None,
+    conditions: Sequence[str] | None = None,
+    root: Path | None = None,
+) -> dict[str, hyp.FloatHypnogram]:
+    """Load one subject/probe's condition hypnograms from the dataset, keyed by
+    condition name, in the order they were written.
+
+    Args:
+        probe: The probe, or None for consensus hypnograms.
+        conditions: If given, only load these.
+
+    Raises:
+        FileNotFoundError: If the partition has not been written.
+    """
+    path = get_partition_directory(experiment, subject, probe, root) / "part-0.parquet"
+    if not path.exists():
+        raise FileNotFoundError(path)
+    filters = [("condition", "in", list(conditions))] if conditions else None
+    df = pq.read_table(path, filters=filters).to_pandas()
+    return {
+        str(cnd): hyp.FloatHypnogram(
+            cnd_df.drop(columns=["condition"])
+            .astype({"state": object})
+            .reset_index(drop=True)
+        )
+        for cnd, cnd_df in df.groupby("condition", sort=False, observed=True)
+    }
@@ -0,0 +1,460 @@
+"""
+Statistical conditions as a dependency graph, with per-node cached results.
+
+`cnd_hgs.compute_statistical_condition_hypnograms` derives each condition from others,
+e.g. Early.SD from SD, SD from the sleep deprivation period of the conservative
+hypnogram, and the .Match conditions from Early.REC.* and the circadian match
+tolerance. Here, each of these steps is a `Node`, declared with the nodes, inputs, and
+parameters it depends on. Each node's result is cached (in memory, and on disk in the
+user cache directory) under a key that hashes its own definition, the values of its
+parameters, and the keys of its dependencies. So, when a parameter changes, only the
+nodes downstream of it are recomputed. For example, changing the circadian match
+tolerance only recomputes the two .Match conditions, and changing the extended wake
+parameters recomputes the EXT and REC conditions, but none of the baseline or SD ones.
+
+Inputs are keyed by content, not by name: the liberal and conservative hypnograms by a
+hash of their bouts, and the periods by their times. So cached nodes are reused across
+probes and runs, as long as the hypnograms and periods they depend on are unchanged.
+On disk, results are kept in one directory per subject/experiment/probe, and only the
+latest result of each node is kept there. Superseded results are pruned as soon as they
+are replaced.
+
+Bump `GRAPH_VERSION` whenever a node's computation changes.
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from collections.abc import Callable, Mapping
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import numpy as np
+from ecephys.wne import sglx
+
+from ecephys import hypnogram as hyp
+from wisc_ecephys_tools import core
+from wisc_ecephys_tools.rats import cnd_hgs
+from wisc_ecephys_tools.rats.compact_hgs import CompactHypnogram
+from wisc_ecephys_tools.rats.constants import SleepDeprivationExperiments as Exps
+
+GRAPH_VERSION = 2
+
+_1h = 3600.0
+_10min = 600.0
+_24h = 86400.0
+
+# Names of the graph's inputs. Periods are inputs named "period:<name>".
+LIBERAL = "Full.Liberal"
+CONSERVATIVE = "Full.Conservative"
+
+
+@dataclass(frozen=True)
+class Node:
+    """One step of the condition graph.
+
+    Args:
+        name: The node's name. Conditions are named as in `cnd_hgs`.
+        deps: Names of the nodes or inputs whose results are passed to `fn`, in order.
+        fn: Computes the node's result from its dependencies' results, and its
+            parameters as keyword arguments. If any dependency is None (e.g. no
+            extended wake period was found), the node is None, and `fn` is not called,
+            unless `allow_none`.
+        params: Names of the parameters passed to `fn`.
+        description: Identifies the computation in cache keys, since `fn` can't be
+            hashed reliably.
+        is_condition: Whether the node is a condition returned to callers, rather than
+            an intermediate.
+        allow_none: Whether `fn` handles None dependencies itself, e.g. with a fallback.
+    """
+
+    name: str
+    deps: tuple[str, ...]
+    fn: Callable = field(compare=False)
+    params: tuple[str, ...] = ()
+    description: str = ""
+    is_condition: bool = True
+    allow_none: bool = False
+
+
+def _trim(name: str, period: str) -> Node:
+    return Node(
+        name,
+        (CONSERVATIVE, f"period:{period}"),
+        lambda hg, p: hg.trim(*p),
+        description=f"trim:{period}",
+        is_condition=False,
+    )
+
+
+def _derive(name: str, parent: str, states: list[str], keep: str = "", d: float = 0):
+    """A condition derived from `parent` with keep_states, then keep_first/keep_last."""
+
+    def fn(hg):
+        hg = hg.keep_states(states)
+        return getattr(hg, keep)(d) if keep else hg
+
+    return Node(name, (parent,), fn, description=f"{states}:{keep}:{d}")
+
+
+def _deprivation_nodes(prefix: str, period_node: str) -> list[Node]:
+    return [
+        _derive(prefix, period_node, ["Wake", "NREM"]),
+        _derive(f"Early.{prefix}", prefix, ["Wake", "NREM"], "keep_first", _1h),
+        _derive(f"Late.{prefix}", prefix, ["Wake", "NREM"], "keep_last", _1h),
+        _derive(f"{prefix}.Wake", period_node, ["Wake"]),
+        _derive(f"Early.{prefix}.Wake", f"{prefix}.Wake", ["Wake"], "keep_first", _1h),
+        _derive(f"Late.{prefix}.Wake", f"{prefix}.Wake", ["Wake"], "keep_last", _1h),
+    ]
+
+
+def _find_extended_wake(lbrl_hg, ctx, sd_period, extended_wake_kwargs):
+    ext_hg = cnd_hgs.get_extended_wake_hypnogram(
+        lbrl_hg,
+        ctx.experiment,
+        ctx.subject,
+        **dict(extended_wake_kwargs),
+        sd_period=tuple(sd_period),
+    )
+    if ext_hg is None:
+        return np.empty(0)
+    return np.array([ext_hg["start_time"].min(), ext_hg["end_time"].max()])
+
+
+def _trim_to_window(hg, window):
+    return hg.trim(*window) if len(window) else None
+
+
+def _get_recovery_start(ext_hg, sd_hg):
+    # If no extended wake period was found, recovery starts at the end of SD. In rare
+    # cases, the end of extended wake can precede the end of SD, if there was a lot of
+    # local sleep at the end of SD.
+    ext_end = sd_hg.end if ext_hg is None else ext_hg.end
+    return np.array([max(ext_end, sd_hg.end)])
+
+
+def _get_post_deprivation_hypnogram(hg, d2lp, rec_start):
+    d2lp_hg = hg.trim(*d2lp)
+    return d2lp_hg.trim(rec_start[0], d2lp_hg.end)
+
+
+def _circadian_match(name: str, parent: str, states: list[str]) -> Node:
+    def fn(hg, parent_hg, circadian_match_tolerance):
+        return hg.trim(
+            parent_hg.start - circadian_match_tolerance - _24h,
+            parent_hg.end + circadian_match_tolerance - _24h,
+        ).keep_states(states)
+
+    return Node(
+        name,
+        (CONSERVATIVE, parent),
+        fn,
+        params=("circadian_match_tolerance",),
+        description=f"match:{states}",
+    )
+
+
+def get_graph(experiment: str) -> list[Node]:
+    """The condition graph for an experiment, in topological order. Conditions are
+    listed in the order `compute_statistical_condition_hypnograms` returns them."""
+    nodes = [
+        _trim("D1", "Day1"),
+        _derive("BSL.Wake", "D1", ["Wake"]),
+        _derive("BSL.REM", "D1", ["REM"]),
+        _trim("D1LP", "Day1.Light"),
+        _derive("Early.BSL.NREM", "D1LP", ["NREM"], "keep_first", _1h),
+        _derive("Early.BSL.REM", "D1LP", ["REM"], "keep_first", _10min),
+        _trim("D1DP", "Day1.Dark"),
+        _derive("Last.BSL.NREM", "D1DP", ["NREM"], "keep_last", _1h),
+        _derive("Last.BSL.REM", "D1DP", ["REM"], "keep_last", _10min),
+        _trim("SDP", "SD"),
+        *_deprivation_nodes("SD", "SDP"),
+    ]
+    if experiment in [Exps.NOD, Exps.CTN]:
+        nodes += [_trim("NODP", "NOD"), *_deprivation_nodes("NOD", "NODP")]
+    if experiment in [Exps.COW, Exps.CTN]:
+        nodes += [_trim("COWP", "COW"), *_deprivation_nodes("COW", "COWP")]
+    if experiment == Exps.CTN:
+        nodes += _deprivation_nodes("CTN", "SDP")
+    nodes += [
+        Node(
+            "EXT.Window",
+            # The SD period is an explicit dependency, so that params edits that move
+            # it invalidate the window (and everything downstream of it).
+            (LIBERAL, "context", "period:SD"),
+            _find_extended_wake,
+            params=("extended_wake_kwargs",),
+            description="get_extended_wake_hypnogram",
+            is_condition=False,
+        ),
+        Node(
+            "EXTP",
+            (CONSERVATIVE, "EXT.Window"),
+            _trim_to_window,
+            description="trim:EXT.Window",
+            is_condition=False,
+        ),
+        # Scoring may be so good that local sleep was marked as NREM. If you want
+        # "mixed wake", Early/Late.EXT will include these microsleeps. If you want
+        # "pure wake", use EXT.Wake and company. Note that mixed wake trimmed to the
+        # times of Early.EXT.Wake will not be exactly 1h long, and will not be the same
+        # as Early.EXT.
+        *_deprivation_nodes("EXT", "EXTP"),
+        Node(
+            "REC.Start",
+            ("EXTP", "SDP"),
+            _get_recovery_start,
+            description="max_end",
+            is_condition=False,
+            allow_none=True,  # EXTP is None if no extended wake period was found
+        ),
+        Node(
+            "PDD2LP",
+            (CONSERVATIVE, "period:Day2.Light", "REC.Start"),
+            _get_post_deprivation_hypnogram,
+            description="post_deprivation",
+            is_condition=False,
+        ),
+        _derive("Early.REC.NREM", "PDD2LP", ["NREM"], "keep_first", _1h),
+        _derive("Early.REC.REM", "PDD2LP", ["REM"], "keep_first", _10min),
+        _derive("Late.REC.NREM", "PDD2LP", ["NREM"], "keep_last", _1h),
+        _derive("Late.REC.REM", "PDD2LP", ["REM"], "keep_last", _10min),
+        _circadian_match("Early.REC.NREM.Match", "Early.REC.NREM", ["NREM"]),
+        _circadian_match("Early.REC.REM.Match", "Early.REC.REM", ["REM"]),
+        _trim("D2DP", "Day2.Dark"),
+        _derive("Last.REC.NREM", "D2DP", ["NREM"], "keep_last", _1h),
+        _derive("Last.REC.REM", "D2DP", ["REM"], "keep_last", _10min),
+    ]
+    return nodes
+
+
+def get_periods(experiment: str, subject: sglx.SGLXSubject) -> dict[str, tuple]:
+    """The periods the graph trims to, keyed by name (without the "period:" prefix)."""
+    intervals, labels = cnd_hgs.get_light_dark_periods(experiment, subject)
+    assert labels == ["on", "off", "on", "off"]
+    periods = {
+        "Day1": (intervals[0][0], intervals[1][1]),
+        "Day1.Light": intervals[0],
+        "Day1.Dark": intervals[1],
+        "Day2.Light": intervals[2],
+        "Day2.Dark": intervals[3],
+        "SD": cnd_hgs.get_sleep_deprivation_period(experiment, subject),
+    }
+    if experiment in [Exps.NOD, Exps.CTN]:
+        periods["NOD"] = cnd_hgs.get_novel_objects_period(experiment, subject)
+    if experiment in [Exps.COW, Exps.CTN]:
+        periods["COW"] = cnd_hgs.get_conveyor_over_water_period(experiment, subject)
+    return {name: tuple(float(t) for t in p) for name, p in periods.items()}
+
+
+# --- Caching ---
+
+
+def get_graph_cache_directory() -> Path:
+    cache_dir = core.get_cache_directory() / "condition_graph"
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    return cache_dir
+
+
+_KEY_LENGTH = 20
+
+
+def _hash(*parts) -> str:
+    return hashlib.sha256(repr(parts).encode()).hexdigest()[:_KEY_LENGTH]
+
+
+def _hash_hypnogram(hg: CompactHypnogram) -> str:
+    h = hashlib.sha256()
+    for arr in [hg.start_time, hg.end_time, hg.codes]:
+        h.update(np.ascontiguousarray(arr).tobytes())
+    h.update(repr(hg.states).encode())
+    return h.hexdigest()[:20]
+
+
+def _write(value, path: Path):
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "wb") as f:
+        if value is None:
+            np.savez(f, none=np.array(True))
+        elif isinstance(value, CompactHypnogram):
+            np.savez(
+                f,
+                start_time=value.start_time,
+                end_time=value.end_time,
+                codes=value.codes,
+                states=np.array(value.states, dtype=str),
+            )
+        else:
+            np.savez(f, value=np.asarray(value))
+    os.replace(tmp, path)  # Atomic, in case of concurrent jobs
+
+
+def _prune(cache_dir: Path, name: str, keep: Path):
+    """Remove a node's superseded results. Matching the key's length exactly means that
+    other nodes' results are never matched, whatever their names."""
+    for f in cache_dir.glob(f"{name}-{'?' * _KEY_LENGTH}.npz"):
+        if f != keep:
+            f.unlink(missing_ok=True)
+
+
+def _read(path: Path):
+    with np.load(path, allow_pickle=False) as npz:
+        if "none" in npz:
+            return None
+        if "value" in npz:
+            return npz["value"]
+        return CompactHypnogram(
+            npz["start_time"],
+            npz["end_time"],
+            npz["codes"],
+            tuple(str(s) for s in npz["states"]),
+        )
+
+
+# Node results by key, shared by every evaluation in this process. This is an LRU cache
+# about 15 probes deep (at ~60 nodes each), for reuse when e.g. re-evaluating with new
+# parameters. Reuse across runs and cohorts is left to the on-disk cache.
+_node_cache: OrderedDict[str, object] = OrderedDict()
+_node_cache_lock = threading.Lock()
+NODE_CACHE_MAXSIZE = 1024
+
+
+def clear_cache():
+    """Clear the in-memory cache. The on-disk cache is kept."""
+    with _node_cache_lock:
+        _node_cache.clear()
+
+
+def _memory_get(key: str) -> tuple[bool, object]:
+    with _node_cache_lock:
+        if key not in _node_cache:
+            return False, None
+        _node_cache.move_to_end(key)
+        return True, _node_cache[key]
+
+
+def _memory_put(key: str, value: object):
+    with _node_cache_lock:
+        _node_cache[key] = value
+        _node_cache.move_to_end(key)
+        while len(_node_cache) > NODE_CACHE_MAXSIZE:
+            _node_cache.popitem(last=False)
+
+
+@dataclass(frozen=True)
+class _Context:
+    experiment: str
+    subject: sglx.SGLXSubject
+
+
+def evaluate(
+    nodes: list[Node],
+    inputs: Mapping[str, object],
+    input_keys: Mapping[str, str],
+    params: Mapping[str, object],
+    cache_dir: Path | None = None,
+) -> tuple[dict[str, object], dict[str, str]]:
+    """Evaluate a graph, reusing cached node results where keys match.
+
+    Args:
+        nodes: In topological order.
+        inputs: Values of the graph's inputs.
+        input_keys: A content key for each input.
+        params: Values of the parameters nodes may depend on.
+        cache_dir: Where node results are persisted. Only the latest result of each
+            node is kept there. If None, only the in-memory cache is used.
+
+    Returns:
+        The result and key of every node and input, by name.
+    """
+    results = dict(inputs)
+    keys = dict(input_keys)
+    for node in nodes:
+        key = _hash(
+            GRAPH_VERSION,
+            node.name,
+            node.description,
+            [(p, params[p]) for p in node.params],
+            [keys[d] for d in node.deps],
+        )
+        keys[node.name] = key
+        path = cache_dir / f"{node.name}-{key}.npz" if cache_dir else None
+        on_disk = path is not None and path.exists()
+        in_memory, value = _memory_get(key)
+        if not in_memory:
+            if on_disk:
+                value = _read(path)
+            else:
+                args = [results[d] for d in node.deps]
+                if any(a is None for a in args) and not node.allow_none:
+                    value = None
+                else:
+                    value = node.fn(*args, **{p: params[p] for p in node.params})
+            _memory_put(key, value)
+        results[node.name] = value
+        # Keys depend only on content, so a node may already be in memory from another
+        # subject or experiment, without having been written to this directory.
+        if path is not None and not on_disk:
+            _write(value, path)
+            _prune(cache_dir, node.name, keep=path)
+    return results, keys
+
+
+def compute_conditions(
+    lbrl_hg: hyp.FloatHypnogram,
+    cons_hg: hyp.FloatHypnogram,
+    experiment: str,
+    subject: sglx.SGLXSubject,
+    extended_wake_kwargs: Mapping[str, float] = {},
+    circadian_match_tolerance: float = 30 * 60,
+    use_cache: bool = True,
+    probe: str | None = None,
+) -> dict[str, hyp.FloatHypnogram]:
+    """Evaluate the condition graph. See `cnd_hgs.compute_statistical_condition_hypnograms`
+    for the parameters and conditions.
+
+    Args:
+        use_cache: Whether to persist node results to, and reuse them from, the user
+            cache directory. Recent results are always reused within a process.
+        probe: The probe whose hypnograms these are. Only used to give each probe its
+            own cache directory, so that probes don't prune each other's results.
+    """
+    lbrl = CompactHypnogram.from_hypnogram(lbrl_hg)
+    cons = CompactHypnogram.from_hypnogram(cons_hg)
+    ctx = _Context(experiment, subject)
+    periods = get_periods(experiment, subject)
+    inputs = {
+        # get_extended_wake_hypnogram needs the full FloatHypnogram.
+        LIBERAL: lbrl_hg,
+        CONSERVATIVE: cons,
+        "context": ctx,
+        **{f"period:{name}": p for name, p in periods.items()},
+    }
+    input_keys = {
+        LIBERAL: _hash_hypnogram(lbrl),
+        CONSERVATIVE: _hash_hypnogram(cons),
+        "context": _hash(experiment, subject.name),
+        **{f"period:{name}": _hash(p) for name, p in periods.items()},
+    }
+    params = {
+        # Sorted items, so that the key doesn't depend on the dict's order.
+        "extended_wake_kwargs": tuple(sorted(extended_wake_kwargs.items())),
+        "circadian_match_tolerance": float(circadian_match_tolerance),
+    }
+    cache_dir = None
+    if use_cache:
+        name = "-".join(n for n in (subject.name, experiment, probe) if n)
+        cache_dir = get_graph_cache_directory() / name
+        cache_dir.mkdir(parents=True, exist_ok=True)
+    nodes = get_graph(experiment)
+    results, _ = evaluate(nodes, inputs, input_keys, params, cache_dir)
+    return {
+        LIBERAL: lbrl_hg,
+        CONSERVATIVE: cons_hg,
+        **{
+            node.name: results[node.name].to_hypnogram()
+            for node in nodes
+            if node.is_condition and results[node.name] is not None
+        },
+    }
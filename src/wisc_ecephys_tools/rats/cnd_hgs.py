@@ -7,30 +7,51 @@ The `exp_hgs` module, on the other hand, contains functions for getting a total
 experiment hypnogram, from which the hypnograms in this module are derived.
 
 Note 1:
-    Various calls to wne.sglx.SGLXSubject.dt2t pass "imec0" as the probe.
-    This is a hack/shortcut, to ensure that the times returned by dt2t are in the
-    experiment's canonical (synced) timebase. The biggest drawback of this approach is
-    that imec0 needs to be available. If it were not, we'd have to:
-    - Take `probe` as an argument.
-    - Create a time synchronizer object, and use that to convert the output of dt2t.
+    Datetimes are converted to the experiment's canonical (synced) timebase with
+    `SGLXSubject.dt2t` for imec0, whose timebase is the canonical one, batched into a
+    single call by `time_conversion.TimeConverter`. If imec0 were not available, the
+    converter for any other probe with a sync table would map its times to the canonical
+    timebase.
+
+Note 2:
+    Light/dark, novel objects, and conveyor-over-water periods are read from a period
+    table (see `get_period_table`), built once per experiment-subject from the params
+    file, and cached in memory and in the user cache directory. The cache is
+    invalidated when the params file (or the time converter's file index) changes.
+
+Note 3:
+    `compute_statistical_condition_hypnograms` derives its conditions from a
+    `compact_hgs.CompactHypnogram`, whose `trim`/`keep_*` return views rather than
+    DataFrame copies, through the dependency graph declared in `cnd_graph`. Each
+    condition is cached, so changing e.g. the circadian match tolerance only recomputes
+    the conditions that depend on it. The `get_*_hypnogram` functions below still take
+    and return FloatHypnograms, for use on their own.
 """
 
+import hashlib
+import inspect
 import itertools as it
+import os
 import warnings
+from collections.abc import Mapping, Sequence
+from functools import lru_cache
 from pathlib import Path
 from types import MappingProxyType
-from typing import Final
+from typing import TYPE_CHECKING, Final
 
-import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 from ecephys.wne import sglx
 
 from ecephys import hypnogram as hyp
-from ecephys import plot as eplt
-from wisc_ecephys_tools import core
+from wisc_ecephys_tools import constants, core, projects, sglx_index, time_conversion
 from wisc_ecephys_tools.rats.constants import SleepDeprivationExperiments as Exps
 
+if TYPE_CHECKING:
+    # matplotlib (and ecephys.plot) are only imported when plotting, to keep imports
+    # fast for batch jobs.
+    import matplotlib.pyplot as plt
+
 _LEGACY_CONDITION_NAMES_MAP: Final[MappingProxyType[str, str]] = MappingProxyType(
     {
         # Full experiment hypnograms
@@ -97,6 +118,123 @@ _LEGACY_CONDITION_NAMES_MAP: Final[MappingProxyType[str, str]] = MappingProxyTyp
 )
 
 
+PERIOD_TABLE_FORMAT_VERSION = 2
+
+# Datetime params that are converted to experiment times, by period name.
+_PERIOD_PARAMS = {
+    "novel_objects": ("novel_objects_start", "novel_objects_end"),
+    "conveyor_over_water": ("conveyor_over_water_start", "conveyor_over_water_end"),
+}
+
+
+def get_period_table_directory() -> Path:
+    table_dir = core.get_cache_directory() / "periods"
+    table_dir.mkdir(parents=True, exist_ok=True)
+    return table_dir
+
+
+def get_period_table_key(experiment: str, subject_name: str) -> str | None:
+    """Key the table by the params file's stat, and the time converter's index key.
+    Returns None if the params file can't be found, in which case nothing is cached."""
+    s3 = core.get_shared_project()
+    params_file = projects.get_experiment_subject_file(
+        s3, experiment, subject_name, constants.Files.EXPERIMENT_PARAMS
+    )
+    try:
+        st = os.stat(params_file)
+    except FileNotFoundError:
+        return None
+    index_key = sglx_index.get_index_key(subject_name, experiment, "imec0", "ap")
+    h = hashlib.sha256(
+        f"{PERIOD_TABLE_FORMAT_VERSION}:{params_file}:{st.st_mtime_ns}:{st.st_size}:"
+        f"{index_key}".encode()
+    )
+    return h.hexdigest()[:20]
+
+
+def _build_period_table(experiment: str, subject_name: str) -> pd.DataFrame:
+    s3 = core.get_shared_project()
+    params = s3.load_experiment_subject_params(experiment, subject_name)
+
+    # Light/dark periods, in chronological order.
+    on = pd.DataFrame(
+        {"time": [pd.to_datetime(x) for x in params["lightsOn"]], "transition": "on"}
+    )
+    off = pd.DataFrame(
+        {"time": [pd.to_datetime(x) for x in params["lightsOff"]], "transition": "off"}
+    )
+    df = pd.concat([on, off]).sort_values("time").reset_index(drop=True)
+    rows = [
+        ("lights", start.transition, start.time, end.time)
+        for start, end in it.pairwise(df.itertuples())
+    ]
+    for name, (start_key, end_key) in _PERIOD_PARAMS.items():
+        if start_key in params and end_key in params:
+            rows.append((name, name, params[start_key], params[end_key]))
+    table = pd.DataFrame(
+        rows, columns=["period", "label", "start_datetime", "end_datetime"]
+    )
+    table["start_datetime"] = pd.to_datetime(table["start_datetime"])
+    table["end_datetime"] = pd.to_datetime(table["end_datetime"])
+
+    # Convert every datetime at once.
+    tc = time_conversion.get_time_converter(subject_name, experiment)  # See Note 1
+    times = tc.dt2t(
+        np.concatenate([table["start_datetime"].values, table["end_datetime"].values])
+    )
+    table["start_time"] = times[: len(table)]
+    table["end_time"] = times[len(table) :]
+    return table
+
+
+@lru_cache(maxsize=128)
+def _get_period_table(experiment: str, subject_name: str, key: str) -> pd.DataFrame:
+    prefix = f"{subject_name}-{experiment}"
+    table_file = get_period_table_directory() / f"{prefix}-{key}.pqt"
+    if table_file.exists():
+        return pd.read_parquet(table_file)
+    table = _build_period_table(experiment, subject_name)
+    tmp = table_file.with_suffix(f".{os.getpid()}.tmp")
+    table.to_parquet(tmp, index=False)
+    os.replace(tmp, table_file)  # Atomic, in case of concurrent jobs
+    for f in get_period_table_directory().glob(f"{prefix}-*.pqt"):  # Old params
+        if f != table_file:
+            f.unlink(missing_ok=True)
+    return table
+
+
+def get_period_table(experiment: str, subject: sglx.SGLXSubject | str) -> pd.DataFrame:
+    """Get the experiment-subject's periods, with one row per period, in datetimes and
+    in experiment times. See Note 2.
+
+    Rows with period "lights" are the light/dark periods, in chronological order, with
+    label "on" or "off". The novel objects and conveyor-over-water periods, where the
+    params define them, have period (and label) "novel_objects" and
+    "conveyor_over_water".
+
+    Returns:
+        A frame with columns period, label, start_datetime, end_datetime, start_time,
+        and end_time. Do not modify it, since it is shared between callers.
+    """
+    subject_name = subject if isinstance(subject, str) else subject.name
+    key = get_period_table_key(experiment, subject_name)
+    if key is None:
+        return _build_period_table(experiment, subject_name)
+    return _get_period_table(experiment, subject_name, key)
+
+
+def _get_period(
+    experiment: str, subject: sglx.SGLXSubject, period: str
+) -> tuple[float, float]:
+    table = get_period_table(experiment, subject)
+    row = table[table["period"] == period]
+    if row.empty:
+        raise KeyError(
+            f"No {period} period in the params of {subject.name} {experiment}"
+        )
+    return (float(row["start_time"].iloc[0]), float(row["end_time"].iloc[0]))
+
+
 def get_light_dark_periods(
     experiment: str, subject: sglx.SGLXSubject, as_float: bool = True
 ) -> tuple[list[tuple], list[str]]:
@@ -110,29 +248,21 @@ def get_light_dark_periods(
     intervals = [(t1, t2), (t2, t3), (t3, t4), (t4, t5)]
     labels = ["on", "off", "on", "off"]
     """
-    s3 = core.get_shared_project()
-    params = s3.load_experiment_subject_params(experiment, subject.name)
-    on = pd.DataFrame(
-        {"time": [pd.to_datetime(x) for x in params["lightsOn"]], "transition": "on"}
-    )
-    off = pd.DataFrame(
-        {"time": [pd.to_datetime(x) for x in params["lightsOff"]], "transition": "off"}
-    )
-    df = pd.concat([on, off]).sort_values("time").reset_index(drop=True)
+    table = get_period_table(experiment, subject)
+    lights = table[table["period"] == "lights"]
     if as_float:
-        df["time"] = subject.dt2t(experiment, "imec0", df["time"].values)
-        # See Note 1 above.
-
-    periods = list(it.pairwise(df.itertuples()))
-    intervals = [(start.time, end.time) for start, end in periods]
-    labels = [start.transition for start, _ in periods]
+        starts, ends = lights["start_time"], lights["end_time"]
+    else:
+        starts, ends = lights["start_datetime"], lights["end_datetime"]
+    intervals = list(zip(starts, ends))
+    labels = lights["label"].tolist()
     return intervals, labels
 
 
 def plot_lights_overlay(
     intervals: list[tuple],
     interval_labels: list[str],
-    ax: plt.Axes,
+    ax: "plt.Axes",
     ymin=1.0,
     ymax=1.02,
     alpha=1.0,
@@ -174,16 +304,7 @@ def plot_lights_overlay(
 def get_novel_objects_period(
     experiment: str, subject: sglx.SGLXSubject
 ) -> tuple[float, float]:
-    s3 = core.get_shared_project()
-    params = s3.load_experiment_subject_params(experiment, subject.name)
-
-    start = pd.to_datetime(params["novel_objects_start"])
-    start = subject.dt2t(experiment, "imec0", start)  # See Note 1 above.
-
-    end = pd.to_datetime(params["novel_objects_end"])
-    end = subject.dt2t(experiment, "imec0", end)  # See Note 1 above.
-
-    return (start, end)
+    return _get_period(experiment, subject, "novel_objects")
 
 
 def get_novel_objects_hypnogram(
@@ -292,16 +413,7 @@ def get_circadian_match_hypnogram(
 def get_conveyor_over_water_period(
     experiment: str, wne_subject: sglx.SGLXSubject
 ) -> tuple[float, float]:
-    s3 = core.get_shared_project()
-    params = s3.load_experiment_subject_params(experiment, wne_subject.name)
-
-    start = pd.to_datetime(params["conveyor_over_water_start"])
-    start = wne_subject.dt2t(experiment, "imec0", start)  # See Note 1 above.
-
-    end = pd.to_datetime(params["conveyor_over_water_end"])
-    end = wne_subject.dt2t(experiment, "imec0", end)  # See Note 1 above.
-
-    return (start, end)
+    return _get_period(experiment, wne_subject, "conveyor_over_water")
 
 
 def get_sleep_deprivation_period(
@@ -328,9 +440,17 @@ def get_extended_wake_hypnogram(
     minimum_endpoint_bout_duration: float = 120,
     maximum_antistate_bout_duration: float = 90,
     minimum_fraction_of_final_match: float = 0.95,
+    sd_period: tuple[float, float] | None = None,
 ) -> hyp.FloatHypnogram | None:
-    """See ecephys.hypnogram.core.Hypnogram.get_consolidated."""
-    sd_start, sd_end = get_sleep_deprivation_period(experiment, wne_subject)
+    """See ecephys.hypnogram.core.Hypnogram.get_consolidated.
+
+    Args:
+        sd_period: The sleep deprivation period, if already known. Defaults to
+            `get_sleep_deprivation_period(experiment, wne_subject)`.
+    """
+    sd_start, sd_end = sd_period or get_sleep_deprivation_period(
+        experiment, wne_subject
+    )
     five_minutes = pd.to_timedelta("5m").total_seconds()
     is_nod = (full_hg["start_time"] >= (sd_start - five_minutes)) & (
         full_hg["end_time"] <= sd_end
@@ -356,6 +476,139 @@ def get_extended_wake_hypnogram(
         return None
 
 
+EXTENDED_WAKE_PARAMS = (
+    "minimum_endpoint_bout_duration",
+    "maximum_antistate_bout_duration",
+    "minimum_fraction_of_final_match",
+)
+
+
+def get_extended_wake_grid(**values: Sequence[float]) -> list[dict[str, float]]:
+    """Every combination of the given `get_extended_wake_hypnogram` kwargs, e.g.
+    `get_extended_wake_grid(maximum_antistate_bout_duration=[60, 90, 120])`. Kwargs
+    not given take their defaults."""
+    defaults = inspect.signature(get_extended_wake_hypnogram).parameters
+    axes = [values.get(k, [defaults[k].default]) for k in EXTENDED_WAKE_PARAMS]
+    return [dict(zip(EXTENDED_WAKE_PARAMS, combo)) for combo in it.product(*axes)]
+
+
+class _ConsolidationSums:
+    """Prefix sums over a hypnogram's bouts, for finding the first consolidated period
+    (see `get_consolidated`) under many parameter combinations.
+
+    Args:
+        starts, ends: Bout start and end times, sorted.
+        is_state: Whether each bout is of the states of interest.
+    """
+
+    def __init__(self, starts: np.ndarray, ends: np.ndarray, is_state: np.ndarray):
+        self.starts = starts
+        self.ends = ends
+        self.durations = ends - starts
+        self.is_state = is_state
+        # state_time[k] is the time spent in the states of interest in bouts [0, k).
+        self.state_time = np.concatenate(
+            [[0.0], np.cumsum(np.where(is_state, self.durations, 0.0))]
+        )
+
+    def find_first(
+        self,
+        minimum_time: float,
+        minimum_endpoint_bout_duration: float,
+        maximum_antistate_bout_duration: float,
+        frac: float,
+    ) -> tuple[int, int] | None:
+        """The first and last bout of the earliest, then longest, consolidated period,
+        or None if there is none."""
+        n = len(self.starts)
+        endpoints = np.flatnonzero(
+            self.is_state & (self.durations >= minimum_endpoint_bout_duration)
+        )
+        violations = np.flatnonzero(
+            ~self.is_state & (self.durations > maximum_antistate_bout_duration)
+        )
+        # A period can't extend past the first violating antistate bout after its start.
+        next_violation = np.append(violations, n)[
+            np.searchsorted(violations, endpoints)
+        ]
+        # Skip starts that can't accumulate `minimum_time` before then.
+        reachable = self.state_time[next_violation] - self.state_time[endpoints]
+        for a in np.flatnonzero(reachable >= minimum_time):
+            i = endpoints[a]
+            b = np.searchsorted(endpoints, next_violation[a])
+            js = endpoints[a:b]
+            t = self.state_time[js + 1] - self.state_time[i]
+            ok = (t >= minimum_time) & (t >= frac * (self.ends[js] - self.starts[i]))
+            if ok.any():
+                return int(i), int(js[np.flatnonzero(ok)[-1]])
+        return None
+
+
+def sweep_extended_wake(
+    full_hg: hyp.FloatHypnogram,
+    experiment: str,
+    wne_subject: sglx.SGLXSubject,
+    grid: Sequence[Mapping[str, float]],
+) -> pd.DataFrame:
+    """Find the extended wake period for every combination of kwargs in `grid`, in one
+    pass over shared bout prefix sums, rather than one `get_extended_wake_hypnogram`
+    call per combination.
+
+    The criteria are those of `get_consolidated`, as used by
+    `get_extended_wake_hypnogram`: the period starts and ends with bouts of at least
+    `minimum_endpoint_bout_duration`, has no antistate bout longer than
+    `maximum_antistate_bout_duration`, and spends at least
+    `minimum_fraction_of_final_match` of its time, and 80% of the SD duration, in
+    Wake/Artifact/Other (or NoData during SD). See
+    scripts/compare_extended_wake_sweep.py for a check against `get_consolidated`.
+
+    Args:
+        grid: kwargs for `get_extended_wake_hypnogram`, e.g. from
+            `get_extended_wake_grid`. Missing kwargs take their defaults.
+
+    Returns:
+        One row per grid entry, with the kwargs, and the start_time, end_time, and
+        duration of the Wake in the matched period (NaN if there was no match).
+    """
+    sd_start, sd_end = get_sleep_deprivation_period(experiment, wne_subject)
+    df = full_hg._df.sort_values("start_time", kind="stable")
+    starts = df["start_time"].to_numpy(np.float64)
+    ends = df["end_time"].to_numpy(np.float64)
+    states = df["state"].to_numpy()
+    five_minutes = pd.to_timedelta("5m").total_seconds()
+    # NoData during SD is actually wake. See `get_extended_wake_hypnogram`.
+    is_nod = (starts >= sd_start - five_minutes) & (ends <= sd_end)
+    is_state = np.isin(states, ["Wake", "Artifact", "Other"]) | (
+        is_nod & (states == "NoData")
+    )
+    sums = _ConsolidationSums(starts, ends, is_state)
+    wake = np.flatnonzero(states == "Wake")
+
+    defaults = get_extended_wake_grid()[0]
+    rows = []
+    for kwargs in grid:
+        kwargs = {**defaults, **kwargs}
+        match = sums.find_first(
+            (sd_end - sd_start) * 0.8,
+            kwargs["minimum_endpoint_bout_duration"],
+            kwargs["maximum_antistate_bout_duration"],
+            kwargs["minimum_fraction_of_final_match"],
+        )
+        start = end = np.nan
+        if match is not None:
+            # Like `.keep_states(["Wake"])` on the match, then taking its extent.
+            w0, w1 = (
+                np.searchsorted(wake, match[0]),
+                np.searchsorted(wake, match[1], "right"),
+            )
+            if w1 > w0:
+                start, end = starts[wake[w0]], ends[wake[w1 - 1]]
+        rows.append({**kwargs, "start_time": start, "end_time": end})
+    out = pd.DataFrame(rows, columns=[*EXTENDED_WAKE_PARAMS, "start_time", "end_time"])
+    out["duration"] = out["end_time"] - out["start_time"]
+    return out
+
+
 def get_conveyor_over_water_hypnogram(
     full_hg: hyp.FloatHypnogram,
     experiment: str,
@@ -382,6 +635,8 @@ def compute_statistical_condition_hypnograms(
     sglx_subject: sglx.SGLXSubject,
     extended_wake_kwargs: dict[str, float] = {},
     circadian_match_tolerance: float = pd.to_timedelta("0:30:00").total_seconds(),
+    use_cache: bool = True,
+    probe: str | None = None,
 ) -> dict[str, hyp.FloatHypnogram]:
     """Compute hypnograms for different statistical conditions.
 
@@ -405,127 +660,32 @@ def compute_statistical_condition_hypnograms(
     circadian_match_tolerance : float
         Tolerance for circadian match hypnogram, in seconds. Helpful in case there is
         not much sleep during the strict match window. Default is 30 minutes.
+    use_cache : bool
+        Whether to reuse, and persist, each condition's result in the user cache
+        directory. See `cnd_graph`.
+    probe : str, optional
+        The probe whose hypnograms these are. Only used to keep each probe's cached
+        results separate.
 
     Returns
     -------
     dict[str, hyp.FloatHypnogram]
         Dictionary mapping condition names to their corresponding hypnograms
     """
-    _1h = pd.to_timedelta("1:00:00").total_seconds()
-    _10min = pd.to_timedelta("0:10:00").total_seconds()
-
-    hgs = dict()
-    hgs["Full.Liberal"] = lbrl_hg
-    hgs["Full.Conservative"] = cons_hg
-
-    d1_hg = get_day1_hypnogram(cons_hg, experiment, sglx_subject)
-    hgs["BSL.Wake"] = d1_hg.keep_states(["Wake"])
-    hgs["BSL.REM"] = d1_hg.keep_states(["REM"])
-
-    d1lp_hg = get_day1_light_period_hypnogram(cons_hg, experiment, sglx_subject)
-    hgs["Early.BSL.NREM"] = d1lp_hg.keep_states(["NREM"]).keep_first(_1h)
-    hgs["Early.BSL.REM"] = d1lp_hg.keep_states(["REM"]).keep_first(_10min)
-
-    d1dp_hg = get_day1_dark_period_hypnogram(cons_hg, experiment, sglx_subject)
-    hgs["Last.BSL.NREM"] = d1dp_hg.keep_states(["NREM"]).keep_last(_1h)
-    hgs["Last.BSL.REM"] = d1dp_hg.keep_states(["REM"]).keep_last(_10min)
-
-    sd_hg = get_sleep_deprivation_hypnogram(cons_hg, experiment, sglx_subject)
-    hgs["SD"] = sd_hg.keep_states(["Wake", "NREM"])
-    hgs["Early.SD"] = hgs["SD"].keep_first(_1h)
-    hgs["Late.SD"] = hgs["SD"].keep_last(_1h)
-    # Analogous to Early/Late.EXT.
-
-    hgs["SD.Wake"] = sd_hg.keep_states(["Wake"])
-    hgs["Early.SD.Wake"] = hgs["SD.Wake"].keep_first(_1h)
-    hgs["Late.SD.Wake"] = hgs["SD.Wake"].keep_last(_1h)
-    # Analogous to Early/Late.EXT.Wake.
-
-    if experiment in [Exps.NOD, Exps.CTN]:
-        nod_hg = get_novel_objects_hypnogram(cons_hg, experiment, sglx_subject)
-        hgs["NOD"] = nod_hg.keep_states(["Wake", "NREM"])
-        hgs["Early.NOD"] = hgs["NOD"].keep_first(_1h)
-        hgs["Late.NOD"] = hgs["NOD"].keep_last(_1h)
-
-        hgs["NOD.Wake"] = nod_hg.keep_states(["Wake"])
-        hgs["Early.NOD.Wake"] = hgs["NOD.Wake"].keep_first(_1h)
-        hgs["Late.NOD.Wake"] = hgs["NOD.Wake"].keep_last(_1h)
-
-    if experiment in [Exps.COW, Exps.CTN]:
-        cow_hg = get_conveyor_over_water_hypnogram(cons_hg, experiment, sglx_subject)
-        hgs["COW"] = cow_hg.keep_states(["Wake", "NREM"])
-        hgs["Early.COW"] = hgs["COW"].keep_first(_1h)
-        hgs["Late.COW"] = hgs["COW"].keep_last(_1h)
-
-        hgs["COW.Wake"] = cow_hg.keep_states(["Wake"])
-        hgs["Early.COW.Wake"] = hgs["COW.Wake"].keep_first(_1h)
-        hgs["Late.COW.Wake"] = hgs["COW.Wake"].keep_last(_1h)
-
-    if experiment == Exps.CTN:
-        ctn_hg = sd_hg
-        hgs["CTN"] = ctn_hg.keep_states(["Wake", "NREM"])
-        hgs["Early.CTN"] = hgs["CTN"].keep_first(_1h)
-        hgs["Late.CTN"] = hgs["CTN"].keep_last(_1h)
-
-        hgs["CTN.Wake"] = ctn_hg.keep_states(["Wake"])
-        hgs["Early.CTN.Wake"] = hgs["CTN.Wake"].keep_first(_1h)
-        hgs["Late.CTN.Wake"] = hgs["CTN.Wake"].keep_last(_1h)
-
-    ext_hg = get_extended_wake_hypnogram(
-        lbrl_hg, experiment, sglx_subject, **extended_wake_kwargs
-    )
-    if ext_hg is None:
-        ext_hg = sd_hg
-    else:
-        ext_hg = cons_hg.trim(ext_hg["start_time"].min(), ext_hg["end_time"].max())
-        hgs["EXT"] = ext_hg.keep_states(["Wake", "NREM"])
-        hgs["Early.EXT"] = hgs["EXT"].keep_first(_1h)
-        hgs["Late.EXT"] = hgs["EXT"].keep_last(_1h)
-        # Scoring may be so good that local sleep was marked as NREM.
-        # If you want "mixed wake", Early/Late.EXT will include these microsleeps.
-
-        # If you want "pure wake", you can use "EXT.Wake" and company.
-        hgs["EXT.Wake"] = ext_hg.keep_states(["Wake"])
-        hgs["Early.EXT.Wake"] = hgs["EXT.Wake"].keep_first(_1h)
-        hgs["Late.EXT.Wake"] = hgs["EXT.Wake"].keep_last(_1h)
-        # If you want mixed wake exactly matched to these times, use e.g.
-        # matched_early_ext = hgs["EXT"].keep_states(["Wake", "NREM"]).trim(
-        #   hgs["Early.EXT.Wake"]["start_time"].min(),
-        #   hgs["Early.EXT.Wake"]["end_time"].max()
-        # )
-        # Note that `matched_early_ext` will not be exactly 1h long, and will not be
-        # exactly the same as `hgs["Early.EXT"]`! You have to decide what you want!
-
-    # In rare cases, ext_hg["end_time"].max() can be < sd_hg["end_time"].max(), if
-    # there was a lot of local sleep at the end of SD.
-    earliest_recovery_start = max(ext_hg["end_time"].max(), sd_hg["end_time"].max())
-    pdd2lp_hg = get_post_deprivation_day2_light_period_hypnogram(
+    # Conditions are evaluated as a dependency graph, with per-node cached results
+    # (see Note 3).
+    from wisc_ecephys_tools.rats import cnd_graph
+
+    return cnd_graph.compute_conditions(
+        lbrl_hg,
         cons_hg,
         experiment,
         sglx_subject,
-        sleep_deprivation_end=earliest_recovery_start,
+        extended_wake_kwargs=extended_wake_kwargs,
+        circadian_match_tolerance=circadian_match_tolerance,
+        use_cache=use_cache,
+        probe=probe,
     )
-    hgs["Early.REC.NREM"] = pdd2lp_hg.keep_states(["NREM"]).keep_first(_1h)
-    hgs["Early.REC.REM"] = pdd2lp_hg.keep_states(["REM"]).keep_first(_10min)
-    hgs["Late.REC.NREM"] = pdd2lp_hg.keep_states(["NREM"]).keep_last(_1h)
-    hgs["Late.REC.REM"] = pdd2lp_hg.keep_states(["REM"]).keep_last(_10min)
-
-    hgs["Early.REC.NREM.Match"] = get_circadian_match_hypnogram(
-        cons_hg,
-        start=hgs["Early.REC.NREM"]["start_time"].min() - circadian_match_tolerance,
-        end=hgs["Early.REC.NREM"]["end_time"].max() + circadian_match_tolerance,
-    ).keep_states(["NREM"])
-    hgs["Early.REC.REM.Match"] = get_circadian_match_hypnogram(
-        cons_hg,
-        start=hgs["Early.REC.REM"]["start_time"].min() - circadian_match_tolerance,
-        end=hgs["Early.REC.REM"]["end_time"].max() + circadian_match_tolerance,
-    ).keep_states(["REM"])
-
-    d2dp_hg = get_day2_dark_period_hypnogram(cons_hg, experiment, sglx_subject)
-    hgs["Last.REC.NREM"] = d2dp_hg.keep_states(["NREM"]).keep_last(_1h)
-    hgs["Last.REC.REM"] = d2dp_hg.keep_states(["REM"]).keep_last(_10min)
-
-    return hgs
 
 
 def save_statistical_condition_hypnograms(
@@ -569,8 +729,20 @@ def load_statistical_condition_hypnograms(
     subject: str,
     experiment: str,
     probe: str | None,
-    project: sglx.SGLXProject = core.get_shared_project(),
+    project: sglx.SGLXProject | None = None,
 ) -> dict[str, hyp.FloatHypnogram]:
+    """Load a subject/probe's condition hypnograms (or the consensus, if `probe` is
+    None), from the cohort dataset (see `cnd_dataset`) if they are there, and otherwise
+    from the experiment-subject directory of the shared project. If `project` is given,
+    only its experiment-subject directory is read."""
+    if project is None:
+        from wisc_ecephys_tools.rats import cnd_dataset
+
+        try:
+            return cnd_dataset.load_condition_hypnograms(experiment, subject, probe)
+        except FileNotFoundError:
+            pass
+    project = project or core.get_shared_project()
     if probe is None:
         fname = "consensus_condition_hypnograms.parquet"
     else:
@@ -587,7 +759,7 @@ def plot_condition_hgs_dense(
     experiment: str | None = None,
     subject: sglx.SGLXSubject | None = None,
     show_ticklabels: bool = False,
-) -> plt.Axes:
+) -> "plt.Axes":
     """Plot each condition on the same axis, so that they can all be seen at once.
 
     Palette keys must be the names of the conditions to plot, and values must be
@@ -610,6 +782,8 @@ def plot_condition_hgs_dense(
     )._df
     df = hyp.reconcile_hypnograms(df1, df2)
 
+    from ecephys import plot as eplt
+
     palette = palette.copy()
     palette["None"] = "white"
     ax = eplt.plot_hypnogram_overlay(
@@ -627,58 +801,97 @@ def plot_condition_hgs_dense(
     return ax
 
 
+def _get_bout_rectangles(
+    starts: np.ndarray, ends: np.ndarray, ymin: float, ymax: float
+) -> np.ndarray:
+    """Vertices of one rectangle per bout, shaped (n_bouts, 4, 2)."""
+    verts = np.empty((len(starts), 4, 2))
+    verts[:, [0, 1], 0] = starts[:, None]
+    verts[:, [2, 3], 0] = ends[:, None]
+    verts[:, [0, 3], 1] = ymin
+    verts[:, [1, 2], 1] = ymax
+    return verts
+
+
+def plot_condition_hgs_batched(
+    hgs: Mapping[str, hyp.FloatHypnogram | pd.DataFrame],
+    palette: dict[str, str],
+    ax: "plt.Axes",
+    experiment: str | None = None,
+    subject: sglx.SGLXSubject | str | None = None,
+    rasterized: bool = True,
+) -> "plt.Axes":
+    """Like `plot_condition_hgs_dense`, but draw every bout of every condition as one
+    collection, rather than one patch per bout, onto an existing axis.
+
+    Conditions are drawn in palette order, so later conditions are drawn over earlier
+    ones. The light/dark periods are likewise drawn as one collection, above the axis.
+
+    Args:
+        rasterized: Rasterize the bouts when saving to a vector format (e.g. PDF), so
+            that file size doesn't grow with the number of bouts.
+    """
+    from matplotlib import colors as mcolors
+    from matplotlib.collections import PolyCollection
+
+    names = [c for c in palette if c in hgs]
+    dfs = [
+        hgs[c]._df if isinstance(hgs[c], hyp.FloatHypnogram) else hgs[c] for c in names
+    ]
+    starts = np.concatenate(
+        [df["start_time"].to_numpy(np.float64) for df in dfs] or [[]]
+    )
+    ends = np.concatenate([df["end_time"].to_numpy(np.float64) for df in dfs] or [[]])
+    rgba = np.repeat(
+        mcolors.to_rgba_array([palette[c] for c in names]).reshape(-1, 4),
+        [len(df) for df in dfs],
+        axis=0,
+    )
+    bouts = PolyCollection(
+        _get_bout_rectangles(starts, ends, 0, 1),
+        facecolors=rgba,
+        edgecolors="none",
+        antialiaseds=False,
+        rasterized=rasterized,
+    )
+    ax.add_collection(bouts)
+
+    # Span the whole experiment, as plot_condition_hgs_dense does with a dummy.
+    xlim_hg = hgs.get("Full.Liberal")
+    if xlim_hg is not None:
+        xlim_df = xlim_hg._df if isinstance(xlim_hg, hyp.FloatHypnogram) else xlim_hg
+        ax.set_xlim(xlim_df["start_time"].min(), xlim_df["end_time"].max())
+    elif len(starts):
+        ax.set_xlim(starts.min(), ends.max())
+    ax.set_ylim(0, 1)
+
+    if experiment and subject:
+        intervals, labels = get_light_dark_periods(experiment, subject)
+        lights_colors = {"on": "yellow", "off": "gray"}
+        # Clip manually on the x axis, so that clip_on=False only applies to y.
+        xlim = ax.get_xlim()
+        on_off = np.clip(np.array(intervals, dtype=np.float64), *xlim)
+        lights = PolyCollection(
+            _get_bout_rectangles(on_off[:, 0], on_off[:, 1], 1.0, 1.04),
+            facecolors=[lights_colors[lbl] for lbl in labels],
+            edgecolors="none",
+            transform=ax.get_xaxis_transform(),  # y in axis coordinates
+            clip_on=False,
+        )
+        ax.add_collection(lights)
+    ax.set_yticks([])
+    return ax
+
+
 def get_consensus(
     prb_hgs: dict[str, dict[str, hyp.FloatHypnogram]],
 ) -> tuple[dict[str, hyp.FloatHypnogram], pd.DataFrame]:
     """
     Get the consensus hypnogram for each condition, and a dataframe summarizing the
     duration of each condition in each probe.
-    """
-    # Get the set of conditions from each probe's hypnograms
-    condition_lists = [list(hgs.keys()) for hgs in prb_hgs.values()]
-    conditions = condition_lists[0]
-
-    # Assert that all probes have the same conditions
-    for cl in condition_lists[1:]:
-        assert set(cl) == set(conditions), (
-            "All probes must have the same set of conditions"
-        )
-
-    # Get the consensus hypnogram for each condition
-    consensus_hgs = {
-        condition: hyp.FloatHypnogram.get_consensus(
-            *[prb_hgs[prb][condition] for prb in prb_hgs.keys()]
-        ).drop_states(["None"])
-        for condition in conditions
-    }
-
-    # Get the duration of each condition in each probe
-    prb_durations = {
-        prb: {
-            condition: prb_hgs[prb][condition]["duration"].sum()
-            for condition in conditions
-        }
-        for prb in prb_hgs.keys()
-    }
-
-    # Get the duration of each condition in the consensus hypnogram
-    consensus_durations = {
-        condition: consensus_hgs[condition]["duration"].sum()
-        for condition in conditions
-    }
 
-    # Create a dataframe with both consensus and probe durations
-    df = pd.DataFrame(
-        {
-            "condition": conditions,
-            "consensus": list(consensus_durations.values()),
-            **{prb: list(prb_durations[prb].values()) for prb in prb_hgs.keys()},
-        }
-    )
-
-    # Calculate the approximate loss in duration for each condition
-    df["approximate_loss"] = np.round(
-        df[list(prb_hgs.keys())].min(axis=1) - df["consensus"], decimals=1
-    )
+    All conditions and probes are handled in one sweep. See `consensus`.
+    """
+    from wisc_ecephys_tools.rats import consensus
 
-    return consensus_hgs, df
+    return consensus.get_consensus_many(prb_hgs)
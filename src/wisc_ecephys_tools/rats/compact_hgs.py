@@ -0,0 +1,164 @@
+"""
+A compact, array-backed hypnogram, for deriving many condition hypnograms cheaply.
+
+`cnd_hgs.compute_statistical_condition_hypnograms` derives ~40 hypnograms per probe from
+the same full-experiment hypnogram, through chains of `trim`, `keep_states`,
+`keep_first`, and `keep_last`. With `FloatHypnogram`, every step copies a DataFrame with
+an object-dtype state column. A `CompactHypnogram` instead holds contiguous float64
+start/end arrays and uint8 state codes into a vocabulary shared by every hypnogram
+derived from it:
+
+- `trim` finds the overlapping bouts with two binary searches (bouts are sorted and
+  non-overlapping), and returns views of the parent's arrays. Only the start/end array
+  whose boundary bout is actually truncated is copied.
+- `keep_first` and `keep_last` find their cut with a cumulative sum and a binary search,
+  and likewise return views.
+- `keep_states` compares uint8 codes, not strings.
+
+Semantics match the `FloatHypnogram` methods of the same names, except that columns
+other than state, start_time, end_time, and duration are not carried along. Convert with
+`from_hypnogram` and `to_hypnogram` at API boundaries only. See
+scripts/compare_compact_hypnograms.py for a check against `FloatHypnogram`.
+"""
+
+from collections.abc import Sequence
+
+import numpy as np
+import pandas as pd
+
+from ecephys import hypnogram as hyp
+
+
+class CompactHypnogram:
+    """A hypnogram of sorted, non-overlapping bouts, stored as arrays.
+
+    Args:
+        start_time: Bout start times, float64.
+        end_time: Bout end times, float64.
+        codes: Bout states, as uint8 positions in `states`.
+        states: The state vocabulary.
+    """
+
+    __slots__ = ("start_time", "end_time", "codes", "states")
+
+    def __init__(
+        self,
+        start_time: np.ndarray,
+        end_time: np.ndarray,
+        codes: np.ndarray,
+        states: tuple[str, ...],
+    ):
+        self.start_time = start_time
+        self.end_time = end_time
+        self.codes = codes
+        self.states = states
+
+    @classmethod
+    def from_hypnogram(
+        cls, hg: hyp.FloatHypnogram | pd.DataFrame
+    ) -> "CompactHypnogram":
+        df = hg._df if isinstance(hg, hyp.FloatHypnogram) else hg
+        df = df.sort_values("start_time", kind="stable")
+        codes, states = pd.factorize(df["state"], sort=True)
+        if len(states) > np.iinfo(np.uint8).max:
+            raise ValueError(f"Too many states for uint8 codes: {len(states)}")
+        return cls(
+            np.ascontiguousarray(df["start_time"].to_numpy(np.float64)),
+            np.ascontiguousarray(df["end_time"].to_numpy(np.float64)),
+            codes.astype(np.uint8),
+            tuple(states),
+        )
+
+    def to_hypnogram(self) -> hyp.FloatHypnogram:
+        return hyp.FloatHypnogram(self.to_frame())
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame(
+            {
+                "state": np.asarray(self.states, dtype=object)[self.codes],
+                "start_time": self.start_time,
+                "end_time": self.end_time,
+                "duration": self.duration,
+            }
+        )
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __repr__(self) -> str:
+        return f"CompactHypnogram({len(self)} bouts, states={self.states})"
+
+    @property
+    def duration(self) -> np.ndarray:
+        return self.end_time - self.start_time
+
+    @property
+    def start(self) -> float:
+        """Start of the first bout, or NaN if empty (like `hg["start_time"].min()`)."""
+        return float(self.start_time[0]) if len(self) else np.nan
+
+    @property
+    def end(self) -> float:
+        """End of the last bout, or NaN if empty (like `hg["end_time"].max()`)."""
+        return float(self.end_time[-1]) if len(self) else np.nan
+
+    def _slice(self, i0: int, i1: int) -> "CompactHypnogram":
+        return CompactHypnogram(
+            self.start_time[i0:i1], self.end_time[i0:i1], self.codes[i0:i1], self.states
+        )
+
+    def _take(self, mask: np.ndarray) -> "CompactHypnogram":
+        return CompactHypnogram(
+            self.start_time[mask], self.end_time[mask], self.codes[mask], self.states
+        )
+
+    def get_codes(self, states: Sequence[str]) -> np.ndarray:
+        return np.array(
+            [self.states.index(s) for s in states if s in self.states], dtype=np.uint8
+        )
+
+    def trim(self, start: float, end: float) -> "CompactHypnogram":
+        """Keep bouts overlapping [start, end], truncated to it."""
+        if np.isnan(start) or np.isnan(end):
+            return self._slice(0, 0)
+        i0 = int(np.searchsorted(self.end_time, start, side="right"))
+        i1 = int(np.searchsorted(self.start_time, end, side="left"))
+        out = self._slice(i0, max(i0, i1))
+        if len(out) and out.start_time[0] < start:
+            out.start_time = out.start_time.copy()
+            out.start_time[0] = start
+        if len(out) and out.end_time[-1] > end:
+            out.end_time = out.end_time.copy()
+            out.end_time[-1] = end
+        return out
+
+    def keep_states(self, states: Sequence[str]) -> "CompactHypnogram":
+        return self._take(np.isin(self.codes, self.get_codes(states)))
+
+    def keep_first(self, cumulative_duration: float) -> "CompactHypnogram":
+        """Keep bouts until `cumulative_duration` is reached, truncating the last."""
+        cumsum = np.cumsum(self.duration)
+        k = int(np.searchsorted(cumsum, cumulative_duration, side="left"))
+        if k >= len(self):
+            return self
+        out = self._slice(0, k + 1)
+        excess = cumsum[k] - cumulative_duration
+        if excess > 0:
+            out.end_time = out.end_time.copy()
+            out.end_time[-1] -= excess
+        return out
+
+    def keep_last(self, cumulative_duration: float) -> "CompactHypnogram":
+        """Keep the last bouts adding up to `cumulative_duration`, truncating the
+        first."""
+        cumsum = np.cumsum(self.duration[::-1])
+        k = int(np.searchsorted(cumsum, cumulative_duration, side="left"))
+        if k >= len(self):
+            return self
+        n = len(self)
+        out = self._slice(n - k - 1, n)
+        excess = cumsum[k] - cumulative_duration
+        if excess > 0:
+            out.start_time = out.start_time.copy()
+            out.start_time[0] += excess
+        return out
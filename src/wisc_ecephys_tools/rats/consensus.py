@@ -0,0 +1,133 @@
+"""
+N-way consensus of many probes' condition hypnograms, for all conditions in one sweep.
+
+`cnd_hgs.get_consensus` used to call `FloatHypnogram.get_consensus` once per condition
+(~40 per experiment-subject), merging probes pairwise, and then sum durations condition
+by condition. Here, every probe's bouts for every condition are taken at once:
+
+- Bout boundaries are ranked, and keyed by (condition, rank), so that one sorted
+  array of boundaries splits every condition's timeline into elementary segments.
+- Each probe labels every segment with the state of its bout covering it (or none),
+  with one binary search. Cost is linear in the number of probes, not pairwise.
+- A segment is kept if every probe labels it with the same state.
+
+Consensus bouts are these agreed segments, so they are split wherever any probe has a
+bout boundary, as with pairwise consensus. Durations of every condition, in every probe
+and in the consensus, are summed with `np.bincount` in the same pass.
+"""
+
+from collections.abc import Mapping
+
+import numpy as np
+import pandas as pd
+
+from ecephys import hypnogram as hyp
+
+_COLUMNS = ["state", "start_time", "end_time", "duration"]
+
+
+def get_consensus_many(
+    prb_hgs: Mapping[str, Mapping[str, hyp.FloatHypnogram]],
+) -> tuple[dict[str, hyp.FloatHypnogram], pd.DataFrame]:
+    """Get the consensus hypnogram of every condition across probes.
+
+    Args:
+        prb_hgs: Condition hypnograms, keyed by probe, then by condition. Every probe
+            must have the same conditions, and each hypnogram's bouts must not overlap.
+
+    Returns:
+        The consensus hypnogram of each condition, in the first probe's condition order,
+        and a frame with the duration of each condition in the consensus and in each
+        probe (one column per probe).
+    """
+    probes = list(prb_hgs)
+    conditions = list(prb_hgs[probes[0]])
+    for prb in probes[1:]:
+        assert set(prb_hgs[prb]) == set(conditions), (
+            "All probes must have the same set of conditions"
+        )
+
+    # Every bout of every (probe, condition), as flat arrays.
+    frames = [prb_hgs[prb][cnd]._df for prb in probes for cnd in conditions]
+    lengths = np.array([len(df) for df in frames])
+    probe_ids = np.repeat(np.repeat(np.arange(len(probes)), len(conditions)), lengths)
+    cnd_ids = np.repeat(np.tile(np.arange(len(conditions)), len(probes)), lengths)
+    starts = np.concatenate([df["start_time"].to_numpy(np.float64) for df in frames])
+    ends = np.concatenate([df["end_time"].to_numpy(np.float64) for df in frames])
+    durations = np.concatenate([df["duration"].to_numpy(np.float64) for df in frames])
+    codes, states = pd.factorize(
+        np.concatenate([df["state"].to_numpy(object) for df in frames])
+    )
+
+    # Rank times, so that (condition, time) keys are exact int64s.
+    times = np.unique(np.concatenate([starts, ends]))
+    stride = len(times) + 1
+    start_keys = cnd_ids * stride + np.searchsorted(times, starts)
+    end_keys = cnd_ids * stride + np.searchsorted(times, ends)
+
+    # Elementary segments: consecutive boundaries within the same condition.
+    boundaries = np.unique(np.concatenate([start_keys, end_keys]))
+    same_cnd = boundaries[:-1] // stride == boundaries[1:] // stride
+    seg_starts = boundaries[:-1][same_cnd]
+    seg_ends = boundaries[1:][same_cnd]
+
+    # Label segments with each probe's covering bout, and keep those all agree on.
+    agreed = np.ones(len(seg_starts), dtype=bool)
+    seg_codes = None
+    for p in range(len(probes)):
+        mine = probe_ids == p
+        order = np.argsort(start_keys[mine], kind="stable")
+        p_starts, p_ends = start_keys[mine][order], end_keys[mine][order]
+        p_codes = codes[mine][order]
+        i = np.searchsorted(p_starts, seg_starts, side="right") - 1
+        covered = i >= 0
+        covered[covered] = seg_starts[covered] < p_ends[i[covered]]
+        # Position -1 is a sentinel, for segments the probe doesn't cover.
+        labels = np.append(p_codes, -1)[np.where(covered, i, -1)]
+        if seg_codes is None:
+            seg_codes = labels
+        agreed &= covered & (labels == seg_codes)
+    if seg_codes is None:
+        seg_codes = np.empty(0, dtype=np.int64)
+
+    out_cnds = seg_starts[agreed] // stride
+    out_starts = times[seg_starts[agreed] % stride]
+    out_ends = times[seg_ends[agreed] % stride]
+    out_states = np.asarray(states, dtype=object)[seg_codes[agreed]]
+
+    # Segments are sorted by condition, so each condition's bouts are contiguous.
+    splits = np.searchsorted(out_cnds, np.arange(len(conditions) + 1))
+    consensus_hgs = {}
+    for k, cnd in enumerate(conditions):
+        sl = slice(splits[k], splits[k + 1])
+        consensus_hgs[cnd] = hyp.FloatHypnogram(
+            pd.DataFrame(
+                {
+                    "state": out_states[sl],
+                    "start_time": out_starts[sl],
+                    "end_time": out_ends[sl],
+                    "duration": out_ends[sl] - out_starts[sl],
+                },
+                columns=_COLUMNS,
+            )
+        )
+
+    n = len(conditions)
+    df = pd.DataFrame(
+        {
+            "condition": conditions,
+            "consensus": np.bincount(
+                out_cnds, weights=out_ends - out_starts, minlength=n
+            ),
+            **{
+                prb: np.bincount(
+                    cnd_ids[probe_ids == p],
+                    weights=durations[probe_ids == p],
+                    minlength=n,
+                )
+                for p, prb in enumerate(probes)
+            },
+        }
+    )
+    df["approximate_loss"] = np.round(df[probes].min(axis=1) - df["consensus"], 1)
+    return consensus_hgs, df
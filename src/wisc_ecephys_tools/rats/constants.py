@@ -5,3 +5,15 @@ class SleepDeprivationExperiments(StrEnum):
     NOD = "novel_objects_deprivation"
     COW = "conveyor_over_water"
     CTN = "conveyor_then_novelty"
+
+
+class ReadinessChecks(StrEnum):
+    """Names of the `utils.has_*` checks recorded in the readiness manifest."""
+
+    LFPS = "lfps"
+    HYPNOGRAM = "hypnogram"  # probe=None is the probe-agnostic hypnogram
+    ANATOMY = "anatomy"
+    SORTING = "sorting"
+    AP_SYNC_TABLE = "ap_sync_table"  # Always probe=None
+    LF_SYNC_TABLE = "lf_sync_table"  # Always probe=None
+    BAD_CHANNELS_MARKED = "bad_channels_marked"
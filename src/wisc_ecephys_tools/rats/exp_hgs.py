@@ -1,11 +1,26 @@
+import fnmatch
+import hashlib
+import inspect
+import json
+import os
+import threading
+from collections.abc import Mapping, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from types import MappingProxyType
+from typing import Final
+
+import numpy as np
 import pandas as pd
 from ecephys.wne import utils as wne_utils
+from ecephys.wne.constants import Files
 from ecephys.wne.sglx import SGLXProject, SGLXSubject, legacy_sorting
 from ecephys.wne.sglx import utils as sglx_utils
 
 from ecephys import hypnogram as hyp
 from ecephys import wne
-from wisc_ecephys_tools import constants
+from wisc_ecephys_tools import constants, core, projects, sglx_index
+from wisc_ecephys_tools.rats import hypnogram_edits, reconcile
 
 
 def _load_ephyviewer_hypnogram_edits(
@@ -13,6 +28,8 @@ def _load_ephyviewer_hypnogram_edits(
     experiment: str,
     subject: str,
     simplify: bool = True,
+    start_time: float | None = None,
+    end_time: float | None = None,
 ) -> hyp.FloatHypnogram:
     """
     Load a hypnogram of EphyViewer edits.
@@ -22,25 +39,50 @@ def _load_ephyviewer_hypnogram_edits(
         experiment: The experiment to load the edits for.
         subject: The subject to load the edits for.
         simplify: Whether to simplify the edit states.
+        start_time, end_time: If given, only edits overlapping this window are kept,
+            clipped to it.
 
     Returns:
-        A hypnogram of EphyViewer edits. Empty if the file does not exist.
+        A hypnogram of EphyViewer edits, condensed. Empty if there are none.
     """
-    f = project.get_experiment_subject_file(
-        experiment, subject, constants.Files.HYPNOGRAM_EPHYVIEWER_EDITS
-    )
-    if not f.exists():
+    # Reads the compacted snapshot and the journal's tail. See `hypnogram_edits`.
+    store = hypnogram_edits.get_edit_store(project, experiment, subject)
+    if not store.exists():
         return hyp.FloatHypnogram(
             pd.DataFrame([], columns=["state", "start_time", "end_time", "duration"])
         )
+    df = store.load(
+        "simplified" if simplify else "condensed",
+        start_time=start_time,
+        end_time=end_time,
+    )
+    return hyp.FloatHypnogram(_clip(df, start_time, end_time))
+
+
+def _overlaps(
+    df: pd.DataFrame, start_time: float | None, end_time: float | None
+) -> pd.Series:
+    """Which bouts overlap [start_time, end_time]. Either end may be None (unbounded)."""
+    mask = pd.Series(True, index=df.index)
+    if start_time is not None:
+        mask &= df["end_time"] > start_time
+    if end_time is not None:
+        mask &= df["start_time"] < end_time
+    return mask
+
 
-    df = pd.read_csv(f, sep=",")
-    df = df.rename({"time": "start_time", "label": "state"}, axis=1)
-    df["end_time"] = df["start_time"] + df["duration"]
-    hg = hyp.FloatHypnogram(df)
-    if simplify:
-        hg = hg.replace_states(wne.SIMPLIFIED_STATES)
-    return hyp.FloatHypnogram(hyp.condense(hg._df, 0.1))
+def _clip(
+    df: pd.DataFrame, start_time: float | None, end_time: float | None
+) -> pd.DataFrame:
+    """Keep only bouts overlapping [start_time, end_time], truncated to it, as
+    `FloatHypnogram.trim` would."""
+    if start_time is None and end_time is None:
+        return df
+    df = df[_overlaps(df, start_time, end_time)].copy()
+    df["start_time"] = df["start_time"].clip(lower=start_time)
+    df["end_time"] = df["end_time"].clip(upper=end_time)
+    df["duration"] = df["end_time"] - df["start_time"]
+    return df.reset_index(drop=True)
 
 
 def _get_gaps(
@@ -70,11 +112,14 @@ def _get_nodata_from_sorting(
     subject: SGLXSubject,
     experiment: str,
     probe: str,
+    start_time: float | None = None,
+    end_time: float | None = None,
 ) -> hyp.FloatHypnogram:
     """
     Get a hypnogram of NoData periods inferred from the sorting segments table.
     This is not entirely accurate, because segments may have been excluded from the
-    sorting for reasons other than missing data.
+    sorting for reasons other than missing data. If a window is given, only the kept
+    segments around it are considered.
     """
     segments = legacy_sorting.load_slice_table_from_sorting_folder(
         project,
@@ -84,38 +129,65 @@ def _get_nodata_from_sorting(
         probe,
         "sorting",
         return_excised_slices=True,
-    ).copy()
+    )
+    segments = segments.loc[segments["sliceType"] == "keep"].sort_values(
+        "segmentExpmtPrbAcqFirstTime", kind="stable"
+    )
+    if start_time is not None or end_time is not None:
+        # As for the SGLX file table: one extra segment on either side of the window is
+        # enough to find the gaps that straddle its edges, despite the timebases.
+        i0 = np.searchsorted(
+            segments["segmentExpmtPrbAcqLastTime"].to_numpy(),
+            -np.inf if start_time is None else start_time,
+        )
+        i1 = np.searchsorted(
+            segments["segmentExpmtPrbAcqFirstTime"].to_numpy(),
+            np.inf if end_time is None else end_time,
+            side="right",
+        )
+        segments = segments.iloc[max(i0 - 1, 0) : max(i0, i1) + 1]
 
     # Convert from probe timebase to common timebase asap
     t2t = sglx_utils.get_time_synchronizer(
         project, subject, experiment, probe=probe, stream="ap"
     )
-    segments = pd.DataFrame(
+    has_data = pd.DataFrame(
         {
             "start_time": t2t(segments["segmentExpmtPrbAcqFirstTime"]),
             "end_time": t2t(segments["segmentExpmtPrbAcqLastTime"]),
-            "sliceType": segments["sliceType"],
         }
     )
-    has_data = segments.loc[segments["sliceType"] == "keep"]
 
     no_data = _infer_nodata(has_data)
-    return hyp.FloatHypnogram(no_data)
+    return hyp.FloatHypnogram(_clip(no_data, start_time, end_time))
 
 
 def _get_nodata_from_sglx_filetable(
-    project: SGLXProject, experiment: str, subject: SGLXSubject, probe: str, stream: str
+    project: SGLXProject,
+    experiment: str,
+    subject: SGLXSubject,
+    probe: str,
+    stream: str,
+    start_time: float | None = None,
+    end_time: float | None = None,
 ) -> hyp.FloatHypnogram:
     """
-    Get a hypnogram of NoData periods inferred from the SGLX filetable.
+    Get a hypnogram of NoData periods inferred from the SGLX filetable, via its
+    persisted file index (see `wisc_ecephys_tools.sglx_index`). If a window is given,
+    only the files around it are considered.
     """
-    ftable = subject.get_experiment_frame(
-        experiment,
-        alias="full",
-        probe=probe,
-        stream=stream,
-        ftype="bin",
-    )
+    # Raises UnfinalizedRecordingError if any file has unknown acquisition offsets.
+    index = sglx_index.get_sglx_file_index(subject, experiment, probe, stream)
+    files = index.table
+    if start_time is not None or end_time is not None:
+        # The window is in the common timebase, and the index in the probe's, but they
+        # differ by far less than a file. One extra file on either side is enough to
+        # find the gaps that straddle the window's edges.
+        sl = index.slice(
+            -np.inf if start_time is None else start_time,
+            np.inf if end_time is None else end_time,
+        )
+        files = files.iloc[max(sl.start - 1, 0) : sl.stop + 1]
 
     # Convert from probe timebase to common timebase asap
     t2t = sglx_utils.get_time_synchronizer(
@@ -125,21 +197,15 @@ def _get_nodata_from_sglx_filetable(
         probe=probe,
         stream=stream,
     )
-    if ftable["expmtPrbAcqFirstTime"].isna().any():
-        raise sglx_utils.UnfinalizedRecordingError(
-            "exp_hgs: ftable has unknown acquisition offsets (NaN "
-            "expmtPrbAcqFirstTime) from an un-finalized recording; re-finalize the "
-            "metas (ecephys.sglx.repair_metadata) or exclude the session."
-        )
     has_data = pd.DataFrame(
         {
-            "start_time": t2t(ftable["expmtPrbAcqFirstTime"]),
-            "end_time": t2t(ftable["expmtPrbAcqLastTime"]),
+            "start_time": t2t(files["start_time"]),
+            "end_time": t2t(files["end_time"]),
         }
     )
 
     no_data = _infer_nodata(has_data)
-    return hyp.FloatHypnogram(no_data)
+    return hyp.FloatHypnogram(_clip(no_data, start_time, end_time))
 
 
 def _artifacts_as_hypnogram(artifacts: pd.DataFrame) -> hyp.FloatHypnogram:
@@ -185,6 +251,118 @@ def load_consolidated_hypnogram(
             )
 
 
+# Bump this if the way hypnograms are assembled changes, to invalidate cached results.
+HYPNOGRAM_CACHE_VERSION = 2
+
+
+def get_hypnogram_cache_directory() -> Path:
+    cache_dir = core.get_cache_directory() / "hypnograms"
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    return cache_dir
+
+
+def _get_flags_key(flags: dict) -> str:
+    return hashlib.sha256(json.dumps(flags, sort_keys=True).encode()).hexdigest()[:8]
+
+
+def _list_matching(
+    directory: Path, patterns: list[str], exclude: tuple[str, ...] = ()
+) -> list[tuple[str, int, int]]:
+    """(name, mtime_ns, size) of each entry in `directory` matching any of `patterns`,
+    using one directory listing. Empty if the directory does not exist."""
+    try:
+        with os.scandir(directory) as it:
+            entries = [
+                e
+                for e in it
+                if any(fnmatch.fnmatch(e.name, p) for p in patterns)
+                and not any(fnmatch.fnmatch(e.name, p) for p in exclude)
+            ]
+    except FileNotFoundError:
+        return []
+    stats = [(e.name, e.stat()) for e in entries]
+    return sorted((name, st.st_mtime_ns, st.st_size) for name, st in stats)
+
+
+# The sorting segments table, and the sorting's metadata, are small text files at the
+# top of the sorting folder or one level down. The sorting's (large) outputs are not
+# read by `legacy_sorting.load_slice_table_from_sorting_folder`, so are not
+# fingerprinted.
+_SORTING_TABLE_PATTERNS = ["*.htsv", "*.tsv", "*.csv", "*.yaml", "*.yml", "*.json"]
+
+
+def _list_sorting_tables(sorting_dir: Path) -> list[tuple[str, int, int]]:
+    """Like `_list_matching`, for the files the sorting segments table is loaded from.
+    Nested files are listed directly, since rewriting them does not change the mtime of
+    any top-level entry."""
+    try:
+        with os.scandir(sorting_dir) as it:
+            subdirs = sorted(e.name for e in it if e.is_dir())
+    except FileNotFoundError:
+        return []
+    entries = _list_matching(sorting_dir, _SORTING_TABLE_PATTERNS)
+    for subdir in subdirs:
+        entries += [
+            (f"{subdir}/{name}", mtime_ns, size)
+            for name, mtime_ns, size in _list_matching(
+                sorting_dir / subdir, _SORTING_TABLE_PATTERNS
+            )
+        ]
+    return entries
+
+
+def get_hypnogram_cache_key(
+    project: SGLXProject,
+    experiment: str,
+    subject: SGLXSubject,
+    probe: str,
+    **flags,
+) -> str:
+    """Fingerprint everything `load_hypnogram` reads for the given flags: the mtime and
+    size of hypnogram, edits, artifact, sync, and params (for fallback) files, and of
+    the sorting segments table, and the SGLX file indexes. This costs a few directory
+    listings, rather than reading and reconciling every source."""
+    h = hashlib.sha256()
+    h.update(
+        json.dumps(
+            dict(
+                version=HYPNOGRAM_CACHE_VERSION,
+                subject=subject.name,
+                experiment=experiment,
+                probe=probe,
+                **flags,
+            ),
+            sort_keys=True,
+        ).encode()
+    )
+    exp_subj_dir = projects.get_experiment_subject_directory(
+        project, experiment, subject.name
+    )
+    patterns = ["*hypnogram*", Files.AP_SYNC, Files.LF_SYNC]
+    if (
+        flags["include_lf_consolidated_artifacts"]
+        or flags["include_ap_consolidated_artifacts"]
+    ):
+        patterns.append(f"{probe}.*artifacts*")
+    if flags["fallback"]:
+        patterns.append(constants.Files.EXPERIMENT_PARAMS)
+    for entry in _list_matching(
+        exp_subj_dir, patterns, exclude=("*condition_hypnograms*",)
+    ):
+        h.update(repr(entry).encode())
+    if flags["include_sorting_nodata"]:
+        sorting_dir = projects.get_alias_subject_directory(
+            project, experiment, "full", subject.name
+        )
+        for entry in _list_sorting_tables(sorting_dir / f"sorting.{probe}"):
+            h.update(repr(entry).encode())
+    for stream in ["lf", "ap"]:
+        if flags[f"include_{stream}_sglx_filetable_nodata"]:
+            key = sglx_index.get_index_key(subject.name, experiment, probe, stream)
+            h.update(key.encode())
+    return h.hexdigest()[:20]
+
+
 def load_hypnogram(
     project: SGLXProject,
     experiment: str,
@@ -198,6 +376,9 @@ def load_hypnogram(
     include_ap_sglx_filetable_nodata: bool = True,
     simplify: bool = True,
     fallback: bool = False,
+    use_cache: bool = True,
+    start_time: float | None = None,
+    end_time: float | None = None,
 ) -> hyp.FloatHypnogram:
     """Load a FloatHypnogram reconciled with EphyViewer edits, LF/AP/sorting artifacts,
      and NoData periods marked.
@@ -257,61 +438,192 @@ def load_hypnogram(
         If true, simplifes the consolidated hypnogram immeidately upon loading, before
         any reconcilition with artifacts, nodata, or ephyviewer edits is attempted. Also
         determines whether ephyviewer edits will be simplified upon loading.
+    use_cache: bool
+        If true, return the result of an earlier call with the same arguments from the
+        on-disk cache, as long as none of its sources have changed since. See
+        `get_hypnogram_cache_key`.
+    start_time, end_time: float | None
+        If given, only load the part of the hypnogram in this window, as if the full
+        hypnogram had been loaded and then trimmed with `FloatHypnogram.trim`. With
+        `use_cache`, only the rows overlapping the window are read from the cached full
+        hypnogram, which is built and cached first if needed, so that every later
+        window is cheap. Without it, every source is restricted to the window as it is
+        read, so only bouts overlapping it are reconciled.
     """
-    hg = load_consolidated_hypnogram(
-        project, experiment, subject.name, probe, simplify=simplify, fallback=fallback
+    flags = dict(
+        include_ephyviewer_edits=include_ephyviewer_edits,
+        include_sorting_nodata=include_sorting_nodata,
+        include_lf_consolidated_artifacts=include_lf_consolidated_artifacts,
+        include_ap_consolidated_artifacts=include_ap_consolidated_artifacts,
+        include_lf_sglx_filetable_nodata=include_lf_sglx_filetable_nodata,
+        include_ap_sglx_filetable_nodata=include_ap_sglx_filetable_nodata,
+        simplify=simplify,
+        fallback=fallback,
     )
+    return load_hypnogram_variants(
+        project,
+        experiment,
+        subject,
+        probe,
+        {"hg": flags},
+        use_cache=use_cache,
+        start_time=start_time,
+        end_time=end_time,
+    )["hg"]
 
-    # Reconcile ephyviewer edits first, so that they can't accidentally override
-    # any artifact/nodata sources.
-    if include_ephyviewer_edits:
-        edits = _load_ephyviewer_hypnogram_edits(
-            project, experiment, subject.name, simplify=simplify
+
+def _get_hypnogram_cache_file(
+    project: SGLXProject, experiment: str, subject: SGLXSubject, probe: str, flags: dict
+) -> Path:
+    key = get_hypnogram_cache_key(project, experiment, subject, probe, **flags)
+    prefix = f"{subject.name}-{experiment}-{probe}-{_get_flags_key(flags)}"
+    return get_hypnogram_cache_directory() / f"{prefix}-{key}.pqt"
+
+
+def _read_cached_hypnogram(
+    cache_file: Path, start_time: float | None = None, end_time: float | None = None
+) -> hyp.FloatHypnogram:
+    # Let parquet skip row groups (and rows) outside the window.
+    filters = []
+    if start_time is not None:
+        filters.append(("end_time", ">", start_time))
+    if end_time is not None:
+        filters.append(("start_time", "<", end_time))
+    df = pd.read_parquet(cache_file, filters=filters or None)
+    return hyp.FloatHypnogram(_clip(df, start_time, end_time))
+
+
+def _write_cached_hypnogram(hg: hyp.FloatHypnogram, cache_file: Path):
+    tmp_file = cache_file.with_suffix(f".{os.getpid()}.tmp")
+    hg._df.to_parquet(tmp_file, index=False)
+    os.replace(tmp_file, cache_file)  # Atomic, in case of concurrent jobs
+    prefix = cache_file.name.rsplit("-", 1)[0]
+    for f in cache_file.parent.glob(f"{prefix}-*.pqt"):
+        if f != cache_file:  # Built from older sources
+            f.unlink(missing_ok=True)
+
+
+class _SubjectSources:
+    """The probe-agnostic sources of one subject's hypnograms (i.e. the EphyViewer
+    edits), each loaded at most once and shared between probes. Thread-safe."""
+
+    def __init__(self, project: SGLXProject, experiment: str, subject: SGLXSubject):
+        self.project = project
+        self.experiment = experiment
+        self.subject = subject
+        self._edits: dict[tuple, hyp.FloatHypnogram] = {}
+        self._lock = threading.Lock()
+
+    def get_ephyviewer_edits(
+        self,
+        simplify: bool,
+        start_time: float | None = None,
+        end_time: float | None = None,
+    ) -> hyp.FloatHypnogram:
+        key = (simplify, start_time, end_time)
+        with self._lock:
+            if key not in self._edits:
+                self._edits[key] = _load_ephyviewer_hypnogram_edits(
+                    self.project,
+                    self.experiment,
+                    self.subject.name,
+                    simplify=simplify,
+                    start_time=start_time,
+                    end_time=end_time,
+                )
+            return self._edits[key]
+
+
+def load_hypnogram_sources(
+    project: SGLXProject,
+    experiment: str,
+    subject: SGLXSubject,
+    probe: str,
+    include_ephyviewer_edits: bool = True,
+    include_sorting_nodata: bool = True,
+    include_lf_consolidated_artifacts: bool = True,
+    include_ap_consolidated_artifacts: bool = True,
+    include_lf_sglx_filetable_nodata: bool = True,
+    include_ap_sglx_filetable_nodata: bool = True,
+    simplify: bool = True,
+    fallback: bool = False,
+    shared: _SubjectSources | None = None,
+    start_time: float | None = None,
+    end_time: float | None = None,
+) -> list[tuple[str, hyp.FloatHypnogram]]:
+    """Load the sources that `load_hypnogram` reconciles, as (name, hypnogram) pairs, in
+    increasing order of priority. See `load_hypnogram` for the parameters, and for why
+    the sources are in this order. Probe-agnostic sources are taken from `shared`, if
+    given, so that they are only loaded once per subject.
+
+    If a window is given, each source is restricted to it as soon as it is read: the
+    edits, sorting segments, and SGLX file tables before any further processing, and
+    the consolidated hypnogram and artifacts (read whole by `ecephys`) right after
+    loading."""
+
+    def clip(hg: hyp.FloatHypnogram) -> hyp.FloatHypnogram:
+        return hyp.FloatHypnogram(_clip(hg._df, start_time, end_time))
+
+    sources = [
+        (
+            "consolidated",
+            clip(
+                load_consolidated_hypnogram(
+                    project,
+                    experiment,
+                    subject.name,
+                    probe,
+                    simplify=simplify,
+                    fallback=fallback,
+                )
+            ),
         )
-        hg = hg.reconcile(edits, how="other")
+    ]
+
+    # Ephyviewer edits come first, so that they can't accidentally override any
+    # artifact/nodata sources.
+    if include_ephyviewer_edits:
+        shared = shared or _SubjectSources(project, experiment, subject)
+        edits = shared.get_ephyviewer_edits(simplify, start_time, end_time)
+        sources.append(("ephyviewer_edits", edits))
 
     if include_sorting_nodata:
         try:
-            nodata = _get_nodata_from_sorting(project, subject, experiment, probe)
-            hg = hg.reconcile(nodata, how="other")
+            nodata = _get_nodata_from_sorting(
+                project, subject, experiment, probe, start_time, end_time
+            )
+            sources.append(("sorting_nodata", nodata))
         except FileNotFoundError:
             print(f"Sorting NoData not found for {subject} {experiment} {probe}.")
 
-    if include_lf_consolidated_artifacts:
-        artifacts = sglx_utils.load_consolidated_artifacts(
-            project, experiment, subject.name, probe, "lf", simplify=True
-        )
-        hg = hg.reconcile(_artifacts_as_hypnogram(artifacts), how="other")
-
-    if include_ap_consolidated_artifacts:
-        artifacts = sglx_utils.load_consolidated_artifacts(
-            project, experiment, subject.name, probe, "ap", simplify=True
-        )
-        hg = hg.reconcile(_artifacts_as_hypnogram(artifacts), how="other")
-
-    if include_lf_sglx_filetable_nodata:
-        nodata = _get_nodata_from_sglx_filetable(
-            project, experiment, subject, probe, "lf"
-        )
-        hg = hg.reconcile(nodata, how="other")
-
-    if include_ap_sglx_filetable_nodata:
-        nodata = _get_nodata_from_sglx_filetable(
-            project, experiment, subject, probe, "ap"
-        )
-        hg = hg.reconcile(nodata, how="other")
+    for stream, include in [
+        ("lf", include_lf_consolidated_artifacts),
+        ("ap", include_ap_consolidated_artifacts),
+    ]:
+        if include:
+            artifacts = sglx_utils.load_consolidated_artifacts(
+                project, experiment, subject.name, probe, stream, simplify=True
+            )
+            artifacts = _artifacts_as_hypnogram(artifacts)
+            sources.append((f"{stream}_consolidated_artifacts", clip(artifacts)))
+
+    for stream, include in [
+        ("lf", include_lf_sglx_filetable_nodata),
+        ("ap", include_ap_sglx_filetable_nodata),
+    ]:
+        if include:
+            nodata = _get_nodata_from_sglx_filetable(
+                project, experiment, subject, probe, stream, start_time, end_time
+            )
+            sources.append((f"{stream}_sglx_filetable_nodata", nodata))
 
-    return hyp.FloatHypnogram.clean(hg.reset_index(drop=True))
+    return sources
 
 
-def get_liberal_hypnogram(
-    project: SGLXProject, experiment: str, subject: SGLXSubject, probe: str
-) -> hyp.FloatHypnogram:
-    return load_hypnogram(
-        project,
-        experiment,
-        subject,
-        probe,
+# Flags for the two standard variants. See `get_liberal_hypnogram` and
+# `get_conservative_hypnogram`.
+LIBERAL: Final[MappingProxyType[str, bool]] = MappingProxyType(
+    dict(
         include_ephyviewer_edits=True,
         include_sorting_nodata=False,
         include_lf_consolidated_artifacts=False,
@@ -321,16 +633,9 @@ def get_liberal_hypnogram(
         simplify=True,
         fallback=True,
     )
-
-
-def get_conservative_hypnogram(
-    project: SGLXProject, experiment: str, subject: SGLXSubject, probe: str
-) -> hyp.FloatHypnogram:
-    return load_hypnogram(
-        project,
-        experiment,
-        subject,
-        probe,
+)
+CONSERVATIVE: Final[MappingProxyType[str, bool]] = MappingProxyType(
+    dict(
         include_ephyviewer_edits=True,
         include_sorting_nodata=True,
         include_lf_consolidated_artifacts=True,
@@ -342,3 +647,217 @@ def get_conservative_hypnogram(
     )
     # TODO: Some subjects for experiments other than "novel_objects_deprivation" do not
     # have prb_sync.ap.htsv and the prerequisite {prb}.ap.barcodes.htsv files yet.
+)
+_SOURCE_FLAGS = {
+    "ephyviewer_edits": "include_ephyviewer_edits",
+    "sorting_nodata": "include_sorting_nodata",
+    "lf_consolidated_artifacts": "include_lf_consolidated_artifacts",
+    "ap_consolidated_artifacts": "include_ap_consolidated_artifacts",
+    "lf_sglx_filetable_nodata": "include_lf_sglx_filetable_nodata",
+    "ap_sglx_filetable_nodata": "include_ap_sglx_filetable_nodata",
+}
+
+
+def _get_variant_flags(flags: Mapping[str, bool]) -> dict[str, bool]:
+    """Fill in any flags not given with `load_hypnogram`'s defaults."""
+    defaults = {
+        name: param.default
+        for name, param in inspect.signature(load_hypnogram).parameters.items()
+        if name.startswith("include_") or name in ("simplify", "fallback")
+    }
+    unknown = set(flags) - set(defaults)
+    if unknown:
+        raise ValueError(f"Unknown hypnogram flags: {unknown}")
+    return defaults | dict(flags)
+
+
+def _reconcile_variants(
+    sources: list[tuple[str, hyp.FloatHypnogram]],
+    variants: dict[str, dict[str, bool]],
+) -> dict[str, hyp.FloatHypnogram]:
+    """Reconcile the subset of `sources` used by each variant. Where one variant's
+    sources are a prefix of another's (e.g. liberal and conservative), the longer one is
+    reconciled starting from the shorter one's (uncleaned) result, rather than from
+    scratch."""
+    selected = {
+        name: [
+            (src, hg)
+            for src, hg in sources
+            if src == "consolidated" or flags[_SOURCE_FLAGS[src]]
+        ]
+        for name, flags in variants.items()
+    }
+    intermediates: dict[tuple[str, ...], pd.DataFrame] = {}
+    hgs = {}
+    for name in sorted(selected, key=lambda n: len(selected[n])):
+        src_names = tuple(src for src, _ in selected[name])
+        if src_names not in intermediates:
+            prefix = max(
+                (k for k in intermediates if src_names[: len(k)] == k),
+                key=len,
+                default=(),
+            )
+            dfs = [hg._df for _, hg in selected[name][len(prefix) :]]
+            if prefix:
+                dfs.insert(0, intermediates[prefix])
+            intermediates[src_names] = reconcile.reconcile_by_priority(dfs)
+        hgs[name] = hyp.FloatHypnogram.clean(
+            hyp.FloatHypnogram(intermediates[src_names].copy())
+        )
+    return hgs
+
+
+def load_hypnogram_variants(
+    project: SGLXProject,
+    experiment: str,
+    subject: SGLXSubject,
+    probe: str,
+    variants: Mapping[str, Mapping[str, bool]] = MappingProxyType(
+        {"liberal": LIBERAL, "conservative": CONSERVATIVE}
+    ),
+    use_cache: bool = True,
+    shared: _SubjectSources | None = None,
+    start_time: float | None = None,
+    end_time: float | None = None,
+) -> dict[str, hyp.FloatHypnogram]:
+    """Load several variants of `load_hypnogram` at once, loading each source only once.
+
+    Parameters:
+    ===========
+    project, experiment, subject, probe:
+        As for `load_hypnogram`.
+    variants: Mapping[str, Mapping[str, bool]]
+        Maps each variant's name to its `load_hypnogram` flags (`include_*`, `simplify`,
+        `fallback`). Flags not given take `load_hypnogram`'s defaults.
+        Default: {"liberal": LIBERAL, "conservative": CONSERVATIVE}.
+    use_cache: bool
+        As for `load_hypnogram`. Sources are only loaded for variants not in the cache.
+    shared: _SubjectSources | None
+        Probe-agnostic sources to reuse, as passed by `load_hypnograms_many`. Loaded
+        as needed if None.
+    start_time, end_time: float | None
+        As for `load_hypnogram`.
+
+    Returns:
+    ========
+    {variant name: hypnogram}
+    """
+    variants = {name: _get_variant_flags(flags) for name, flags in variants.items()}
+    hgs = {}
+    cache_files = {}
+    if use_cache:
+        for name, flags in variants.items():
+            cache_files[name] = _get_hypnogram_cache_file(
+                project, experiment, subject, probe, flags
+            )
+            if cache_files[name].exists():
+                hgs[name] = _read_cached_hypnogram(
+                    cache_files[name], start_time, end_time
+                )
+
+    # On a cache miss, build and cache the full hypnogram, and then read the window
+    # from the cache, rather than reconciling just the window and caching nothing.
+    # Without the cache, push the window down into the sources instead.
+    window = (None, None) if use_cache else (start_time, end_time)
+
+    # The consolidated hypnogram and edits depend on `simplify` and `fallback`, so
+    # sources can only be shared between variants that agree on these.
+    todo = [name for name in variants if name not in hgs]
+    groups: dict[tuple[bool, bool], list[str]] = {}
+    for name in todo:
+        key = (variants[name]["simplify"], variants[name]["fallback"])
+        groups.setdefault(key, []).append(name)
+    for (simplify, fallback), names in groups.items():
+        union = {
+            flag: any(variants[name][flag] for name in names)
+            for flag in _SOURCE_FLAGS.values()
+        }
+        sources = load_hypnogram_sources(
+            project,
+            experiment,
+            subject,
+            probe,
+            simplify=simplify,
+            fallback=fallback,
+            shared=shared,
+            start_time=window[0],
+            end_time=window[1],
+            **union,
+        )
+        computed = _reconcile_variants(sources, {n: variants[n] for n in names})
+        for name, hg in computed.items():
+            if use_cache:
+                _write_cached_hypnogram(hg, cache_files[name])
+                if start_time is not None or end_time is not None:
+                    hg = _read_cached_hypnogram(cache_files[name], start_time, end_time)
+            hgs[name] = hg
+
+    return {name: hgs[name] for name in variants}
+
+
+def load_hypnograms_many(
+    project: SGLXProject,
+    experiment: str,
+    subject: SGLXSubject,
+    probes: Sequence[str],
+    variants: Mapping[str, Mapping[str, bool]] = MappingProxyType(
+        {"liberal": LIBERAL, "conservative": CONSERVATIVE}
+    ),
+    use_cache: bool = True,
+    max_workers: int | None = None,
+    start_time: float | None = None,
+    end_time: float | None = None,
+) -> dict[str, dict[str, hyp.FloatHypnogram]]:
+    """Load hypnogram variants for many probes of a subject at once.
+
+    Probe-agnostic sources (the EphyViewer edits) are loaded once and reused for every
+    probe. Per-probe sources still have to be loaded for each probe, but the SGLX file
+    tables they are derived from are shared through `sglx_index`.
+
+    Parameters:
+    ===========
+    project, experiment, subject:
+        As for `load_hypnogram`.
+    probes: Sequence[str]
+        The probes to load hypnograms for.
+    variants, use_cache, start_time, end_time:
+        As for `load_hypnogram_variants`.
+    max_workers: int | None
+        If given, load probes concurrently, in a thread pool of this size. Loading is
+        mostly I/O-bound, so this helps most on network filesystems.
+
+    Returns:
+    ========
+    {probe: {variant name: hypnogram}}
+    """
+    shared = _SubjectSources(project, experiment, subject)
+
+    def load(probe: str) -> dict[str, hyp.FloatHypnogram]:
+        return load_hypnogram_variants(
+            project,
+            experiment,
+            subject,
+            probe,
+            variants,
+            use_cache,
+            shared=shared,
+            start_time=start_time,
+            end_time=end_time,
+        )
+
+    if max_workers is None or len(probes) < 2:
+        return {probe: load(probe) for probe in probes}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return dict(zip(probes, executor.map(load, probes)))
+
+
+def get_liberal_hypnogram(
+    project: SGLXProject, experiment: str, subject: SGLXSubject, probe: str
+) -> hyp.FloatHypnogram:
+    return load_hypnogram(project, experiment, subject, probe, **LIBERAL)
+
+
+def get_conservative_hypnogram(
+    project: SGLXProject, experiment: str, subject: SGLXSubject, probe: str
+) -> hyp.FloatHypnogram:
+    return load_hypnogram(project, experiment, subject, probe, **CONSERVATIVE)
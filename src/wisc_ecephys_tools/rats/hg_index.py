@@ -0,0 +1,185 @@
+"""
+Interval indexes for labelling timestamps (spike times, LFP sample times) with the
+hypnogram state or conditions they fall in.
+
+Iterating over a hypnogram bout by bout, masking the timestamps in each, costs a full
+pass over the timestamps per bout. These indexes instead sort the bout boundaries once,
+and label any number of timestamps with one binary search each:
+
+- `StateIndex`, built from one hypnogram (e.g. from `exp_hgs.load_hypnogram`), labels
+  each timestamp with the uint8 code of the state of the bout containing it.
+- `ConditionIndex`, built from many possibly overlapping hypnograms (e.g. from
+  `cnd_hgs.compute_statistical_condition_hypnograms`), labels each timestamp with a
+  uint64 bitmask of the conditions containing it. The condition boundaries split time
+  into elementary segments, each with a fixed set of conditions, so overlapping
+  conditions (e.g. "SD" and "Early.SD") cost nothing extra.
+
+Bouts are half-open, [start_time, end_time). Timestamps are processed in chunks, so
+temporaries stay small even for tens of millions of timestamps.
+
+Example:
+    idx = StateIndex.from_hypnogram(hg)
+    is_nrem = idx.get_mask(spike_times, ["NREM"])
+
+    cidx = ConditionIndex.from_hypnograms(condition_hgs)
+    bits = cidx.label(spike_times)
+    in_early_sd = cidx.get_mask(spike_times, "Early.SD")
+"""
+
+from collections.abc import Mapping, Sequence
+
+import numpy as np
+import pandas as pd
+
+from ecephys import hypnogram as hyp
+from wisc_ecephys_tools.rats.compact_hgs import CompactHypnogram
+
+NO_STATE = np.iinfo(np.uint8).max  # Code for timestamps outside any bout
+CHUNK_SIZE = 2**22
+
+
+def _chunks(n: int, chunk_size: int = CHUNK_SIZE):
+    for i in range(0, n, chunk_size):
+        yield slice(i, min(i + chunk_size, n))
+
+
+def _as_compact(hg: hyp.FloatHypnogram | CompactHypnogram | pd.DataFrame):
+    return (
+        hg if isinstance(hg, CompactHypnogram) else CompactHypnogram.from_hypnogram(hg)
+    )
+
+
+class StateIndex:
+    """Labels timestamps with the state of the (non-overlapping) bout containing them.
+
+    Args:
+        hg: A hypnogram of sorted, non-overlapping bouts.
+    """
+
+    def __init__(self, hg: CompactHypnogram):
+        self._starts = hg.start_time
+        self._ends = hg.end_time
+        self._codes = hg.codes
+        self.states = hg.states
+
+    @classmethod
+    def from_hypnogram(
+        cls, hg: hyp.FloatHypnogram | CompactHypnogram | pd.DataFrame
+    ) -> "StateIndex":
+        return cls(_as_compact(hg))
+
+    def locate(self, times: np.ndarray) -> np.ndarray:
+        """Position of the bout containing each time, or -1 if none does."""
+        times = np.asarray(times, dtype=np.float64)
+        out = np.empty(len(times), dtype=np.int64)
+        for sl in _chunks(len(times)):
+            t = times[sl]
+            i = np.searchsorted(self._starts, t, side="right") - 1
+            valid = i >= 0
+            valid[valid] = t[valid] < self._ends[i[valid]]
+            out[sl] = np.where(valid, i, -1)
+        return out
+
+    def label(self, times: np.ndarray) -> np.ndarray:
+        """The uint8 code (a position in `states`) of each time's state, or `NO_STATE`
+        for times outside any bout."""
+        times = np.asarray(times, dtype=np.float64)
+        out = np.empty(len(times), dtype=np.uint8)
+        codes = np.append(self._codes, np.uint8(NO_STATE))  # Position -1 -> NO_STATE
+        for sl in _chunks(len(times)):
+            out[sl] = codes[self.locate(times[sl])]
+        return out
+
+    def label_states(self, times: np.ndarray) -> pd.Categorical:
+        """Each time's state name, as a categorical, NaN outside any bout."""
+        codes = self.label(times).astype(np.int16)
+        codes[codes == NO_STATE] = -1
+        return pd.Categorical.from_codes(codes, categories=self.states)
+
+    def get_mask(self, times: np.ndarray, states: Sequence[str]) -> np.ndarray:
+        """Whether each time falls in a bout of one of `states`."""
+        wanted = np.zeros(len(self.states) + 1, dtype=bool)  # Last is NO_STATE
+        wanted[[self.states.index(s) for s in states if s in self.states]] = True
+        codes = self.label(times)
+        return wanted[np.minimum(codes, len(self.states))]
+
+
+class ConditionIndex:
+    """Labels timestamps with the set of (possibly overlapping) conditions containing
+    them, as a bitmask: bit i is set if the time falls in `conditions[i]`.
+
+    Args:
+        boundaries: Sorted, unique times splitting time into elementary segments.
+        segment_bits: The bitmask of each segment [boundaries[i], boundaries[i + 1]).
+        conditions: Condition names, in bit order.
+    """
+
+    MAX_CONDITIONS = 64
+
+    def __init__(
+        self,
+        boundaries: np.ndarray,
+        segment_bits: np.ndarray,
+        conditions: tuple[str, ...],
+    ):
+        self._boundaries = boundaries
+        # Pad so that times before the first or after the last boundary map to 0.
+        pad = np.zeros(1, dtype=np.uint64)
+        self._bits = np.concatenate([pad, segment_bits.astype(np.uint64), pad])
+        self.conditions = conditions
+
+    @classmethod
+    def from_hypnograms(
+        cls,
+        hgs: Mapping[str, hyp.FloatHypnogram | CompactHypnogram | pd.DataFrame],
+    ) -> "ConditionIndex":
+        """Build the index from condition hypnograms, keyed by condition name."""
+        if len(hgs) > cls.MAX_CONDITIONS:
+            raise ValueError(
+                f"At most {cls.MAX_CONDITIONS} conditions are supported, got {len(hgs)}."
+            )
+        compact = {cnd: _as_compact(hg) for cnd, hg in hgs.items()}
+        boundaries = np.unique(
+            np.concatenate(
+                [
+                    np.concatenate([hg.start_time, hg.end_time])
+                    for hg in compact.values()
+                ]
+                or [np.empty(0)]
+            )
+        )
+        n_segments = max(len(boundaries) - 1, 0)
+        segment_bits = np.zeros(n_segments, dtype=np.uint64)
+        for bit, hg in enumerate(compact.values()):
+            # Mark the segments covered by this condition's bouts with a difference
+            # array. Bouts within a condition don't overlap, but may touch.
+            delta = np.zeros(n_segments + 1, dtype=np.int32)
+            np.add.at(delta, np.searchsorted(boundaries, hg.start_time), 1)
+            np.add.at(delta, np.searchsorted(boundaries, hg.end_time), -1)
+            covered = np.cumsum(delta[:-1]) > 0
+            segment_bits[covered] |= np.uint64(1) << np.uint64(bit)
+        return cls(boundaries, segment_bits, tuple(compact))
+
+    def label(self, times: np.ndarray) -> np.ndarray:
+        """The uint64 bitmask of the conditions containing each time."""
+        times = np.asarray(times, dtype=np.float64)
+        out = np.empty(len(times), dtype=np.uint64)
+        for sl in _chunks(len(times)):
+            # Position 0 is before the first boundary, and the last after the last.
+            out[sl] = self._bits[np.searchsorted(self._boundaries, times[sl], "right")]
+        return out
+
+    def get_bit(self, condition: str) -> np.uint64:
+        return np.uint64(1) << np.uint64(self.conditions.index(condition))
+
+    def get_mask(self, times: np.ndarray, condition: str) -> np.ndarray:
+        """Whether each time falls in `condition`."""
+        return (self.label(times) & self.get_bit(condition)) != 0
+
+    def get_memberships(self, times: np.ndarray) -> pd.DataFrame:
+        """One boolean column per condition. This takes one byte per time and
+        condition, so prefer `label` or `get_mask` for very many times."""
+        bits = self.label(times)
+        return pd.DataFrame(
+            {cnd: (bits & self.get_bit(cnd)) != 0 for cnd in self.conditions}
+        )
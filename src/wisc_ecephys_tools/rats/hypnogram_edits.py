@@ -0,0 +1,298 @@
+"""
+An append-only journal of EphyViewer hypnogram edits, with a compacted snapshot.
+
+The EphyViewer encoder used to rewrite `Files.HYPNOGRAM_EPHYVIEWER_EDITS` in full on
+every save, and every hypnogram load re-parsed, simplified, and condensed the whole
+file. Instead, edits are now stored in two files, in the experiment-subject directory:
+
+- The journal (`Files.HYPNOGRAM_EPHYVIEWER_EDITS_JOURNAL`), a CSV with one row per edit
+  operation (seq, op, time, duration, label). Saving from the viewer only appends the
+  operations made since the last save. An "add" labels [time, time + duration],
+  overriding anything there before; a "delete" clears it.
+- The snapshot (`Files.HYPNOGRAM_EPHYVIEWER_EDITS_SNAPSHOT`), a parquet file holding the
+  result of replaying the journal up to some byte offset, in three variants: "raw" (the
+  edits as shown in the viewer), "condensed", and "simplified" (simplified, then
+  condensed). The offset and the last sequence number replayed are stored in the
+  parquet metadata.
+
+Readers load one variant of the snapshot and replay only the journal past its offset,
+which stays short, because the snapshot is recompacted whenever the tail grows past
+`COMPACT_AFTER` operations. The journal itself is never rewritten, so a crash or a
+concurrent writer can never lose an edit that was already saved.
+
+If neither file exists yet, the legacy edits CSV (if any) is used as the snapshot.
+
+Example:
+    store = get_edit_store(project, "novel_objects_deprivation", "CNPIX2-Segundo")
+    store.load("simplified", start_time=0.0, end_time=3600.0)
+"""
+
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from ecephys.wne.sglx import SGLXProject
+
+from ecephys import hypnogram as hyp
+from ecephys import wne
+from wisc_ecephys_tools import constants, projects
+from wisc_ecephys_tools.rats import reconcile
+
+JOURNAL_COLUMNS = ["seq", "op", "time", "duration", "label"]
+VARIANTS = ("raw", "condensed", "simplified")
+COMPACT_AFTER = 200  # Journal operations past the snapshot
+CONDENSE_THRESHOLD = 0.1  # Seconds
+
+_HG_COLUMNS = ["state", "start_time", "end_time", "duration"]
+_DELETED = "__deleted__"
+_METADATA_KEY = b"wisc_ecephys_tools.hypnogram_edits"
+
+
+def _empty_hypnogram() -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "state": pd.Series([], dtype=object),
+            "start_time": pd.Series([], dtype=np.float64),
+            "end_time": pd.Series([], dtype=np.float64),
+            "duration": pd.Series([], dtype=np.float64),
+        }
+    )
+
+
+def _merge_neighbors(df: pd.DataFrame) -> pd.DataFrame:
+    """Merge touching bouts with the same state."""
+    if df.empty:
+        return df
+    new_run = (df["state"] != df["state"].shift()) | (
+        df["start_time"] != df["end_time"].shift()
+    )
+    run = new_run.cumsum()
+    df = df.groupby(run, sort=False).agg(
+        state=("state", "first"),
+        start_time=("start_time", "first"),
+        end_time=("end_time", "last"),
+    )
+    df["duration"] = df["end_time"] - df["start_time"]
+    return df.reset_index(drop=True)
+
+
+def replay(base: pd.DataFrame, ops: pd.DataFrame) -> pd.DataFrame:
+    """Apply journal operations, in order, to a hypnogram of edits.
+
+    Args:
+        base: Edits with state, start_time, and end_time columns.
+        ops: Journal rows, with op, time, duration, and label columns.
+
+    Returns:
+        The resulting edits, with touching bouts of the same state merged.
+    """
+    if ops.empty:
+        return _merge_neighbors(base[_HG_COLUMNS].reset_index(drop=True))
+    ops = pd.DataFrame(
+        {
+            "state": np.where(ops["op"] == "delete", _DELETED, ops["label"]),
+            "start_time": ops["time"].to_numpy(np.float64),
+            "end_time": (ops["time"] + ops["duration"]).to_numpy(np.float64),
+        }
+    )
+    # Later operations override earlier ones, like later rows of a reconcile source.
+    df = reconcile.reconcile_by_priority([base, ops])
+    df = df[df["state"] != _DELETED].reset_index(drop=True)
+    return _merge_neighbors(df)
+
+
+def _condense(df: pd.DataFrame) -> pd.DataFrame:
+    if df.empty:
+        return df
+    return hyp.condense(df, CONDENSE_THRESHOLD)[_HG_COLUMNS]
+
+
+def _simplify(df: pd.DataFrame) -> pd.DataFrame:
+    if df.empty:
+        return df
+    return hyp.FloatHypnogram(df).replace_states(wne.SIMPLIFIED_STATES)._df[_HG_COLUMNS]
+
+
+def _derive(raw: pd.DataFrame, variant: str) -> pd.DataFrame:
+    if variant == "raw":
+        return raw
+    if variant == "condensed":
+        return _condense(raw)
+    return _condense(_merge_neighbors(_simplify(raw)))
+
+
+class HypnogramEditStore:
+    """The journal and snapshot of one experiment-subject's EphyViewer edits.
+
+    Args:
+        directory: The experiment-subject directory holding the edits.
+    """
+
+    def __init__(self, directory: str | Path):
+        directory = Path(directory)
+        self.journal_file = (
+            directory / constants.Files.HYPNOGRAM_EPHYVIEWER_EDITS_JOURNAL
+        )
+        self.snapshot_file = (
+            directory / constants.Files.HYPNOGRAM_EPHYVIEWER_EDITS_SNAPSHOT
+        )
+        self.legacy_file = directory / constants.Files.HYPNOGRAM_EPHYVIEWER_EDITS
+
+    def exists(self) -> bool:
+        return (
+            self.snapshot_file.exists()
+            or self.journal_file.exists()
+            or self.legacy_file.exists()
+        )
+
+    def read_snapshot_metadata(self) -> dict:
+        """The snapshot's journal offset (in bytes) and last sequence number. Both are
+        0 if there is no snapshot yet."""
+        if not self.snapshot_file.exists():
+            return {"offset": 0, "seq": 0}
+        metadata = pq.read_schema(self.snapshot_file).metadata or {}
+        return json.loads(metadata[_METADATA_KEY])
+
+    def read_snapshot(
+        self,
+        variant: str = "raw",
+        start_time: float | None = None,
+        end_time: float | None = None,
+    ) -> pd.DataFrame:
+        """Read one variant of the snapshot, or of the legacy CSV if there is no
+        snapshot. If a window is given, only bouts overlapping it are read."""
+        if variant not in VARIANTS:
+            raise ValueError(f"Unknown variant {variant}. Expected one of {VARIANTS}.")
+        if not self.snapshot_file.exists():
+            return _derive(self._read_legacy(), variant)
+        filters = [("variant", "==", variant)]
+        if start_time is not None:
+            filters.append(("end_time", ">", start_time))
+        if end_time is not None:
+            filters.append(("start_time", "<", end_time))
+        df = pd.read_parquet(self.snapshot_file, filters=filters)
+        return df[_HG_COLUMNS].astype({"state": object}).reset_index(drop=True)
+
+    def _read_legacy(self) -> pd.DataFrame:
+        if not self.legacy_file.exists():
+            return _empty_hypnogram()
+        df = pd.read_csv(self.legacy_file, sep=",")
+        df = df.rename({"time": "start_time", "label": "state"}, axis=1)
+        df["end_time"] = df["start_time"] + df["duration"]
+        return df[_HG_COLUMNS]
+
+    def read_tail(self, offset: int | None = None) -> pd.DataFrame:
+        """Read the journal operations past `offset` (by default, the snapshot's)."""
+        if offset is None:
+            offset = self.read_snapshot_metadata()["offset"]
+        if not self.journal_file.exists() or self.journal_file.stat().st_size <= offset:
+            return pd.DataFrame(columns=JOURNAL_COLUMNS)
+        with open(self.journal_file, "rb") as f:
+            if offset == 0:
+                return pd.read_csv(f)
+            f.seek(offset)
+            return pd.read_csv(f, header=None, names=JOURNAL_COLUMNS)
+
+    def load(
+        self,
+        variant: str = "raw",
+        start_time: float | None = None,
+        end_time: float | None = None,
+    ) -> pd.DataFrame:
+        """Load the current edits: the snapshot plus the journal's tail.
+
+        Args:
+            variant: "raw", "condensed", or "simplified". For the latter two, the tail
+                is replayed onto the already-condensed snapshot, which may differ from
+                condensing from scratch by up to `CONDENSE_THRESHOLD` around new edits,
+                until the next compaction.
+            start_time, end_time: If given, only edits overlapping this window are
+                loaded. They are not clipped to it.
+
+        Returns:
+            A frame with state, start_time, end_time, and duration columns.
+        """
+        base = self.read_snapshot(variant, start_time, end_time)
+        ops = self.read_tail()
+        if ops.empty:
+            return base
+        if start_time is not None:
+            ops = ops[ops["time"] + ops["duration"] > start_time]
+        if end_time is not None:
+            ops = ops[ops["time"] < end_time]
+        if variant == "simplified":
+            ops = ops.assign(label=ops["label"].replace(wne.SIMPLIFIED_STATES))
+        df = replay(base, ops)
+        return df if variant == "raw" else _condense(df)
+
+    def append(self, ops: pd.DataFrame, compact: bool = True) -> int:
+        """Append operations to the journal.
+
+        Args:
+            ops: Operations, with op ("add" or "delete"), time, duration, and label
+                columns, in the order they were made.
+            compact: Whether to compact, if the tail has grown past `COMPACT_AFTER`.
+
+        Returns:
+            The sequence number of the last operation appended.
+        """
+        tail = self.read_tail()
+        last_seq = (
+            int(tail["seq"].iloc[-1])
+            if len(tail)
+            else self.read_snapshot_metadata()["seq"]
+        )
+        ops = ops[JOURNAL_COLUMNS[1:]].copy()
+        ops.insert(0, "seq", np.arange(last_seq + 1, last_seq + 1 + len(ops)))
+        write_header = not self.journal_file.exists()
+        # One write per save, so that concurrent appends don't interleave.
+        text = ops.to_csv(index=False, header=write_header, float_format="%.6f")
+        with open(self.journal_file, "a") as f:
+            f.write(text)
+        if compact and len(tail) + len(ops) > COMPACT_AFTER:
+            self.compact()
+        return last_seq + len(ops)
+
+    def compact(self, raw: pd.DataFrame | None = None):
+        """Fold the journal's tail into a new snapshot.
+
+        Args:
+            raw: If given, use these edits as the snapshot's content, instead of
+                replaying the tail. For when the viewer's state can't be expressed as
+                journal operations (e.g. after filling blanks).
+        """
+        meta = self.read_snapshot_metadata()
+        offset = self.journal_file.stat().st_size if self.journal_file.exists() else 0
+        tail = self.read_tail(meta["offset"])
+        seq = int(tail["seq"].iloc[-1]) if len(tail) else meta["seq"]
+        if raw is None:
+            raw = replay(self.read_snapshot("raw"), tail)
+        else:
+            raw = _merge_neighbors(raw[_HG_COLUMNS].reset_index(drop=True))
+        df = pd.concat(
+            [_derive(raw, v).assign(variant=v) for v in VARIANTS], ignore_index=True
+        )
+        df["variant"] = pd.Categorical(df["variant"], categories=VARIANTS)
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        table = table.replace_schema_metadata(
+            {
+                **(table.schema.metadata or {}),
+                _METADATA_KEY: json.dumps({"offset": offset, "seq": seq}).encode(),
+            }
+        )
+        tmp = self.snapshot_file.with_suffix(f".{os.getpid()}.tmp")
+        pq.write_table(table, tmp)
+        os.replace(tmp, self.snapshot_file)  # Atomic, in case of concurrent readers
+
+
+def get_edit_store(
+    project: SGLXProject, experiment: str, subject: str
+) -> HypnogramEditStore:
+    """Get the edit store for an experiment-subject in `project`."""
+    return HypnogramEditStore(
+        projects.get_experiment_subject_directory(project, experiment, subject)
+    )
@@ -0,0 +1,399 @@
+"""
+A persistent, on-disk table of data readiness flags for every subject/experiment/probe,
+so that auditing the cohort does not cost one NFS round trip per `utils.has_*` check.
+
+Each row of the manifest records one (check, subject, experiment, probe) flag, along
+with the project it was checked against, the file or directory that backs it, its mtime
+and size, and the mtime of its parent directory. When the manifest is refreshed, each
+parent directory is stat'ed once, and only directories whose mtime changed are
+re-listed (with a single scandir).
+
+Caveat: A directory's mtime only changes when entries are added, removed, or renamed.
+A file that is rewritten in place keeps its row (and its recorded mtime/size) until
+something else in its directory changes, or until the manifest is rebuilt with
+`incremental=False`. This is fine for readiness checks, which only care about
+existence.
+
+Flags are only served for the project they were checked against. A `utils.has_*` call
+with a different project falls through to disk.
+
+Example:
+    m = manifest.load_manifest(refresh=True)  # Build or incrementally refresh
+    utils.has_lfps(subject, experiment, probe, manifest=m)  # O(1), no NFS access
+    m.summary()  # One row per subject/experiment/probe, one column per check
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+from ecephys.wne.constants import FileExtensions, Files
+from ecephys.wne.sglx import SGLXProject
+
+from wisc_ecephys_tools import core, projects, subjects
+from wisc_ecephys_tools.rats import utils
+from wisc_ecephys_tools.rats.constants import ReadinessChecks as Checks
+from wisc_ecephys_tools.rats.constants import SleepDeprivationExperiments
+
+MANIFEST_FNAME = "readiness_manifest.pqt"
+
+_COLUMNS = [
+    "check",
+    "subject",
+    "experiment",
+    "probe",
+    "project",
+    "path",
+    "directory",
+    "directory_mtime_ns",
+    "exists",
+    "mtime",
+    "size",
+]
+
+
+def get_manifest_file() -> Path:
+    return core.get_cache_directory() / MANIFEST_FNAME
+
+
+class ReadinessManifest:
+    """Readiness flags, indexed by (check, subject, experiment, probe) for O(1) lookup."""
+
+    def __init__(self, table: pd.DataFrame):
+        self.table = table.reset_index(drop=True)
+        self._index = {
+            (check, subject, experiment, probe): (bool(exists), project)
+            for check, subject, experiment, probe, project, exists in zip(
+                self.table["check"],
+                self.table["subject"],
+                self.table["experiment"],
+                self.table["probe"],
+                self.table["project"],
+                self.table["exists"],
+            )
+        }
+
+    def lookup(
+        self,
+        check: str,
+        subject: str,
+        experiment: str,
+        probe: str | None,
+        project: SGLXProject,
+    ) -> bool | None:
+        """Return the recorded flag, or None if the manifest has no such entry, or if
+        the entry was checked against a project other than `project`."""
+        entry = self._index.get((str(check), subject, experiment, probe))
+        if entry is None or entry[1] != project.name:
+            return None
+        return entry[0]
+
+    def summary(self) -> pd.DataFrame:
+        """Wide table of flags: one row per subject/experiment/probe, one column per check.
+
+        Probe-agnostic checks (e.g. sync tables) are broadcast to every probe, and
+        prefixed with "subject_".
+        """
+        per_probe = self.table[self.table["probe"].notna()]
+        wide = per_probe.pivot_table(
+            index=["subject", "experiment", "probe"],
+            columns="check",
+            values="exists",
+            aggfunc="first",
+        )
+        agnostic = self.table[self.table["probe"].isna()].copy()
+        agnostic["check"] = "subject_" + agnostic["check"]
+        agnostic = agnostic.pivot_table(
+            index=["subject", "experiment"],
+            columns="check",
+            values="exists",
+            aggfunc="first",
+        )
+        wide = wide.join(agnostic, on=["subject", "experiment"])
+        wide.columns.name = None
+        return wide.reset_index()
+
+    def write(self, path: str | Path | None = None):
+        path = Path(path) if path is not None else get_manifest_file()
+        self.table.to_parquet(path, index=False)
+
+    @classmethod
+    def read(cls, path: str | Path | None = None) -> "ReadinessManifest":
+        path = Path(path) if path is not None else get_manifest_file()
+        table = pd.read_parquet(path)
+        table["probe"] = table["probe"].astype(object).where(table["probe"].notna())
+        if "project" not in table:  # Written before projects were recorded
+            table.insert(table.columns.get_loc("probe") + 1, "project", None)
+        return cls(table)
+
+
+def _get_check_paths(
+    subject: str,
+    experiment: str,
+    probe: str,
+    project: SGLXProject,
+    lf_project: SGLXProject,
+) -> list[tuple[str, str | None, SGLXProject, Path]]:
+    """The (check, probe, project, path) entries backing each file-based `utils.has_*`
+    check. Paths are only computed here, never touched."""
+    entries = [
+        (
+            Checks.LFPS,
+            probe,
+            lf_project,
+            projects.get_experiment_subject_file(
+                lf_project, experiment, subject, f"{probe}{FileExtensions.LFP}"
+            ),
+        ),
+        (
+            Checks.HYPNOGRAM,
+            probe,
+            project,
+            projects.get_experiment_subject_file(
+                project, experiment, subject, f"{probe}{FileExtensions.HYPNOGRAM}"
+            ),
+        ),
+        (
+            Checks.ANATOMY,
+            probe,
+            project,
+            projects.get_experiment_subject_file(
+                project, experiment, subject, f"{probe}{FileExtensions.STRUCTURES}"
+            ),
+        ),
+    ]
+    if experiment == SleepDeprivationExperiments.NOD:
+        # As of 6/23/2025, sortings have only been done for full alias of NOD.
+        entries.append(
+            (
+                Checks.SORTING,
+                probe,
+                project,
+                projects.get_alias_subject_directory(
+                    project, experiment, "full", subject
+                )
+                / f"sorting.{probe}",
+            )
+        )
+    return entries
+
+
+def _get_subject_check_paths(
+    subject: str, experiment: str, project: SGLXProject
+) -> list[tuple[str, str | None, SGLXProject, Path]]:
+    """Like `_get_check_paths`, but for probe-agnostic checks."""
+    return [
+        (
+            Checks.HYPNOGRAM,
+            None,
+            project,
+            projects.get_experiment_subject_file(
+                project, experiment, subject, Files.HYPNOGRAM
+            ),
+        ),
+        (
+            Checks.AP_SYNC_TABLE,
+            None,
+            project,
+            projects.get_experiment_subject_file(
+                project, experiment, subject, Files.AP_SYNC
+            ),
+        ),
+        (
+            Checks.LF_SYNC_TABLE,
+            None,
+            project,
+            projects.get_experiment_subject_file(
+                project, experiment, subject, Files.LF_SYNC
+            ),
+        ),
+    ]
+
+
+def _stat_directory(
+    directory: str, names: set[str], previous_mtime_ns: int | None
+) -> tuple[int | None, dict[str, os.stat_result] | None]:
+    """Stat a directory, and if its mtime differs from `previous_mtime_ns`, list it and
+    stat those of `names` that are present.
+
+    Returns (mtime_ns, {name: stat}). The listing is None if the directory is
+    unchanged, and empty if the directory does not exist.
+    """
+    try:
+        mtime_ns = os.stat(directory).st_mtime_ns
+    except FileNotFoundError:
+        return None, {}
+    if mtime_ns == previous_mtime_ns:
+        return mtime_ns, None
+    with os.scandir(directory) as it:
+        present = [entry for entry in it if entry.name in names]
+    return mtime_ns, {entry.name: entry.stat() for entry in present}
+
+
+def _get_bad_channel_flags(
+    subject: str, experiment: str, probes: list[str], params_project: SGLXProject
+) -> dict[str, bool]:
+    """Load the params file once, and check every probe against it."""
+    try:
+        params = params_project.load_experiment_subject_params(experiment, subject)
+    except FileNotFoundError:
+        return {probe: False for probe in probes}
+    return {
+        probe: "badChannels" in params.get("probes", {}).get(probe, {})
+        for probe in probes
+    }
+
+
+def build_manifest(
+    previous: ReadinessManifest | None = None,
+    experiment_filter: "subjects.index.Filter" = None,
+    project: SGLXProject | None = None,
+    lf_project: SGLXProject | None = None,
+    max_workers: int = 16,
+) -> ReadinessManifest:
+    """Build the readiness manifest, reusing entries from `previous` where possible.
+
+    Args:
+        previous: A previously built manifest. Directories whose mtime is unchanged
+            since `previous` was built are not listed again.
+        experiment_filter: Passed to `utils.get_subject_experiment_probe_tuples`.
+        project: Project holding hypnograms, anatomy, sortings, sync tables, and
+            params. Defaults to "shared", like the `utils.has_*` functions.
+        lf_project: Project holding LFPs. Defaults to "shared_nobak".
+            Each flag records the project it was checked against, and is only
+            served to `utils.has_*` calls for that same project.
+        max_workers: Number of threads used to stat/list directories concurrently.
+            NFS latency, not CPU, is the bottleneck here.
+
+    Returns:
+        The new manifest. It is not written to disk; see `load_manifest`.
+    """
+    project = project or projects.get_sglx_project("shared")
+    lf_project = lf_project or projects.get_sglx_project("shared_nobak")
+
+    sep = utils.get_subject_experiment_probe_tuples(experiment_filter=experiment_filter)
+    probes_by_subject_experiment: dict[tuple[str, str], list[str]] = {}
+    for subject, experiment, probe in sep:
+        probes_by_subject_experiment.setdefault((subject, experiment), []).append(probe)
+
+    entries = []
+    for (subject, experiment), probes in probes_by_subject_experiment.items():
+        for check, probe, prj, path in _get_subject_check_paths(
+            subject, experiment, project
+        ):
+            entries.append((check, subject, experiment, probe, prj, path))
+        for probe in probes:
+            for check, prb, prj, path in _get_check_paths(
+                subject, experiment, probe, project, lf_project
+            ):
+                entries.append((check, subject, experiment, prb, prj, path))
+
+    previous_rows = {}
+    previous_dir_mtimes = {}
+    if previous is not None:
+        for row in previous.table.itertuples(index=False):
+            if row.path is None:  # Params-derived flags are not backed by a path
+                continue
+            previous_rows[row.path] = row
+            if not pd.isna(row.directory_mtime_ns):
+                previous_dir_mtimes[row.directory] = int(row.directory_mtime_ns)
+
+    names_by_directory: dict[str, set[str]] = {}
+    for *_, path in entries:
+        names_by_directory.setdefault(str(path.parent), set()).add(path.name)
+    directories = sorted(names_by_directory)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = executor.map(
+            lambda d: _stat_directory(
+                d, names_by_directory[d], previous_dir_mtimes.get(d)
+            ),
+            directories,
+        )
+        dir_stats = dict(zip(directories, results))
+
+    rows = []
+    for check, subject, experiment, probe, prj, path in entries:
+        directory = str(path.parent)
+        dir_mtime_ns, listing = dir_stats[directory]
+        row = {
+            "check": check,
+            "subject": subject,
+            "experiment": experiment,
+            "probe": probe,
+            "project": prj.name,
+            "path": str(path),
+            "directory": directory,
+            "directory_mtime_ns": dir_mtime_ns,
+        }
+        prev = previous_rows.get(str(path))
+        if listing is None and prev is not None:  # Unchanged since previous build
+            row.update(exists=prev.exists, mtime=prev.mtime, size=prev.size)
+            rows.append(row)
+            continue
+        if listing is None:
+            # New entry in an unchanged directory (e.g. a new probe). Stat it alone.
+            try:
+                listing = {path.name: os.stat(path)}
+            except FileNotFoundError:
+                listing = {}
+        st = listing.get(path.name)
+        if st is None:
+            row.update(exists=False, mtime=float("nan"), size=-1)
+        else:
+            row.update(exists=True, mtime=st.st_mtime, size=st.st_size)
+        rows.append(row)
+
+    # Bad channels live in the params file, which has to be parsed. Do it once per
+    # subject/experiment, rather than once per probe.
+    keys = list(probes_by_subject_experiment)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        flags = executor.map(
+            lambda k: _get_bad_channel_flags(
+                k[0], k[1], probes_by_subject_experiment[k], project
+            ),
+            keys,
+        )
+        for (subject, experiment), probe_flags in zip(keys, flags):
+            for probe, flag in probe_flags.items():
+                rows.append(
+                    {
+                        "check": Checks.BAD_CHANNELS_MARKED,
+                        "subject": subject,
+                        "experiment": experiment,
+                        "probe": probe,
+                        "project": project.name,
+                        "exists": flag,
+                    }
+                )
+
+    table = pd.DataFrame(rows, columns=_COLUMNS)
+    table["check"] = table["check"].astype(str)
+    table["directory_mtime_ns"] = table["directory_mtime_ns"].astype("Int64")
+    table["size"] = table["size"].fillna(-1).astype("int64")
+    return ReadinessManifest(table)
+
+
+def load_manifest(
+    refresh: bool = False,
+    incremental: bool = True,
+    path: str | Path | None = None,
+    **build_kwargs,
+) -> ReadinessManifest:
+    """Load the readiness manifest from disk, optionally refreshing it first.
+
+    Args:
+        refresh: If True, (re)build the manifest and write it back to disk. If False
+            and no manifest exists yet, one is built.
+        incremental: If True, reuse entries from the existing manifest for
+            directories whose mtime has not changed.
+        path: Where the manifest is stored. Defaults to the user cache directory.
+        **build_kwargs: Passed to `build_manifest`.
+    """
+    path = Path(path) if path is not None else get_manifest_file()
+    if path.exists() and not refresh:
+        return ReadinessManifest.read(path)
+    previous = ReadinessManifest.read(path) if path.exists() and incremental else None
+    manifest = build_manifest(previous=previous, **build_kwargs)
+    manifest.write(path)
+    return manifest
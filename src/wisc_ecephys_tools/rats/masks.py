@@ -0,0 +1,328 @@
+"""
+Run-length boolean masks over time, for set algebra on condition hypnograms.
+
+Intersecting a condition with artifacts, with another probe's condition, or with the
+light/dark periods used to mean chains of `FloatHypnogram.reconcile`/`trim` calls, each
+copying DataFrames. A `RunLengthMask` instead holds the time covered by a hypnogram (or
+some of its states) as sorted, disjoint runs of integer ticks, at a fixed resolution:
+
+- AND, OR, NOT, and difference are one sweep over the sorted run boundaries, with
+  numpy. `intersect_all` and `union_all` take any number of masks in a single sweep,
+  rather than pairwise.
+- Durations are sums of run lengths.
+- Masks remember the exact float time of each run boundary, so converting back with
+  `to_hypnogram` is lossless: every boundary of a result is a boundary of an input, and
+  gets that input's original time back. Two input boundaries closer than the resolution
+  are merged into one (the first seen). `apply` restricts a multi-state hypnogram to a
+  mask, keeping its states.
+
+Example:
+    nrem = RunLengthMask.from_hypnogram(hgs["Early.REC.NREM"])
+    clean = nrem - RunLengthMask.from_hypnogram(artifacts)
+    both = intersect_all([RunLengthMask.from_hypnogram(h) for h in probe_hgs])
+    both.duration, both.to_hypnogram("NREM")
+"""
+
+from collections.abc import Hashable, Mapping, Sequence
+
+import numpy as np
+import pandas as pd
+
+from ecephys import hypnogram as hyp
+
+DEFAULT_RESOLUTION = 1e-3  # Seconds
+
+# Ticks of the unbounded runs produced by NOT.
+_NEG_INF = np.iinfo(np.int64).min
+_POS_INF = np.iinfo(np.int64).max
+
+
+def _frame(hg: hyp.FloatHypnogram | pd.DataFrame) -> pd.DataFrame:
+    return hg._df if isinstance(hg, hyp.FloatHypnogram) else hg
+
+
+def _coverage(
+    starts: np.ndarray, ends: np.ndarray, k: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """Runs of ticks covered by at least `k` of the given (possibly overlapping)
+    intervals, merged where they touch."""
+    keep = ends > starts
+    starts, ends = starts[keep], ends[keep]
+    if not len(starts):
+        return np.empty(0, np.int64), np.empty(0, np.int64)
+    ticks = np.concatenate([starts, ends])
+    order = np.argsort(ticks, kind="stable")
+    ticks = ticks[order]
+    count = np.cumsum(np.where(order < len(starts), 1, -1))
+    # Coverage of [ticks[i], ticks[i + 1]) is the count after the last event at
+    # ticks[i]. Deltas at the same tick are summed first, so touching runs are merged,
+    # and zero-length overlaps vanish.
+    last = np.append(ticks[1:] != ticks[:-1], True)
+    ticks, count = ticks[last], count[last]
+    active = count[:-1] >= k
+    edges = np.diff(np.concatenate([[False], active, [False]]).astype(np.int8))
+    return ticks[np.flatnonzero(edges == 1)], ticks[np.flatnonzero(edges == -1)]
+
+
+def _sorted_lookup(
+    ticks: np.ndarray, times: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """A (ticks, times) lookup, sorted by tick. Of equal ticks, the first seen wins."""
+    order = np.argsort(ticks, kind="stable")
+    return ticks[order], times[order]
+
+
+def _resolve(
+    ticks: np.ndarray, lookups: Sequence[tuple[np.ndarray, np.ndarray]]
+) -> tuple[np.ndarray, np.ndarray]:
+    """The sorted `ticks` found in any of the sorted lookups, and their exact times.
+    Earlier lookups win. One binary search per lookup, so nothing is re-sorted."""
+    times = np.full(len(ticks), np.nan)
+    for lut_ticks, lut_times in lookups:
+        i = np.searchsorted(lut_ticks, ticks)
+        found = i < len(lut_ticks)
+        found[found] = lut_ticks[i[found]] == ticks[found]
+        found &= np.isnan(times)
+        times[found] = lut_times[i[found]]
+    known = ~np.isnan(times)
+    return ticks[known], times[known]
+
+
+def _to_times(
+    ticks: np.ndarray, resolution: float, lookup: tuple[np.ndarray, np.ndarray]
+) -> np.ndarray:
+    """Convert ticks to their exact times where known, else tick * resolution."""
+    lut_ticks, lut_times = lookup
+    times = ticks * resolution
+    times[ticks == _NEG_INF] = -np.inf
+    times[ticks == _POS_INF] = np.inf
+    i = np.searchsorted(lut_ticks, ticks)
+    known = i < len(lut_ticks)
+    known[known] = lut_ticks[i[known]] == ticks[known]
+    times[known] = lut_times[i[known]]
+    return times
+
+
+def _check_resolution(masks: Sequence["RunLengthMask"]) -> float:
+    resolutions = {m.resolution for m in masks}
+    if len(resolutions) != 1:
+        raise ValueError(f"Masks must share a resolution, got {sorted(resolutions)}")
+    return resolutions.pop()
+
+
+class RunLengthMask:
+    """Sorted, disjoint, non-touching runs [starts[i], ends[i]) of integer ticks.
+
+    Args:
+        starts, ends: Run boundaries, in ticks.
+        resolution: Seconds per tick.
+        lookups: (ticks, times) pairs, each sorted by tick, giving the exact time each
+            tick stands for. Earlier lookups win. Boundaries not listed are converted as
+            tick * resolution.
+    """
+
+    __slots__ = ("starts", "ends", "resolution", "_ticks", "_times")
+
+    def __init__(
+        self,
+        starts: np.ndarray,
+        ends: np.ndarray,
+        resolution: float = DEFAULT_RESOLUTION,
+        lookups: Sequence[tuple[np.ndarray, np.ndarray]] = (),
+    ):
+        self.starts = starts
+        self.ends = ends
+        self.resolution = resolution
+        # Keep only the boundaries this mask uses, so lookups don't grow with each op.
+        # Runs don't touch, so interleaved boundaries are already sorted.
+        bounds = np.column_stack([starts, ends]).ravel()
+        self._ticks, self._times = _resolve(bounds, lookups)
+
+    @classmethod
+    def from_intervals(
+        cls,
+        starts: np.ndarray,
+        ends: np.ndarray,
+        resolution: float = DEFAULT_RESOLUTION,
+    ) -> "RunLengthMask":
+        """The union of [starts[i], ends[i]), in seconds. Intervals may overlap."""
+        starts = np.asarray(starts, dtype=np.float64)
+        ends = np.asarray(ends, dtype=np.float64)
+        start_ticks = np.rint(starts / resolution).astype(np.int64)
+        end_ticks = np.rint(ends / resolution).astype(np.int64)
+        lookup = _sorted_lookup(
+            np.concatenate([start_ticks, end_ticks]), np.concatenate([starts, ends])
+        )
+        return cls(*_coverage(start_ticks, end_ticks, 1), resolution, [lookup])
+
+    @classmethod
+    def from_hypnogram(
+        cls,
+        hg: hyp.FloatHypnogram | pd.DataFrame,
+        states: Sequence[str] | None = None,
+        resolution: float = DEFAULT_RESOLUTION,
+    ) -> "RunLengthMask":
+        """The time covered by a hypnogram's bouts, or only those of `states`."""
+        df = _frame(hg)
+        if states is not None:
+            df = df[df["state"].isin(states)]
+        return cls.from_intervals(df["start_time"], df["end_time"], resolution)
+
+    @classmethod
+    def empty(cls, resolution: float = DEFAULT_RESOLUTION) -> "RunLengthMask":
+        return cls(np.empty(0, np.int64), np.empty(0, np.int64), resolution)
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def __repr__(self) -> str:
+        return (
+            f"RunLengthMask({len(self)} runs, {self.duration:.3f} s, "
+            f"resolution={self.resolution})"
+        )
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, RunLengthMask):
+            return NotImplemented
+        return (
+            self.resolution == other.resolution
+            and np.array_equal(self.starts, other.starts)
+            and np.array_equal(self.ends, other.ends)
+        )
+
+    @property
+    def lookup(self) -> tuple[np.ndarray, np.ndarray]:
+        """The exact time of each run boundary, as sorted (ticks, times)."""
+        return self._ticks, self._times
+
+    @property
+    def start_time(self) -> np.ndarray:
+        return _to_times(self.starts, self.resolution, self.lookup)
+
+    @property
+    def end_time(self) -> np.ndarray:
+        return _to_times(self.ends, self.resolution, self.lookup)
+
+    @property
+    def duration(self) -> float:
+        """Total time covered, in seconds. Infinite if the mask is unbounded."""
+        return float(np.sum(self.end_time - self.start_time))
+
+    # --- Set algebra ---
+
+    def __and__(self, other: "RunLengthMask") -> "RunLengthMask":
+        return intersect_all([self, other])
+
+    def __or__(self, other: "RunLengthMask") -> "RunLengthMask":
+        return union_all([self, other])
+
+    def __invert__(self) -> "RunLengthMask":
+        """The complement, which is unbounded. Intersect it with a bounded mask, or
+        `trim` it, before taking its duration."""
+        bounds = np.concatenate([[_NEG_INF], self.starts, self.ends, [_POS_INF]])
+        bounds = np.sort(bounds)
+        starts, ends = bounds[0::2], bounds[1::2]
+        keep = ends > starts
+        return RunLengthMask(starts[keep], ends[keep], self.resolution, [self.lookup])
+
+    def __sub__(self, other: "RunLengthMask") -> "RunLengthMask":
+        return self & ~other
+
+    def trim(self, start: float, end: float) -> "RunLengthMask":
+        """The part of the mask within [start, end], in seconds."""
+        return self & RunLengthMask.from_intervals([start], [end], self.resolution)
+
+    # --- Back to hypnograms ---
+
+    def to_hypnogram(self, state: str = "True") -> hyp.FloatHypnogram:
+        """One bout of `state` per run."""
+        start_time, end_time = self.start_time, self.end_time
+        return hyp.FloatHypnogram(
+            pd.DataFrame(
+                {
+                    "state": np.full(len(self), state, dtype=object),
+                    "start_time": start_time,
+                    "end_time": end_time,
+                    "duration": end_time - start_time,
+                }
+            )
+        )
+
+    def apply(self, hg: hyp.FloatHypnogram | pd.DataFrame) -> hyp.FloatHypnogram:
+        """Restrict a hypnogram to the mask, keeping each bout's state. Bouts are
+        truncated, or split, where the mask starts and ends."""
+        df = _frame(hg).sort_values("start_time", kind="stable")
+        hg_starts = df["start_time"].to_numpy(np.float64)
+        hg_ends = df["end_time"].to_numpy(np.float64)
+        bout_starts = np.rint(hg_starts / self.resolution).astype(np.int64)
+        bout_ends = np.rint(hg_ends / self.resolution).astype(np.int64)
+        lookup = _sorted_lookup(
+            np.concatenate([self._ticks, bout_starts, bout_ends]),
+            np.concatenate([self._times, hg_starts, hg_ends]),
+        )
+
+        # Pieces are the overlaps of each bout with each run. Both are sorted and
+        # disjoint, so each bout's overlapping runs are found with two binary searches.
+        first = np.searchsorted(self.ends, bout_starts, side="right")
+        last = np.searchsorted(self.starts, bout_ends, side="left")  # Exclusive
+        n_pieces = np.clip(last - first, 0, None)
+        bout_ix = np.repeat(np.arange(len(df)), n_pieces)
+        run_ix = np.repeat(first, n_pieces) + (
+            np.arange(n_pieces.sum())
+            - np.repeat(np.cumsum(n_pieces) - n_pieces, n_pieces)
+        )
+        piece_starts = np.maximum(bout_starts[bout_ix], self.starts[run_ix])
+        piece_ends = np.minimum(bout_ends[bout_ix], self.ends[run_ix])
+        keep = piece_ends > piece_starts
+        start_time = _to_times(piece_starts[keep], self.resolution, lookup)
+        end_time = _to_times(piece_ends[keep], self.resolution, lookup)
+        return hyp.FloatHypnogram(
+            pd.DataFrame(
+                {
+                    "state": df["state"].to_numpy(object)[bout_ix[keep]],
+                    "start_time": start_time,
+                    "end_time": end_time,
+                    "duration": end_time - start_time,
+                }
+            )
+        )
+
+
+def _combine(masks: Sequence[RunLengthMask], k: int) -> RunLengthMask:
+    resolution = _check_resolution(masks)
+    starts, ends = _coverage(
+        np.concatenate([m.starts for m in masks]),
+        np.concatenate([m.ends for m in masks]),
+        k,
+    )
+    return RunLengthMask(starts, ends, resolution, [m.lookup for m in masks])
+
+
+def intersect_all(masks: Sequence[RunLengthMask]) -> RunLengthMask:
+    """The time covered by every mask, in one sweep."""
+    return _combine(masks, len(masks)) if masks else RunLengthMask.empty()
+
+
+def union_all(masks: Sequence[RunLengthMask]) -> RunLengthMask:
+    """The time covered by any mask, in one sweep."""
+    return _combine(masks, 1) if masks else RunLengthMask.empty()
+
+
+def masks_from_frame(
+    df: pd.DataFrame,
+    by: Sequence[str] = ("subject", "experiment", "probe", "condition"),
+    resolution: float = DEFAULT_RESOLUTION,
+) -> dict[Hashable, RunLengthMask]:
+    """One mask per group of a frame of bouts, e.g. from
+    `cnd_dataset.read_condition_hypnograms`, keyed by the values of `by`."""
+    return {
+        key: RunLengthMask.from_intervals(
+            group["start_time"], group["end_time"], resolution
+        )
+        for key, group in df.groupby(list(by), observed=True, sort=False)
+    }
+
+
+def get_durations(masks: Mapping[Hashable, RunLengthMask]) -> pd.Series:
+    """The duration of each mask, in seconds."""
+    return pd.Series({key: mask.duration for key, mask in masks.items()})
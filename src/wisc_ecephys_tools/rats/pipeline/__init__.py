@@ -1,13 +1,36 @@
-from . import (
-    consolidate_artifact_annotations,
-    consolidate_visbrain_hypnograms,
-    get_instantaneous_power,
-    get_statistical_condition_hypnograms,
-)
+# Pipeline modules are imported on first access (PEP 562), so that e.g.
+#   from wisc_ecephys_tools.rats.pipeline import get_condition_durations
+# does not pay for importing every other pipeline (and its dependencies).
+import importlib
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from . import (
+        consolidate_artifact_annotations,
+        consolidate_visbrain_hypnograms,
+        get_condition_durations,
+        get_instantaneous_power,
+        get_statistical_condition_hypnograms,
+        plot_condition_hypnograms,
+    )
 
 __all__ = [
     "consolidate_artifact_annotations",
     "consolidate_visbrain_hypnograms",
+    "get_condition_durations",
     "get_instantaneous_power",
     "get_statistical_condition_hypnograms",
+    "plot_condition_hypnograms",
 ]
+
+
+def __getattr__(name: str):
+    if name in __all__:
+        module = importlib.import_module(f"{__name__}.{name}")
+        globals()[name] = module
+        return module
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
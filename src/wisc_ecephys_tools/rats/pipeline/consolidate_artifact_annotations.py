@@ -5,9 +5,7 @@ from wisc_ecephys_tools.rats import utils
 
 def do_experiment(experiment: str):
     """Process all subjects and experiments in the project."""
-    all_ = utils.get_subject_experiment_probe_tuples(
-        experiment_filter=lambda x: x == experiment
-    )
+    all_ = utils.get_subject_experiment_probe_tuples(experiment_filter=experiment)
     for subject, experiment, probe in all_:
         print(f"Doing {subject} {experiment} {probe}")
         consolidate_artifact_annotations.do_experiment_probe(
@@ -0,0 +1,187 @@
+"""
+A cohort-wide table of statistical condition durations, for checking that every subject
+has enough of each condition (e.g. Early.REC.NREM, Late.SD).
+
+The table has one row per subject, experiment, probe, and condition, with the
+condition's total duration, in seconds. Consensus durations have probe
+`cnd_dataset.CONSENSUS_PROBE`, and also an approximate_loss (see
+`cnd_hgs.get_consensus`), which is NaN for the other rows. Subjects with a single probe
+have no consensus rows.
+
+Each experiment-subject's rows are stored with a source_key, fingerprinting the source
+hypnograms of each of its probes (see `exp_hgs.get_hypnogram_cache_key`), its params
+(see `cnd_hgs.get_period_table_key`), and the condition parameters. When the table is
+updated, only experiment-subjects whose source_key changed are recomputed, in a process
+pool.
+
+Example:
+    df = update_condition_durations()
+    df[df["condition"] == "Early.REC.NREM"].pivot_table(
+        "duration", index="subject", columns="probe"
+    )
+"""
+
+import hashlib
+import os
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import wisc_ecephys_tools as wet
+from wisc_ecephys_tools import projects
+from wisc_ecephys_tools.rats import cnd_dataset, cnd_graph, cnd_hgs, exp_hgs, utils
+from wisc_ecephys_tools.rats.constants import SleepDeprivationExperiments as Exps
+from wisc_ecephys_tools.rats.pipeline import get_statistical_condition_hypnograms
+
+DURATIONS_FORMAT_VERSION = 1
+COLUMNS = [
+    "subject",
+    "experiment",
+    "probe",
+    "condition",
+    "duration",
+    "approximate_loss",
+    "source_key",
+]
+
+
+def get_condition_durations_file(project_name: str = "shared") -> Path:
+    return projects.get_project_directory(project_name) / "condition_durations.parquet"
+
+
+def get_source_key(subject_name: str, experiment: str, probes: list[str]) -> str:
+    """Fingerprint everything an experiment-subject's condition durations depend on.
+    This costs a few directory listings per probe, rather than loading hypnograms."""
+    s3 = wet.get_sglx_project("shared")
+    subject = wet.get_sglx_subject(subject_name)
+    h = hashlib.sha256()
+    h.update(
+        repr(
+            (
+                DURATIONS_FORMAT_VERSION,
+                cnd_graph.GRAPH_VERSION,
+                sorted(
+                    get_statistical_condition_hypnograms.EXTENDED_WAKE_KWARGS.items()
+                ),
+                get_statistical_condition_hypnograms.CIRCADIAN_MATCH_TOLERANCE,
+                cnd_hgs.get_period_table_key(experiment, subject_name),
+            )
+        ).encode()
+    )
+    for probe in sorted(probes):
+        for flags in [exp_hgs.LIBERAL, exp_hgs.CONSERVATIVE]:
+            key = exp_hgs.get_hypnogram_cache_key(
+                s3, experiment, subject, probe, **flags
+            )
+            h.update(key.encode())
+    return h.hexdigest()[:20]
+
+
+def do_experiment_subject(
+    subject_name: str, experiment: str, probes: list[str], source_key: str
+) -> pd.DataFrame:
+    """Compute one experiment-subject's rows of the table."""
+    subject = wet.get_sglx_subject(subject_name)
+    _, consensus_df, prb_hgs = (
+        get_statistical_condition_hypnograms.do_experiment_subject(
+            subject, experiment, probes
+        )
+    )
+    if consensus_df is None:  # Single probe
+        df = pd.DataFrame(
+            [
+                (prb, cnd, hg["duration"].sum())
+                for prb, hgs in prb_hgs.items()
+                for cnd, hg in hgs.items()
+            ],
+            columns=["probe", "condition", "duration"],
+        )
+    else:
+        consensus_df = consensus_df.rename(
+            columns={"consensus": cnd_dataset.CONSENSUS_PROBE}
+        )
+        df = consensus_df.melt(
+            id_vars=["condition", "approximate_loss"],
+            var_name="probe",
+            value_name="duration",
+        )
+        is_consensus = df["probe"] == cnd_dataset.CONSENSUS_PROBE
+        df.loc[~is_consensus, "approximate_loss"] = float("nan")
+    df["subject"] = subject_name
+    df["experiment"] = experiment
+    df["source_key"] = source_key
+    return df.reindex(columns=COLUMNS)
+
+
+def update_condition_durations(
+    experiment_filter=Exps,
+    path: Path | None = None,
+    max_workers: int | None = None,
+) -> pd.DataFrame:
+    """Bring the condition durations table up to date, and return it.
+
+    Args:
+        experiment_filter: Passed to `utils.get_subject_experiment_probe_tuples`.
+            Rows of experiment-subjects not matching it are kept as they are.
+        path: The table. Defaults to `get_condition_durations_file()`.
+        max_workers: Number of worker processes. Defaults to the number of CPUs.
+    """
+    path = Path(path or get_condition_durations_file())
+    previous = pd.read_parquet(path) if path.exists() else pd.DataFrame(columns=COLUMNS)
+    previous_keys = dict(
+        previous.groupby(["subject", "experiment"])["source_key"].first()
+    )
+
+    probes = {}
+    for subject, experiment, probe in utils.get_subject_experiment_probe_tuples(
+        experiment_filter=experiment_filter
+    ):
+        probes.setdefault((subject, experiment), []).append(probe)
+    keys = {
+        (subj, exp): get_source_key(subj, exp, prbs)
+        for (subj, exp), prbs in probes.items()
+    }
+    stale = [se for se, key in keys.items() if previous_keys.get(se) != key]
+    print(f"Recomputing {len(stale)} of {len(keys)} experiment-subjects.")
+
+    dfs = []
+    recomputed = set()
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            (subj, exp): executor.submit(
+                do_experiment_subject, subj, exp, probes[subj, exp], keys[subj, exp]
+            )
+            for subj, exp in stale
+        }
+        for (subj, exp), future in futures.items():
+            try:
+                dfs.append(future.result())
+                recomputed.add((subj, exp))
+            except Exception as e:
+                warnings.warn(f"Skipped {subj} {exp}, keeping its previous rows: {e}")
+
+    # Replace only the rows of experiment-subjects that were recomputed. Rows of those
+    # that failed (e.g. transiently), or are outside the filter, are kept as they were,
+    # with their old source_key, so that they are retried next time.
+    is_replaced = np.array(
+        [se in recomputed for se in zip(previous["subject"], previous["experiment"])],
+        dtype=bool,
+    )
+    frames = [previous[~is_replaced]] if len(previous) else []
+    frames += dfs
+    df = (
+        pd.concat(frames, ignore_index=True)
+        if frames
+        else pd.DataFrame(columns=COLUMNS)
+    )
+    df = df.sort_values(["experiment", "subject", "probe"], kind="stable")
+    df = df.reset_index(drop=True)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    df.to_parquet(tmp, index=False)
+    os.replace(tmp, path)  # Atomic, in case of concurrent readers
+    return df
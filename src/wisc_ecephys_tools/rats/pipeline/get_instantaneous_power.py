@@ -84,7 +84,7 @@ def do_probe(
 
 def do_all_delta():
     sep = utils.get_subject_experiment_probe_tuples(
-        experiment_filter=lambda x: x in SleepDeprivationExperiments
+        experiment_filter=SleepDeprivationExperiments
     )
     nb = wet.get_sglx_project("shared_nobak")
     for subject, exp, probe in sep:
@@ -105,7 +105,7 @@ def do_all_delta():
 
 def do_all_eta():
     sep = utils.get_subject_experiment_probe_tuples(
-        experiment_filter=lambda x: x in SleepDeprivationExperiments
+        experiment_filter=SleepDeprivationExperiments
     )
     nb = wet.get_sglx_project("shared_nobak")
     for subject, exp, probe in sep:
@@ -1,9 +1,14 @@
+import warnings
+from collections.abc import Mapping, Sequence
+from concurrent.futures import ProcessPoolExecutor
+
 import ecephys.hypnogram as hyp
 import pandas as pd
 from ecephys.wne import sglx
 
 import wisc_ecephys_tools as wet
-from wisc_ecephys_tools.rats import cnd_hgs, exp_hgs
+from wisc_ecephys_tools.rats import cnd_dataset, cnd_hgs, exp_hgs, utils
+from wisc_ecephys_tools.rats.constants import SleepDeprivationExperiments as Exps
 
 EXTENDED_WAKE_KWARGS = {
     "minimum_endpoint_bout_duration": 120,
@@ -25,31 +30,28 @@ CIRCADIAN_MATCH_TOLERANCE = 30 * 60  # 30 minutes
 # where the discrepancies are.
 # Hold off on implementing either for now. It may not be necessary.
 def do_probe(
-    subject: sglx.SGLXSubject, experiment: str, probe: str
+    subject: sglx.SGLXSubject,
+    experiment: str,
+    probe: str,
+    hgs: dict[str, hyp.FloatHypnogram] | None = None,
 ) -> dict[str, hyp.FloatHypnogram]:
-    s3 = wet.get_sglx_project("shared")
-
-    lbrl_hg = exp_hgs.get_liberal_hypnogram(
-        s3,
-        experiment,
-        subject,
-        probe,
-    )
-
-    cons_hg = exp_hgs.get_conservative_hypnogram(
-        s3,
+    # Sources are loaded once, and the conservative hypnogram is built on the liberal.
+    hgs = hgs or exp_hgs.load_hypnogram_variants(
+        wet.get_sglx_project("shared"),
         experiment,
         subject,
         probe,
+        {"liberal": exp_hgs.LIBERAL, "conservative": exp_hgs.CONSERVATIVE},
     )
 
     return cnd_hgs.compute_statistical_condition_hypnograms(
-        lbrl_hg,
-        cons_hg,
+        hgs["liberal"],
+        hgs["conservative"],
         experiment,
         subject,
         extended_wake_kwargs=EXTENDED_WAKE_KWARGS,
         circadian_match_tolerance=CIRCADIAN_MATCH_TOLERANCE,
+        probe=probe,
     )
 
 
@@ -59,13 +61,25 @@ def do_experiment_subject(
     probes: list[str] | None = None,
     verbose: bool = False,
     save: bool = False,
+    max_workers: int | None = None,
 ) -> tuple[
     dict[str, hyp.FloatHypnogram],
     pd.DataFrame,
     dict[str, dict[str, hyp.FloatHypnogram]],
 ]:
     probes = probes or sglx_subject.get_experiment_probes(experiment)
-    prb_hgs = {prb: do_probe(sglx_subject, experiment, prb) for prb in probes}
+    # Load every probe's hypnograms together, so that shared sources are loaded once.
+    exp_prb_hgs = exp_hgs.load_hypnograms_many(
+        wet.get_sglx_project("shared"),
+        experiment,
+        sglx_subject,
+        probes,
+        {"liberal": exp_hgs.LIBERAL, "conservative": exp_hgs.CONSERVATIVE},
+        max_workers=max_workers,
+    )
+    prb_hgs = {
+        prb: do_probe(sglx_subject, experiment, prb, exp_prb_hgs[prb]) for prb in probes
+    }
     if save:
         s3 = wet.get_sglx_project("shared")
         for prb, hgs in prb_hgs.items():
@@ -75,6 +89,9 @@ def do_experiment_subject(
                 f"{prb}.condition_hypnograms.parquet",
             )
             cnd_hgs.save_statistical_condition_hypnograms(hgs, fpath)
+            cnd_dataset.write_condition_hypnograms(
+                hgs, experiment, sglx_subject.name, prb
+            )
     if len(prb_hgs) < 2:
         return None, None, prb_hgs
 
@@ -90,4 +107,72 @@ def do_experiment_subject(
             "consensus_condition_hypnograms.parquet",
         )
         cnd_hgs.save_statistical_condition_hypnograms(consensus_hgs, fpath)
+        cnd_dataset.write_condition_hypnograms(
+            consensus_hgs, experiment, sglx_subject.name, None
+        )
     return consensus_hgs, consensus_df, prb_hgs
+
+
+def _sweep_experiment_subject(
+    subject_name: str,
+    experiment: str,
+    probes: list[str],
+    grid: Sequence[Mapping[str, float]],
+) -> pd.DataFrame:
+    subject = wet.get_sglx_subject(subject_name)
+    exp_prb_hgs = exp_hgs.load_hypnograms_many(
+        wet.get_sglx_project("shared"),
+        experiment,
+        subject,
+        probes,
+        {"liberal": exp_hgs.LIBERAL},
+    )
+    dfs = []
+    for prb in probes:
+        df = cnd_hgs.sweep_extended_wake(
+            exp_prb_hgs[prb]["liberal"], experiment, subject, grid
+        )
+        df.insert(0, "probe", prb)
+        df.insert(0, "experiment", experiment)
+        df.insert(0, "subject", subject_name)
+        dfs.append(df)
+    return pd.concat(dfs, ignore_index=True)
+
+
+def sweep_extended_wake(
+    grid: Sequence[Mapping[str, float]],
+    experiment_filter=Exps,
+    max_workers: int | None = None,
+) -> pd.DataFrame:
+    """Evaluate a grid of extended wake kwargs (e.g. from
+    `cnd_hgs.get_extended_wake_grid`) for every probe of every subject, with
+    experiment-subjects processed in parallel.
+
+    Args:
+        experiment_filter: Passed to `utils.get_subject_experiment_probe_tuples`.
+        max_workers: Number of worker processes. Defaults to the number of CPUs.
+
+    Returns:
+        One row per subject, experiment, probe, and grid entry. See
+        `cnd_hgs.sweep_extended_wake`.
+    """
+    probes = {}
+    for subject, experiment, probe in utils.get_subject_experiment_probe_tuples(
+        experiment_filter=experiment_filter
+    ):
+        probes.setdefault((subject, experiment), []).append(probe)
+
+    dfs = []
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            (subj, exp): executor.submit(
+                _sweep_experiment_subject, subj, exp, prbs, grid
+            )
+            for (subj, exp), prbs in probes.items()
+        }
+        for (subj, exp), future in futures.items():
+            try:
+                dfs.append(future.result())
+            except Exception as e:
+                warnings.warn(f"Skipped {subj} {exp}: {e}")
+    return pd.concat(dfs, ignore_index=True) if dfs else pd.DataFrame()
@@ -0,0 +1,132 @@
+"""
+QC rendering of every subject's condition hypnograms, into one multi-page PDF.
+
+Each page is one experiment-subject, with one row per probe (and the consensus), drawn
+with `cnd_hgs.plot_condition_hgs_batched`. Each row's bouts are a single rasterized
+collection, so drawing is fast and pages stay small, however many bouts there are. Pages
+are built in worker processes, from the condition hypnogram dataset (see `cnd_dataset`),
+and saved in order by the parent process.
+
+Example:
+    render_cohort("condition_hypnograms.pdf", max_workers=8)
+"""
+
+import os
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import wisc_ecephys_tools as wet
+from wisc_ecephys_tools.rats import cnd_dataset, cnd_hgs, utils
+from wisc_ecephys_tools.rats.constants import SleepDeprivationExperiments as Exps
+
+if TYPE_CHECKING:
+    from matplotlib.figure import Figure
+
+DEFAULT_PALETTE = {
+    "BSL.Wake": "lightgray",
+    "Early.BSL.NREM": "tab:blue",
+    "Last.BSL.NREM": "lightblue",
+    "SD": "tab:orange",
+    "EXT": "tab:red",
+    "Early.REC.NREM": "tab:green",
+    "Late.REC.NREM": "lightgreen",
+    "Early.REC.NREM.Match": "tab:purple",
+    "Last.REC.NREM": "tab:olive",
+}
+
+
+def plot_experiment_subject(
+    subject_name: str,
+    experiment: str,
+    palette: dict[str, str] = DEFAULT_PALETTE,
+    root: Path | None = None,
+) -> "Figure":
+    """Plot one experiment-subject's condition hypnograms, one row per probe.
+
+    Args:
+        root: The condition hypnogram dataset. Defaults to
+            `cnd_dataset.get_condition_dataset_directory()`.
+    """
+    # Figure, rather than pyplot, so that workers don't keep figures alive.
+    from matplotlib.figure import Figure
+    from matplotlib.patches import Patch
+
+    df = cnd_dataset.read_condition_hypnograms(
+        conditions=[*palette, "Full.Liberal"],
+        experiments=experiment,
+        subjects=subject_name,
+        root=root,
+    )
+    probes = sorted(
+        df["probe"].unique(), key=lambda p: (p == cnd_dataset.CONSENSUS_PROBE, p)
+    )
+    subject = wet.get_sglx_subject(subject_name)
+
+    fig = Figure(figsize=(16, 0.8 + 0.5 * max(len(probes), 1)))
+    axes = fig.subplots(max(len(probes), 1), 1, sharex=True, squeeze=False)[:, 0]
+    for i, (ax, probe) in enumerate(zip(axes, probes)):
+        prb_df = df[df["probe"] == probe]
+        hgs = {
+            str(cnd): cnd_df
+            for cnd, cnd_df in prb_df.groupby("condition", observed=True)
+        }
+        cnd_hgs.plot_condition_hgs_batched(
+            hgs,
+            palette,
+            ax,
+            experiment=experiment if i == 0 else None,  # Lights above the top row
+            subject=subject if i == 0 else None,
+        )
+        ax.set_ylabel(probe, rotation=0, ha="right", va="center")
+    axes[-1].set_xlabel("Time (s)")
+    fig.suptitle(f"{subject_name} {experiment}")
+    fig.legend(
+        handles=[Patch(color=color, label=cnd) for cnd, color in palette.items()],
+        loc="lower center",
+        ncol=len(palette),
+        fontsize="small",
+        frameon=False,
+    )
+    return fig
+
+
+def render_cohort(
+    path: str | Path,
+    palette: dict[str, str] = DEFAULT_PALETTE,
+    experiment_filter=Exps,
+    max_workers: int | None = None,
+    dpi: int = 150,
+    root: Path | None = None,
+) -> Path:
+    """Render every experiment-subject's condition hypnograms into a multi-page PDF.
+
+    Args:
+        path: The PDF to write.
+        experiment_filter: Passed to `utils.get_subject_experiment_tuples`.
+        max_workers: Number of worker processes. Defaults to the number of CPUs.
+        dpi: Resolution of the rasterized bouts.
+        root: The condition hypnogram dataset.
+    """
+    from matplotlib.backends.backend_pdf import PdfPages
+
+    path = Path(path)
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    pairs = sorted(set(utils.get_subject_experiment_tuples(experiment_filter)))
+    with ProcessPoolExecutor(max_workers=max_workers) as executor, PdfPages(tmp) as pdf:
+        futures = {
+            (subj, exp): executor.submit(
+                plot_experiment_subject, subj, exp, palette, root
+            )
+            for subj, exp in pairs
+        }
+        for (subj, exp), future in futures.items():
+            try:
+                fig = future.result()
+            except Exception as e:
+                warnings.warn(f"Skipped {subj} {exp}: {e}")
+                continue
+            pdf.savefig(fig, dpi=dpi)
+    os.replace(tmp, path)  # Atomic, in case of concurrent readers
+    return path
@@ -0,0 +1,92 @@
+"""
+Priority-based reconciliation of many hypnograms in a single sweep.
+
+`exp_hgs.load_hypnogram` used to reconcile each of its sources into the hypnogram one at
+a time, with `FloatHypnogram.reconcile(..., how="other")`. Each call copies and re-sorts
+the whole hypnogram. Here, all sources are taken at once, in priority order, and the
+result is produced by one sweep over the sorted bout boundaries:
+
+- Every boundary of every bout splits the timeline into elementary segments.
+- Each segment takes the state of the highest-priority bout covering it. Within a
+  source, later bouts win ties, as they would if reconciled one after another.
+- Adjacent segments won by the same bout are merged back together, so a bout that is
+  partly overridden is truncated or split, exactly as with sequential reconciliation.
+
+This is O(n log n) in the total number of bouts.
+"""
+
+import heapq
+from collections.abc import Sequence
+
+import numpy as np
+import pandas as pd
+
+from ecephys import hypnogram as hyp
+
+
+def reconcile_by_priority(sources: Sequence[pd.DataFrame]) -> pd.DataFrame:
+    """Reconcile hypnograms, letting each source override all sources before it.
+
+    Args:
+        sources: Hypnogram frames, each with state, start_time, and end_time columns,
+            in increasing order of priority. The first is usually the consolidated
+            hypnogram.
+
+    Returns:
+        A frame with state, start_time, end_time, and duration columns, sorted by start
+        time, covering the union of the sources' extents.
+    """
+    starts = np.concatenate([src["start_time"].to_numpy(np.float64) for src in sources])
+    ends = np.concatenate([src["end_time"].to_numpy(np.float64) for src in sources])
+    states = np.concatenate([src["state"].to_numpy(object) for src in sources])
+    keep = ends > starts
+    starts, ends, states = starts[keep], ends[keep], states[keep]
+    # Bouts are numbered in priority order: by source, then by row within a source.
+    rank = np.arange(len(starts))
+
+    boundaries = np.unique(np.concatenate([starts, ends]))
+    if len(boundaries) < 2:
+        return pd.DataFrame(columns=["state", "start_time", "end_time", "duration"])
+    first_segment = np.searchsorted(boundaries, starts)
+    last_segment = np.searchsorted(boundaries, ends)  # Exclusive
+    n_segments = len(boundaries) - 1
+
+    # Sweep the segments, tracking the covering bouts in a max-heap by rank. Bouts that
+    # have ended are dropped lazily, when they reach the top of the heap.
+    opens = np.argsort(first_segment, kind="stable")
+    winners = np.full(n_segments, -1, dtype=np.int64)
+    heap: list[int] = []
+    j = 0
+    for seg in range(n_segments):
+        while j < len(opens) and first_segment[opens[j]] == seg:
+            heapq.heappush(heap, -rank[opens[j]])
+            j += 1
+        while heap and last_segment[-heap[0]] <= seg:
+            heapq.heappop(heap)
+        if heap:
+            winners[seg] = -heap[0]
+
+    # Merge runs of segments won by the same bout, and drop uncovered segments.
+    run_starts = np.flatnonzero(np.diff(winners, prepend=-2) != 0)
+    run_ends = np.append(run_starts[1:], n_segments)
+    run_winners = winners[run_starts]
+    covered = run_winners >= 0
+    df = pd.DataFrame(
+        {
+            "state": states[run_winners[covered]],
+            "start_time": boundaries[run_starts[covered]],
+            "end_time": boundaries[run_ends[covered]],
+        }
+    )
+    df["duration"] = df["end_time"] - df["start_time"]
+    return df
+
+
+def reconcile_sequentially(sources: Sequence[pd.DataFrame]) -> pd.DataFrame:
+    """Reference implementation: reconcile each source into the first, one at a time,
+    with `FloatHypnogram.reconcile(..., how="other")`. Only used for validation; see
+    scripts/compare_hypnogram_reconciliation.py."""
+    hg = hyp.FloatHypnogram(sources[0])
+    for src in sources[1:]:
+        hg = hg.reconcile(hyp.FloatHypnogram(src), how="other")
+    return hg._df[["state", "start_time", "end_time", "duration"]]
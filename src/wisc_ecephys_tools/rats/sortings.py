@@ -1,10 +1,13 @@
 import warnings
-
-from brainglobe_atlasapi import BrainGlobeAtlas
+from typing import TYPE_CHECKING
 
 import ecephys.utils
 from wisc_ecephys_tools import projects
 from wisc_ecephys_tools.rats import constants, utils
+from wisc_ecephys_tools.rats.manifest import ReadinessManifest
+
+if TYPE_CHECKING:
+    from brainglobe_atlasapi import BrainGlobeAtlas  # Slow. Imported where used.
 
 
 # TODO: This exists basically for backwards compatibility. This kind of logic should
@@ -12,28 +15,31 @@ from wisc_ecephys_tools.rats import constants, utils
 # TODO: experiment and alias shouldn't even be accepted as arguments, or should be
 # optional.
 def get_subject_probe_list(
-    experiment: str, alias: str, require_hypnogram_and_anatomy: bool = True
+    experiment: str,
+    alias: str,
+    require_hypnogram_and_anatomy: bool = True,
+    manifest: ReadinessManifest | None = None,
 ) -> list[tuple[str, str]]:
+    """If a readiness `manifest` is provided, checks are answered from it instead of
+    from disk. See `rats.manifest.load_manifest`."""
     assert (
         experiment == constants.SleepDeprivationExperiments.NOD and alias == "full"
     ), "As of 6/23/2025, sortings have only been done for full alias of NOD."
     s3 = projects.get_wne_project("shared")
 
     def _keep(subject: str, experiment: str, probe: str) -> bool:
-        keep = utils.has_sorting(subject, experiment, probe, s3)
+        keep = utils.has_sorting(subject, experiment, probe, s3, manifest=manifest)
         if require_hypnogram_and_anatomy:
             keep = (
                 keep
-                and utils.has_anatomy(subject, experiment, probe, s3)
+                and utils.has_anatomy(subject, experiment, probe, s3, manifest=manifest)
                 and utils.has_hypnogram(
-                    subject, experiment, None, s3
+                    subject, experiment, None, s3, manifest=manifest
                 )  # TODO: This should check for probe-specific hypnogram
             )
         return keep
 
-    sep = utils.get_subject_experiment_probe_tuples(
-        experiment_filter=lambda x: x == experiment
-    )
+    sep = utils.get_subject_experiment_probe_tuples(experiment_filter=experiment)
     lst = [(s, p) for s, e, p in sep if _keep(s, e, p)]
     return lst
 
@@ -48,7 +54,8 @@ def get_subject_probe_structure_list(
     alias: str,
     select_descendants_of: list[str] | None = None,
     exclude_descendants_of: list[str] | None = ["V", "wmt"],
-    atlas: BrainGlobeAtlas | None = None,
+    atlas: "BrainGlobeAtlas | None" = None,
+    manifest: ReadinessManifest | None = None,
 ) -> list[tuple[str, str, str]]:
     """Return [(<subj>, <prb>, <acronym>)] list of structures of interest.
 
@@ -58,6 +65,8 @@ def get_subject_probe_structure_list(
     """
 
     if atlas is None:
+        from brainglobe_atlasapi import BrainGlobeAtlas
+
         atlas = BrainGlobeAtlas("whs_sd_rat_39um", check_latest=False)
 
     if select_descendants_of is not None:
@@ -84,15 +93,19 @@ def get_subject_probe_structure_list(
         experiment,
         alias,
         require_hypnogram_and_anatomy=True,
+        manifest=manifest,
     )  # TODO: We should not require the hypnogram for any of this.
-    # TODO: This is the bottleneck. Might want to cache this.
+    # This is the bottleneck. Pass a readiness `manifest` to avoid hitting the disk.
 
     completed_subject_probe_structures = []
     unrecognized_structs = []
     for subj, prb in completed_subject_probes:
         struct = ecephys.utils.read_htsv(
-            projects.get_wne_project("shared").get_experiment_subject_file(
-                experiment, subj, f"{prb}.structures.htsv"
+            projects.get_experiment_subject_file(
+                projects.get_wne_project("shared"),
+                experiment,
+                subj,
+                f"{prb}.structures.htsv",
             )
         )
         for acronym in struct.acronym.unique():
@@ -1,13 +1,23 @@
 import re
-from typing import Literal
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Literal
 
 import ecephys.wne.sglx.utils as sglx_utils
+import pandas as pd
 from ecephys.wne.constants import FileExtensions, Files
 from ecephys.wne.sglx import SGLXProject
 
 from wisc_ecephys_tools import projects, subjects
+from wisc_ecephys_tools.snapshots import DirectorySnapshot
+from wisc_ecephys_tools.rats.constants import ReadinessChecks as Checks
 from wisc_ecephys_tools.rats.constants import SleepDeprivationExperiments
 
+if TYPE_CHECKING:
+    from wisc_ecephys_tools.rats.manifest import ReadinessManifest
+
+
+CNPIX_SUBJECT_NAME_PATTERN = re.compile(r"^CNPIX[1-9]\d*-\w+$")
+
 
 def is_valid_cnpix_subject_name(subject: str) -> bool:
     """
@@ -15,22 +25,33 @@ def is_valid_cnpix_subject_name(subject: str) -> bool:
     is_cnpix_subject("CNPIX12-Santiago") -> True
     is_cnpix_subject("ANPIX1-Sputnik") -> False
     """
-    return bool(re.match(r"^CNPIX[1-9]\d*-\w+$", subject))
+    return bool(CNPIX_SUBJECT_NAME_PATTERN.match(subject))
 
 
 def get_subject_experiment_probe_tuples(
-    experiment_filter: callable = None, expand_probes: bool = True
+    experiment_filter: "subjects.index.Filter" = None,
+    expand_probes: bool = True,
+    probe_filter: "subjects.index.Filter" = None,
 ) -> list[tuple[str, str, str]]:
-    lib = subjects.get_subject_library()
-    return lib.get_subject_experiment_probe_tuples(
-        subject_filter=is_valid_cnpix_subject_name,
-        experiment_filter=experiment_filter,
+    """Get (subject, experiment, probe) tuples for all CNPIX subjects.
+
+    Filters may be a string, a set/list of strings (or a StrEnum class), a compiled
+    regex, a `subjects.Prefix`, or a callable. See `subjects.index`. Queries are served
+    from a prebuilt index, and repeated queries are memoized.
+
+    Example:
+        get_subject_experiment_probe_tuples(experiment_filter=SleepDeprivationExperiments)
+    """
+    return subjects.get_subject_index().query(
+        subject=CNPIX_SUBJECT_NAME_PATTERN,
+        experiment=experiment_filter,
+        probe=probe_filter,
         expand_probes=expand_probes,
     )
 
 
 def get_subject_experiment_tuples(
-    experiment_filter: callable = None,
+    experiment_filter: "subjects.index.Filter" = None,
 ) -> list[tuple[str, str]]:
     tups = get_subject_experiment_probe_tuples(
         experiment_filter=experiment_filter, expand_probes=False
@@ -52,13 +73,46 @@ def _green(text):
     return f"\033[92m{text}\033[0m"
 
 
+def _lookup_or_exists(
+    manifest: "ReadinessManifest | None",
+    check: str,
+    subject: str,
+    experiment: str,
+    probe: str | None,
+    project: SGLXProject,
+    get_path: Callable[[], Path],
+) -> bool:
+    """Answer a readiness check from the manifest if possible, otherwise from disk.
+    `get_path` is only called if the manifest has no entry for the check, or if the
+    entry was checked against a project other than `project`."""
+    if manifest is not None:
+        flag = manifest.lookup(check, subject, experiment, probe, project)
+        if flag is not None:
+            return flag
+    return get_path().exists()
+
+
 def has_bad_channels_marked(
     subject: str,
     experiment: str,
     probe: str,
-    params_project: SGLXProject = projects.get_sglx_project("shared"),
+    params_project: SGLXProject | None = None,
     verbose: bool = False,
+    manifest: "ReadinessManifest | None" = None,
 ) -> bool:
+    params_project = params_project or projects.get_sglx_project("shared")
+    if manifest is not None:
+        flag = manifest.lookup(
+            Checks.BAD_CHANNELS_MARKED, subject, experiment, probe, params_project
+        )
+        if flag is not None:
+            if verbose:
+                color = _green if flag else _red
+                status = "marked" if flag else "not marked"
+                print(
+                    color(f"{subject}, {experiment}, {probe}: Bad channels {status}.")
+                )
+            return flag
     params = params_project.load_experiment_subject_params(experiment, subject)
     try:
         bad_channels = params["probes"][probe]["badChannels"]
@@ -79,13 +133,22 @@ def has_lfps(
     subject: str,
     experiment: str,
     probe: str,
-    lf_project: SGLXProject = projects.get_sglx_project("shared_nobak"),
+    lf_project: SGLXProject | None = None,
     verbose: bool = False,
+    manifest: "ReadinessManifest | None" = None,
 ) -> bool:
-    lf_file = lf_project.get_experiment_subject_file(
-        experiment, subject, f"{probe}{FileExtensions.LFP}"
-    )
-    if lf_file.exists():
+    lf_project = lf_project or projects.get_sglx_project("shared_nobak")
+    if _lookup_or_exists(
+        manifest,
+        Checks.LFPS,
+        subject,
+        experiment,
+        probe,
+        lf_project,
+        lambda: projects.get_experiment_subject_file(
+            lf_project, experiment, subject, f"{probe}{FileExtensions.LFP}"
+        ),
+    ):
         if verbose:
             print(_green(f"{subject}, {experiment}, {probe}: LFPs found"))
         return True
@@ -99,18 +162,26 @@ def has_hypnogram(
     subject: str,
     experiment: str,
     probe: str | None = None,
-    hg_project: SGLXProject = projects.get_sglx_project("shared"),
+    hg_project: SGLXProject | None = None,
     verbose: bool = False,
+    manifest: "ReadinessManifest | None" = None,
 ) -> bool:
+    hg_project = hg_project or projects.get_sglx_project("shared")
     if probe is None:
-        hg_file = hg_project.get_experiment_subject_file(
-            experiment, subject, f"{Files.HYPNOGRAM}"
-        )
+        fname = f"{Files.HYPNOGRAM}"
     else:
-        hg_file = hg_project.get_experiment_subject_file(
-            experiment, subject, f"{probe}{FileExtensions.HYPNOGRAM}"
-        )
-    if hg_file.exists():
+        fname = f"{probe}{FileExtensions.HYPNOGRAM}"
+    if _lookup_or_exists(
+        manifest,
+        Checks.HYPNOGRAM,
+        subject,
+        experiment,
+        probe,
+        hg_project,
+        lambda: projects.get_experiment_subject_file(
+            hg_project, experiment, subject, fname
+        ),
+    ):
         if verbose:
             print(_green(f"{subject}, {experiment}, {probe}: Hypnogram found"))
         return True
@@ -124,13 +195,22 @@ def has_anatomy(
     subject: str,
     experiment: str,
     probe: str,
-    project: SGLXProject = projects.get_sglx_project("shared"),
+    project: SGLXProject | None = None,
     verbose: bool = False,
+    manifest: "ReadinessManifest | None" = None,
 ) -> bool:
-    anat_file = project.get_experiment_subject_file(
-        experiment, subject, f"{probe}{FileExtensions.STRUCTURES}"
-    )
-    if anat_file.exists():
+    project = project or projects.get_sglx_project("shared")
+    if _lookup_or_exists(
+        manifest,
+        Checks.ANATOMY,
+        subject,
+        experiment,
+        probe,
+        project,
+        lambda: projects.get_experiment_subject_file(
+            project, experiment, subject, f"{probe}{FileExtensions.STRUCTURES}"
+        ),
+    ):
         if verbose:
             print(_green(f"{subject}, {experiment}, {probe}: Anatomy found"))
         return True
@@ -140,32 +220,103 @@ def has_anatomy(
         return False
 
 
+def get_sync_file_table(
+    subject: str,
+    experiment: str,
+    extension: str,
+    project: SGLXProject | None = None,
+    streams: tuple[str, ...] = ("ap", "lf"),
+    snapshot: DirectorySnapshot | None = None,
+) -> pd.DataFrame:
+    """Get every bin file of an experiment, across all probes and the requested streams,
+    along with its `extension` counterpart (e.g. FileExtensions.TTL) and whether that
+    counterpart exists.
+
+    Counterpart paths are resolved in one call, and each counterpart directory is
+    listed once, instead of stat'ing each counterpart file. Pass the same `snapshot` to
+    several calls to share directory listings between them.
+    """
+    project = project or projects.get_sglx_project("shared")
+    sglx_subject = subjects.get_sglx_subject(subject)
+    frames = [
+        sglx_subject.get_session_frame(id, ftype="bin", stream=stream)
+        for id in sglx_subject.get_experiment_session_ids(experiment)
+        for stream in streams
+    ]
+    if not frames:  # No sessions, so no bin files (and nothing missing)
+        ftab = sglx_subject.cache.iloc[:0].reset_index(drop=True)
+        ftab["counterpart"] = pd.Series(dtype=object)
+        ftab["counterpart_exists"] = pd.Series(dtype=bool)
+        return ftab
+    ftab = pd.concat(frames, ignore_index=True)
+    counterparts = sglx_utils.get_sglx_file_counterparts(
+        project, sglx_subject.name, list(ftab["path"]), extension
+    )
+    snapshot = snapshot or DirectorySnapshot()
+    ftab["counterpart"] = counterparts
+    ftab["counterpart_exists"] = snapshot.exists_many(counterparts)
+    return ftab
+
+
+def get_sync_file_summary(
+    subject: str,
+    experiment: str,
+    project: SGLXProject | None = None,
+    streams: tuple[str, ...] = ("ap", "lf"),
+) -> pd.DataFrame:
+    """Check TTL and barcode files for every probe and stream of a subject at once.
+
+    Returns one row per (probe, stream), with the number of bin files, whether all of
+    them use barcodes, and the number of missing TTL and barcode files.
+    """
+    project = project or projects.get_sglx_project("shared")
+    snapshot = DirectorySnapshot()
+    ttls = get_sync_file_table(
+        subject, experiment, FileExtensions.TTL, project, streams, snapshot
+    )
+    barcodes = get_sync_file_table(
+        subject, experiment, FileExtensions.BARCODE, project, streams, snapshot
+    )
+    ttls["barcode_exists"] = barcodes["counterpart_exists"].values
+    ttls["uses_barcodes"] = ttls["imSyncType"] == "barcode"
+    summary = ttls.groupby(["probe", "stream"]).agg(
+        n_files=("path", "size"),
+        uses_barcodes=("uses_barcodes", "all"),
+        n_ttls_found=("counterpart_exists", "sum"),
+        n_barcodes_found=("barcode_exists", "sum"),
+    )
+    summary["n_ttls_missing"] = summary["n_files"] - summary["n_ttls_found"]
+    summary["n_barcodes_missing"] = summary["n_files"] - summary["n_barcodes_found"]
+    summary["has_ttls"] = summary["n_ttls_missing"] == 0
+    summary["has_barcodes"] = summary["uses_barcodes"] & (
+        summary["n_barcodes_missing"] == 0
+    )
+    return summary.drop(columns=["n_ttls_found", "n_barcodes_found"]).reset_index()
+
+
 def has_ttls(
     subject: str,
     experiment: str,
     probe: str,
     stream: Literal["ap", "lf"],
-    project: SGLXProject = projects.get_sglx_project("shared"),
+    project: SGLXProject | None = None,
     verbose: bool = False,
+    snapshot: DirectorySnapshot | None = None,
 ) -> bool:
-    sglx_subject = subjects.get_sglx_subject(subject)
-    sessionIDs = sglx_subject.get_experiment_session_ids(experiment)
-    any_missing = False
-    for id in sessionIDs:
-        ftab = sglx_subject.get_session_frame(id, ftype="bin", stream=stream)
-        for binfile in ftab.itertuples():
-            [ttl_file] = sglx_utils.get_sglx_file_counterparts(
-                project, sglx_subject.name, [binfile.path], FileExtensions.TTL
+    project = project or projects.get_sglx_project("shared")
+    ftab = get_sync_file_table(
+        subject, experiment, FileExtensions.TTL, project, (stream,), snapshot
+    )
+    ftab = ftab[ftab["probe"] == probe]
+    missing = ftab.loc[~ftab["counterpart_exists"], "path"]
+    if verbose:
+        for path in missing:
+            print(
+                _red(
+                    f"{subject}, {experiment}, {probe}, {stream}: No TTL file found for {path}"
+                )
             )
-            if not ttl_file.exists():
-                any_missing = True
-                if verbose:
-                    print(
-                        _red(
-                            f"{subject}, {experiment}, {probe}, {stream}: No TTL file found for {binfile.path}"
-                        )
-                    )
-    if not any_missing:
+    if missing.empty:
         if verbose:
             print(_green(f"{subject}, {experiment}, {probe}: All TTLs found"))
         return True
@@ -178,30 +329,27 @@ def has_barcodes(
     experiment: str,
     probe: str,
     stream: Literal["ap", "lf"],
-    project: SGLXProject = projects.get_sglx_project("shared"),
+    project: SGLXProject | None = None,
     verbose: bool = False,
+    snapshot: DirectorySnapshot | None = None,
 ) -> bool:
-    sglx_subject = subjects.get_sglx_subject(subject)
-    sessionIDs = sglx_subject.get_experiment_session_ids(experiment)
-    any_missing = False
-    for id in sessionIDs:
-        ftab = sglx_subject.get_session_frame(id, ftype="bin", stream=stream)
-        for binfile in ftab.itertuples():
-            if binfile.imSyncType != "barcode":
-                print(f"{subject}, {experiment}, {probe}: Does not use barcodes.")
-                return False
-            [barcode_file] = sglx_utils.get_sglx_file_counterparts(
-                project, sglx_subject.name, [binfile.path], FileExtensions.BARCODE
+    project = project or projects.get_sglx_project("shared")
+    ftab = get_sync_file_table(
+        subject, experiment, FileExtensions.BARCODE, project, (stream,), snapshot
+    )
+    ftab = ftab[ftab["probe"] == probe]
+    if (ftab["imSyncType"] != "barcode").any():
+        print(f"{subject}, {experiment}, {probe}: Does not use barcodes.")
+        return False
+    missing = ftab.loc[~ftab["counterpart_exists"], "path"]
+    if verbose:
+        for path in missing:
+            print(
+                _red(
+                    f"{subject}, {experiment}, {probe}, {stream}: No barcode file found for {path}"
+                )
             )
-            if not barcode_file.exists():
-                any_missing = True
-                if verbose:
-                    print(
-                        _red(
-                            f"{subject}, {experiment}, {probe}, {stream}: No barcode file found for {binfile.path}"
-                        )
-                    )
-    if not any_missing:
+    if missing.empty:
         if verbose:
             print(_green(f"{subject}, {experiment}, {probe}: All barcodes found"))
         return True
@@ -213,12 +361,23 @@ def has_sync_table(
     subject: str,
     experiment: str,
     stream: Literal["ap", "lf"],
-    project: SGLXProject = projects.get_sglx_project("shared"),
+    project: SGLXProject | None = None,
     verbose: bool = False,
+    manifest: "ReadinessManifest | None" = None,
 ) -> bool:
+    project = project or projects.get_sglx_project("shared")
     fname = {"ap": Files.AP_SYNC, "lf": Files.LF_SYNC}[stream]
-    sync_file = project.get_experiment_subject_file(experiment, subject, fname)
-    if sync_file.exists():
+    if _lookup_or_exists(
+        manifest,
+        {"ap": Checks.AP_SYNC_TABLE, "lf": Checks.LF_SYNC_TABLE}[stream],
+        subject,
+        experiment,
+        None,
+        project,
+        lambda: projects.get_experiment_subject_file(
+            project, experiment, subject, fname
+        ),
+    ):
         if verbose:
             print(_green(f"{subject}, {experiment}: {stream.upper()} sync found"))
         return True
@@ -232,17 +391,28 @@ def has_sorting(
     subject: str,
     experiment: str,
     probe: str,
-    sorting_project: SGLXProject = projects.get_sglx_project("shared"),
+    sorting_project: SGLXProject | None = None,
     verbose: bool = False,
+    manifest: "ReadinessManifest | None" = None,
 ) -> bool:
+    sorting_project = sorting_project or projects.get_sglx_project("shared")
     assert experiment == SleepDeprivationExperiments.NOD, (
         "As of 6/23/2025, sortings have only been done for full alias of NOD."
     )
-    subject_sorting_dir = sorting_project.get_alias_subject_directory(
-        experiment, "full", subject
-    )
-    probe_sorting_dir = subject_sorting_dir / f"sorting.{probe}"
-    if probe_sorting_dir.exists():
+    if _lookup_or_exists(
+        manifest,
+        Checks.SORTING,
+        subject,
+        experiment,
+        probe,
+        sorting_project,
+        lambda: (
+            projects.get_alias_subject_directory(
+                sorting_project, experiment, "full", subject
+            )
+            / f"sorting.{probe}"
+        ),
+    ):
         if verbose:
             print(_green(f"{subject}, {experiment}, {probe}: Sorting found"))
         return True
@@ -0,0 +1,208 @@
+"""
+A persisted time-range index over the SpikeGLX bin files of a subject/experiment/probe/
+stream.
+
+`SGLXSubject.get_experiment_frame` rebuilds and re-filters the experiment's file table on
+every call. Code that only needs to know which files cover some experiment time (e.g.
+NoData inference, windowed LFP reads) can use this index instead. For each bin file, it
+holds the path, the start datetime (its fileCreateTime, to the second), the start/end
+time in the experiment's probe timebase (i.e. expmtPrbAcqFirstTime/LastTime), the
+duration, the number of samples, and the sampling rate, sorted by start time. Because a
+probe's files never overlap, "which files cover [t1, t2]" is answered with two binary
+searches. Datetimes are converted with `time_conversion`, not with this index.
+
+Indexes are stored as parquet files in the user cache directory, keyed by the contents of
+the subject library's sources (see `subjects.get_subject_library_sources`), so they are
+rebuilt automatically when the library cache is refreshed.
+
+Example:
+    idx = get_sglx_file_index(subject, "novel_objects_deprivation", "imec0", "lf")
+    idx.find(3600.0, 3660.0)  # Files overlapping the window, with sample offsets.
+"""
+
+import hashlib
+import os
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from ecephys.wne.sglx import SGLXSubject
+from ecephys.wne.sglx import utils as sglx_utils
+
+from wisc_ecephys_tools import bundles, core, subjects
+
+INDEX_FORMAT_VERSION = 1
+
+_COLUMNS = [
+    "path",
+    "session",
+    "start_datetime",
+    "start_time",
+    "end_time",
+    "duration",
+    "n_samples",
+    "fs",
+]
+
+
+def get_index_directory() -> Path:
+    index_dir = core.get_cache_directory() / "sglx_index"
+    index_dir.mkdir(parents=True, exist_ok=True)
+    return index_dir
+
+
+@lru_cache(maxsize=1)
+def _get_library_key(
+    sources: tuple[Path, ...], stamps: tuple[tuple[int, int], ...]
+) -> str:
+    # `stamps` is only part of the cache key, so that sources are re-hashed (e.g. after
+    # the library cache is refreshed in this process) whenever their mtime or size
+    # changes, but not on every call.
+    return bundles.get_bundle_key("sglx_index", sources)
+
+
+def get_index_key(subject_name: str, experiment: str, probe: str, stream: str) -> str:
+    sources = tuple(subjects.get_subject_library_sources())
+    stamps = tuple((st.st_mtime_ns, st.st_size) for st in map(os.stat, sources))
+    library_key = _get_library_key(sources, stamps)
+    h = hashlib.sha256(
+        f"{INDEX_FORMAT_VERSION}:{library_key}:{subject_name}:{experiment}:{probe}:"
+        f"{stream}".encode()
+    )
+    return h.hexdigest()[:20]
+
+
+class SGLXFileIndex:
+    """An interval index over one probe/stream's bin files.
+
+    Args:
+        table: One row per file, with the columns in `_COLUMNS`, sorted by start time.
+    """
+
+    def __init__(self, table: pd.DataFrame):
+        self.table = table.reset_index(drop=True)
+        self._starts = self.table["start_time"].to_numpy(dtype=np.float64)
+        self._ends = self.table["end_time"].to_numpy(dtype=np.float64)
+        self._start_datetimes = self.table["start_datetime"].to_numpy(
+            dtype="datetime64[ns]"
+        )
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+    @classmethod
+    def from_experiment_frame(cls, ftable: pd.DataFrame) -> "SGLXFileIndex":
+        """Build the index from `SGLXSubject.get_experiment_frame(..., ftype="bin")`."""
+        if ftable["expmtPrbAcqFirstTime"].isna().any():
+            raise sglx_utils.UnfinalizedRecordingError(
+                "sglx_index: ftable has unknown acquisition offsets (NaN "
+                "expmtPrbAcqFirstTime) from an un-finalized recording; re-finalize the "
+                "metas (ecephys.sglx.repair_metadata) or exclude the session."
+            )
+        table = pd.DataFrame(
+            {
+                "path": ftable["path"].astype(str).to_numpy(),
+                "session": ftable["session"].to_numpy(),
+                "start_datetime": pd.to_datetime(ftable["fileCreateTime"]).to_numpy(),
+                "start_time": ftable["expmtPrbAcqFirstTime"].to_numpy(np.float64),
+                "end_time": ftable["expmtPrbAcqLastTime"].to_numpy(np.float64),
+                "duration": ftable["fileDuration"].to_numpy(np.float64),
+                "n_samples": ftable["nFileSamp"].to_numpy(np.int64),
+                "fs": ftable["imSampRate"].to_numpy(np.float64),
+            }
+        )
+        return cls(table.sort_values("start_time", kind="stable"))
+
+    def slice(self, t1: float, t2: float) -> slice:
+        """Positions of the files overlapping [t1, t2], as a slice into `table`."""
+        i0 = np.searchsorted(self._ends, t1, side="left")
+        i1 = np.searchsorted(self._starts, t2, side="right")
+        return slice(int(i0), int(max(i0, i1)))
+
+    def find(self, t1: float, t2: float) -> pd.DataFrame:
+        """Files overlapping [t1, t2], with the sample offsets covering the window.
+
+        Returns:
+            The matching rows of `table`, plus `start_sample` (inclusive) and
+            `stop_sample` (exclusive), the window's sample offsets within each file.
+        """
+        rows = self.table.iloc[self.slice(t1, t2)].copy()
+        fs = rows["fs"].to_numpy()
+        n = rows["n_samples"].to_numpy()
+        starts = rows["start_time"].to_numpy()
+        rows["start_sample"] = np.clip(np.floor((t1 - starts) * fs), 0, n).astype(
+            np.int64
+        )
+        rows["stop_sample"] = np.clip(np.ceil((t2 - starts) * fs) + 1, 0, n).astype(
+            np.int64
+        )
+        return rows
+
+    def locate(self, times: np.ndarray) -> np.ndarray:
+        """Position of the file containing each time, or -1 if it falls in a gap."""
+        times = np.asarray(times, dtype=np.float64)
+        i = np.searchsorted(self._starts, times, side="right") - 1
+        valid = i >= 0
+        valid[valid] &= times[valid] <= self._ends[i[valid]]
+        return np.where(valid, i, -1)
+
+    def locate_datetimes(self, datetimes: np.ndarray) -> np.ndarray:
+        """Position of the last file that started at or before each datetime, or -1
+        if the datetime precedes every file."""
+        dts = np.asarray(datetimes, dtype="datetime64[ns]")
+        return np.searchsorted(self._start_datetimes, dts, side="right") - 1
+
+    def get_gaps(self) -> pd.DataFrame:
+        """Periods between consecutive files, in the probe timebase."""
+        gaps = pd.DataFrame(
+            {"start_time": self._ends[:-1], "end_time": self._starts[1:]}
+        )
+        gaps["duration"] = gaps["end_time"] - gaps["start_time"]
+        return gaps[gaps["duration"] > 0].reset_index(drop=True)
+
+    def write(self, path: str | Path):
+        tmp = Path(path).with_suffix(f".{os.getpid()}.tmp")
+        self.table.to_parquet(tmp, index=False)
+        os.replace(tmp, path)  # Atomic, in case of concurrent jobs
+
+    @classmethod
+    def read(cls, path: str | Path) -> "SGLXFileIndex":
+        return cls(pd.read_parquet(path))
+
+
+@lru_cache(maxsize=128)
+def _get_sglx_file_index(
+    subject_name: str, experiment: str, probe: str, stream: str, key: str
+) -> SGLXFileIndex:
+    prefix = f"{subject_name}-{experiment}-{probe}-{stream}"
+    index_file = get_index_directory() / f"{prefix}-{key}.pqt"
+    if index_file.exists():
+        return SGLXFileIndex.read(index_file)
+    subject = subjects.get_sglx_subject(subject_name)
+    ftable = subject.get_experiment_frame(
+        experiment, alias="full", probe=probe, stream=stream, ftype="bin"
+    )
+    index = SGLXFileIndex.from_experiment_frame(ftable)
+    index.write(index_file)
+    for f in get_index_directory().glob(f"{prefix}-*.pqt"):  # Built from old sources
+        if f != index_file:
+            f.unlink(missing_ok=True)
+    return index
+
+
+def get_sglx_file_index(
+    subject: SGLXSubject | str, experiment: str, probe: str, stream: str
+) -> SGLXFileIndex:
+    """Get the file index for a subject/experiment/probe/stream, building and
+    persisting it on first use.
+
+    Args:
+        subject: A subject from the default subject library, or its name.
+        experiment: The experiment. Only the "full" alias is indexed.
+        probe: e.g. "imec0".
+        stream: "ap" or "lf".
+    """
+    subject_name = subject if isinstance(subject, str) else subject.name
+    key = get_index_key(subject_name, experiment, probe, stream)
+    return _get_sglx_file_index(subject_name, experiment, probe, stream, key)
@@ -0,0 +1,62 @@
+"""
+Directory snapshots, for checking the existence of many files with one listing per
+directory, rather than one `stat` per file. Over NFS, listing a directory costs about as
+much as a single stat, so checking N files spread over D directories drops from N round
+trips to D.
+
+A snapshot reflects the state of each directory at the time it was first listed. Create
+a new snapshot (or call `clear`) to see changes made after that.
+"""
+
+import os
+from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+
+class DirectorySnapshot:
+    """Lazily lists directories with os.scandir, and answers existence queries by set
+    membership.
+
+    Example:
+        snap = DirectorySnapshot()
+        snap.prefetch(p.parent for p in paths)  # Optional: list directories concurrently
+        found = snap.exists_many(paths)
+    """
+
+    def __init__(self):
+        self._listings: dict[str, frozenset[str]] = {}
+
+    def listdir(self, directory: str | Path) -> frozenset[str]:
+        """Names of the entries in `directory`. Empty if the directory does not exist."""
+        directory = os.fspath(directory)
+        listing = self._listings.get(directory)
+        if listing is None:
+            try:
+                with os.scandir(directory) as it:
+                    listing = frozenset(entry.name for entry in it)
+            except (FileNotFoundError, NotADirectoryError):
+                listing = frozenset()
+            self._listings[directory] = listing
+        return listing
+
+    def prefetch(self, directories: Iterable[str | Path], max_workers: int = 8):
+        """List any directories not yet in the snapshot, concurrently."""
+        todo = {os.fspath(d) for d in directories} - self._listings.keys()
+        if not todo:
+            return
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            list(executor.map(self.listdir, todo))
+
+    def exists(self, path: str | Path) -> bool:
+        path = Path(path)
+        return path.name in self.listdir(path.parent)
+
+    def exists_many(self, paths: Iterable[str | Path]) -> list[bool]:
+        """Like `exists`, but for many paths. Each parent directory is listed once."""
+        paths = [Path(p) for p in paths]
+        self.prefetch(p.parent for p in paths)
+        return [self.exists(p) for p in paths]
+
+    def clear(self):
+        self._listings.clear()
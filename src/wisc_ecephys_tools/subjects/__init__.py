@@ -1,3 +1,11 @@
+from .index import Prefix, SubjectExperimentProbeIndex, get_subject_index
 from .subjects import get_sglx_subject, get_subject_library, get_subjects_directory
 
-__all__ = ["get_sglx_subject", "get_subjects_directory", "get_subject_library"]
+__all__ = [
+    "get_sglx_subject",
+    "get_subjects_directory",
+    "get_subject_library",
+    "get_subject_index",
+    "Prefix",
+    "SubjectExperimentProbeIndex",
+]
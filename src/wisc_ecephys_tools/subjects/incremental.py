@@ -0,0 +1,203 @@
+"""
+Incremental refresh of the SGLX subject library cache (wne_sglx_cache.pqt).
+
+`SGLXSubjectLibrary.refresh_cache()` rescans every session of every subject, reading
+every .meta file on the archive, even if only one new session was added. Here, each
+session's SpikeGLX directories are fingerprinted instead (latest mtime, file count, and
+total size, found by walking the directories without opening any files). Fingerprints are
+stored next to the cache, in wne_sglx_cache.fingerprints.pqt. Only sessions whose
+fingerprint changed are rescanned, by running `refresh_cache()` on a temporary library
+that contains just those sessions. Subjects are processed concurrently.
+"""
+
+import os
+import tempfile
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+import yaml
+from ecephys.wne.sglx import SGLXSubjectLibrary
+
+FINGERPRINTS_FNAME = "wne_sglx_cache.fingerprints.pqt"
+CACHE_FNAME = "wne_sglx_cache.pqt"
+
+_FINGERPRINT_COLUMNS = ["subject", "session", "mtime_ns", "n_files", "total_bytes"]
+
+
+def get_fingerprints_file(lib_dir: str | Path) -> Path:
+    return Path(lib_dir) / FINGERPRINTS_FNAME
+
+
+def read_fingerprints(lib_dir: str | Path) -> pd.DataFrame:
+    f = get_fingerprints_file(lib_dir)
+    if not f.exists():
+        return pd.DataFrame([], columns=_FINGERPRINT_COLUMNS)
+    return pd.read_parquet(f)
+
+
+def write_fingerprints(fingerprints: pd.DataFrame, lib_dir: str | Path):
+    fingerprints.to_parquet(get_fingerprints_file(lib_dir), index=False)
+
+
+def _read_subject_doc(subject_file: Path) -> dict:
+    with open(subject_file) as f:
+        return yaml.safe_load(f)
+
+
+def get_directory_fingerprint(directory: str | Path) -> tuple[int, int, int] | None:
+    """Walk a directory tree, without opening any files.
+
+    Returns:
+        (latest mtime of any directory or file, in ns; number of files; total bytes),
+        or None if the directory does not exist (e.g. its volume is not mounted).
+    """
+    try:
+        mtime_ns = os.stat(directory).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    n_files = 0
+    total_bytes = 0
+    stack = [os.fspath(directory)]
+    while stack:
+        with os.scandir(stack.pop()) as it:
+            for entry in it:
+                st = entry.stat(follow_symlinks=False)
+                mtime_ns = max(mtime_ns, st.st_mtime_ns)
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                else:
+                    n_files += 1
+                    total_bytes += st.st_size
+    return (mtime_ns, n_files, total_bytes)
+
+
+def get_session_fingerprint(session: dict) -> tuple[int, int, int] | None:
+    """Fingerprint all (usually just one) of a session's AP and LF directories.
+    None if any of them is unavailable."""
+    dirs = sorted({session["ap"], session["lf"]})
+    prints = [get_directory_fingerprint(d) for d in dirs]
+    if any(p is None for p in prints):
+        return None
+    return (
+        max(p[0] for p in prints),
+        sum(p[1] for p in prints),
+        sum(p[2] for p in prints),
+    )
+
+
+def _rescan_sessions(
+    subject: str, subject_doc: dict, session_ids: set[str], old_cache: pd.DataFrame
+) -> pd.DataFrame:
+    """Rescan only `session_ids`, using a temporary library whose only subject file
+    lists only those sessions."""
+    sessions = [s for s in subject_doc["recording_sessions"] if s["id"] in session_ids]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        with open(Path(tmp_dir) / f"{subject}.yml", "w") as f:
+            yaml.safe_dump(
+                {"recording_sessions": sessions, "experiments": {}},
+                f,
+                explicit_start=True,
+                explicit_end=True,
+                sort_keys=False,
+            )
+        # Seed the temporary library with the subject's existing rows, so that it looks
+        # exactly like the real one.
+        old_cache[old_cache["subject"] == subject].to_parquet(
+            Path(tmp_dir) / CACHE_FNAME, index=False
+        )
+        tmp_lib = SGLXSubjectLibrary(tmp_dir)
+        tmp_lib.refresh_cache()
+        return tmp_lib.cache
+
+
+def _refresh_subject(
+    subject_file: Path,
+    old_cache: pd.DataFrame,
+    old_fingerprints: pd.DataFrame,
+    force: bool,
+) -> tuple[pd.DataFrame, pd.DataFrame, list[str]]:
+    """Returns the subject's new cache rows, new fingerprints, and rescanned sessions."""
+    subject = subject_file.stem
+    doc = _read_subject_doc(subject_file)
+    sessions = doc.get("recording_sessions") or []
+
+    old_prints = old_fingerprints[old_fingerprints["subject"] == subject]
+    old_prints = {
+        row.session: (row.mtime_ns, row.n_files, row.total_bytes)
+        for row in old_prints.itertuples()
+    }
+    cached_sessions = set(old_cache.loc[old_cache["subject"] == subject, "session"])
+
+    new_prints = {s["id"]: get_session_fingerprint(s) for s in sessions}
+    # Don't drop a session just because its volume isn't mounted here, and never try to
+    # rescan it, even if forced. Keep its rows and fingerprint as they were.
+    unavailable = {id for id, fp in new_prints.items() if fp is None}
+    for id in unavailable:
+        warnings.warn(f"Data for {subject} {id} is unavailable. Not rescanning.")
+        new_prints[id] = old_prints.get(id, (0, 0, 0))
+    changed = {
+        id
+        for id, fp in new_prints.items()
+        if id not in unavailable
+        and (force or old_prints.get(id) != fp or id not in cached_sessions)
+    }
+
+    # Keep rows for unchanged sessions. Rows for sessions that were removed from the
+    # subject file are dropped.
+    keep = (old_cache["subject"] == subject) & old_cache["session"].isin(
+        set(new_prints) - changed
+    )
+    rows = [old_cache[keep]]
+    if changed:
+        rows.append(_rescan_sessions(subject, doc, changed, old_cache))
+    fingerprints = pd.DataFrame(
+        [(subject, id, *fp) for id, fp in new_prints.items()],
+        columns=_FINGERPRINT_COLUMNS,
+    )
+    return pd.concat(rows, ignore_index=True), fingerprints, sorted(changed)
+
+
+def refresh_cache(
+    lib: SGLXSubjectLibrary,
+    lib_dir: str | Path,
+    max_workers: int = 8,
+    force: bool = False,
+) -> tuple[dict[str, list[str]], pd.DataFrame]:
+    """Incrementally refresh `lib.cache`.
+
+    Like `SGLXSubjectLibrary.refresh_cache()`, this updates the library's in-memory
+    cache, but does not write it. Call `lib.write_cache()` and `write_fingerprints()`
+    together to persist it, so that the cache and fingerprints never disagree.
+
+    Args:
+        lib: The library to refresh.
+        lib_dir: The library's directory, containing the subject files and the cache.
+        max_workers: Number of subjects to fingerprint and scan concurrently.
+        force: If True, rescan every session, but still record fingerprints.
+
+    Returns:
+        changed: {subject: [rescanned session IDs]}, for subjects with any rescanned
+            sessions.
+        fingerprints: The fingerprints of every session, matching the new cache.
+    """
+    lib_dir = Path(lib_dir)
+    old_cache = lib.read_cache()
+    old_fingerprints = read_fingerprints(lib_dir)
+    subject_files = sorted(lib_dir.glob("*.yml"))
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(
+            executor.map(
+                lambda f: _refresh_subject(f, old_cache, old_fingerprints, force),
+                subject_files,
+            )
+        )
+
+    lib.cache = pd.concat([cache for cache, _, _ in results], ignore_index=True)
+    fingerprints = pd.concat([fps for _, fps, _ in results], ignore_index=True)
+    changed = {
+        f.stem: changed for f, (_, _, changed) in zip(subject_files, results) if changed
+    }
+    return changed, fingerprints
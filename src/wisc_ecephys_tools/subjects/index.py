@@ -0,0 +1,201 @@
+"""
+Indexed, declarative filtering of (subject, experiment, probe) tuples.
+
+`SGLXSubjectLibrary.get_subject_experiment_probe_tuples` evaluates its filter callables
+once per row, every time it is called. Here, the full table of tuples is built once per
+library, with an index from each subject, experiment, and probe to the rows it appears
+in. Filters are declarative, and are evaluated against the (few) unique values of a
+column, never against rows:
+
+    "CNPIX2-Segundo"              exact match
+    {"nod", "cow"} / ["nod"]      membership (also any StrEnum class)
+    re.compile(r"^CNPIX\\d+-")     regex, with `re.match` semantics
+    Prefix("CNPIX")               prefix
+    lambda x: ...                 any callable, applied to each unique value
+    None                          no filtering
+
+The rows matching each filter are then gathered from the index. Results are memoized,
+so repeated queries (e.g. at the top of every pipeline loop) are effectively free.
+
+Example:
+    idx = subjects.get_subject_index()
+    idx.query(subject=Prefix("CNPIX"), experiment={"novel_objects_deprivation"})
+"""
+
+import re
+from collections.abc import Callable, Collection
+from dataclasses import dataclass
+from enum import EnumMeta
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+from ecephys.wne.sglx import SGLXSubjectLibrary
+
+from wisc_ecephys_tools.subjects.subjects import get_subject_library
+
+
+@dataclass(frozen=True)
+class Prefix:
+    """Match values that start with `prefix`."""
+
+    prefix: str
+
+
+Filter = str | Collection[str] | re.Pattern | Prefix | Callable[[str], bool] | None
+
+_COLUMNS = ("subject", "experiment", "probe")
+
+
+def _freeze(filt: Filter):
+    """Make a filter hashable, so that query results can be memoized."""
+    if filt is None or isinstance(filt, (str, re.Pattern, Prefix)):
+        return filt
+    if isinstance(filt, (Collection, EnumMeta)):  # Enum classes are also callable
+        return frozenset(str(v) for v in filt)
+    return filt
+
+
+def _match_values(values: np.ndarray, filt) -> np.ndarray:
+    """Evaluate a (frozen) filter against an array of unique values.
+    Returns the matching values."""
+    if isinstance(filt, str):  # Also catches StrEnum members
+        return values[values == str(filt)]
+    if isinstance(filt, frozenset):
+        return values[pd.Index(values).isin(filt)]
+    if isinstance(filt, re.Pattern):
+        return values[pd.Series(values).str.match(filt).to_numpy(dtype=bool)]
+    if isinstance(filt, Prefix):
+        return values[pd.Series(values).str.startswith(filt.prefix).to_numpy(bool)]
+    if callable(filt):
+        return values[np.fromiter((bool(filt(v)) for v in values), bool, len(values))]
+    raise TypeError(f"Unsupported filter: {filt!r}")
+
+
+class SubjectExperimentProbeIndex:
+    """All (subject, experiment, probe) tuples of a library, indexed for fast filtering.
+
+    Args:
+        lib: The library to index. The index reflects the library at the time it is
+            created; build a new one after the library is refreshed.
+    """
+
+    def __init__(self, lib: SGLXSubjectLibrary):
+        expanded = lib.get_subject_experiment_probe_tuples(expand_probes=True)
+        self._expanded = expanded
+        self._table = pd.DataFrame(expanded, columns=list(_COLUMNS))
+        # Collapsed tuples are kept exactly as the library returns them, and filtered
+        # on their own subject/experiment columns, since subject/experiments without
+        # any probes have no rows in the expanded table.
+        self._collapsed = lib.get_subject_experiment_probe_tuples(expand_probes=False)
+        self._collapsed_table = pd.DataFrame(
+            [tuple(t[:2]) for t in self._collapsed], columns=["subject", "experiment"]
+        )
+        self._collapsed_keys = pd.MultiIndex.from_frame(self._collapsed_table)
+        self._positions = {
+            col: {
+                value: np.asarray(pos)
+                for value, pos in self._table.groupby(col, sort=False).indices.items()
+            }
+            for col in _COLUMNS
+        }
+        self._values = {
+            col: np.asarray(list(self._positions[col]), dtype=object)
+            for col in _COLUMNS
+        }
+        self._query = lru_cache(maxsize=256)(self._query_uncached)
+
+    def __len__(self) -> int:
+        return len(self._table)
+
+    @property
+    def table(self) -> pd.DataFrame:
+        """One row per (subject, experiment, probe). Do not modify."""
+        return self._table
+
+    def _mask(self, col: str, filt) -> np.ndarray | None:
+        if filt is None:
+            return None
+        mask = np.zeros(len(self._table), dtype=bool)
+        for value in _match_values(self._values[col], filt):
+            mask[self._positions[col][value]] = True
+        return mask
+
+    def _query_collapsed(self, subject, experiment, probe) -> tuple[tuple, ...]:
+        keep = np.ones(len(self._collapsed), dtype=bool)
+        for col, filt in (("subject", subject), ("experiment", experiment)):
+            if filt is not None:
+                values = self._collapsed_table[col]
+                keep &= values.isin(_match_values(values.unique(), filt)).to_numpy()
+        if probe is not None:
+            # A subject/experiment is kept if any of its probes matched.
+            rows = np.flatnonzero(self._mask("probe", probe))
+            keys = pd.MultiIndex.from_frame(
+                self._table.iloc[rows][["subject", "experiment"]]
+            )
+            keep &= self._collapsed_keys.isin(keys)
+        return tuple(t for t, k in zip(self._collapsed, keep) if k)
+
+    def _query_uncached(
+        self, subject, experiment, probe, expand_probes: bool
+    ) -> tuple[tuple, ...]:
+        if not expand_probes:
+            return self._query_collapsed(subject, experiment, probe)
+        masks = [
+            m
+            for m in (
+                self._mask("subject", subject),
+                self._mask("experiment", experiment),
+                self._mask("probe", probe),
+            )
+            if m is not None
+        ]
+        if not masks:
+            rows = np.arange(len(self._table))
+        else:
+            rows = np.flatnonzero(np.logical_and.reduce(masks))
+        return tuple(self._expanded[i] for i in rows)
+
+    def query(
+        self,
+        subject: Filter = None,
+        experiment: Filter = None,
+        probe: Filter = None,
+        expand_probes: bool = True,
+    ) -> list[tuple]:
+        """Get the tuples matching every filter, in library order.
+
+        Args:
+            subject, experiment, probe: Filters. See the module docstring.
+            expand_probes: If True, return one (subject, experiment, probe) tuple per
+                probe. If False, return one tuple per subject/experiment, as
+                `SGLXSubjectLibrary.get_subject_experiment_probe_tuples` does.
+
+        Returns:
+            A new list, which the caller is free to modify.
+        """
+        return list(
+            self._query(
+                _freeze(subject), _freeze(experiment), _freeze(probe), expand_probes
+            )
+        )
+
+
+# Keyed by library identity, so that a refreshed library gets a fresh index.
+_cached_index: tuple[SGLXSubjectLibrary, SubjectExperimentProbeIndex] | None = None
+
+
+def get_subject_index(
+    lib: SGLXSubjectLibrary | None = None,
+) -> SubjectExperimentProbeIndex:
+    """Get the index of a library, building it on first use.
+
+    Args:
+        lib: Defaults to `subjects.get_subject_library()`.
+    """
+    global _cached_index
+    if lib is None:
+        lib = get_subject_library()
+    if _cached_index is None or _cached_index[0] is not lib:
+        _cached_index = (lib, SubjectExperimentProbeIndex(lib))
+    return _cached_index[1]
@@ -1,19 +1,48 @@
+"""Refresh the subject library cache (wne_sglx_cache.pqt).
+
+By default, only sessions whose SpikeGLX directories changed since the last refresh are
+rescanned. See `subjects.incremental`.
+
+example:
+
+python refresh_cache.py --max-workers 16
+python refresh_cache.py --full
+"""
+
+import argparse
+
 import pandas as pd
 
 import wisc_ecephys_tools.subjects as subjects
 from ecephys.wne.sglx import SGLXSubjectLibrary
+from wisc_ecephys_tools.subjects import incremental
 
 if __name__ == "__main__":
-    lib = SGLXSubjectLibrary(subjects.get_subjects_directory())
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--full", action="store_true", help="Rescan every session of every subject."
+    )
+    parser.add_argument("--max-workers", type=int, default=8)
+    args = parser.parse_args()
+
+    lib_dir = subjects.get_subjects_directory()
+    lib = SGLXSubjectLibrary(lib_dir)
 
     previous_cache = lib.read_cache()
 
     print("Refreshing cache..", end="")
-    lib.refresh_cache()
+    changed, fingerprints = incremental.refresh_cache(
+        lib, lib_dir, max_workers=args.max_workers, force=args.full
+    )
     print("Done\n")
 
+    print("Rescanned sessions:")
+    for subject, sessions in changed.items():
+        print(f"{subject}: {', '.join(sessions)}")
+
     print("Diff with previous:")
     print(pd.concat([previous_cache, lib.cache]).drop_duplicates(keep=False))
 
     print("Writing cache.")
     lib.write_cache()
+    incremental.write_fingerprints(fingerprints, lib_dir)
@@ -3,6 +3,8 @@ from pathlib import Path
 
 from ecephys.wne.sglx import SGLXSubjectLibrary
 
+from wisc_ecephys_tools import bundles
+
 DEFAULT_SUBJECTS_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
 
 # Module-level cache for the subject library
@@ -13,12 +15,21 @@ def get_subjects_directory():
     return Path(DEFAULT_SUBJECTS_DIRECTORY)
 
 
+def get_subject_library_sources() -> list[Path]:
+    """Every file that SGLXSubjectLibrary reads when it is created."""
+    subjectsDir = get_subjects_directory()
+    return sorted(subjectsDir.glob("*.yml")) + [subjectsDir / "wne_sglx_cache.pqt"]
+
+
 def get_subject_library(force_refresh=False) -> SGLXSubjectLibrary:
-    """Get the SGLXSubjectLibrary, using an in-memory cache.
+    """Get the SGLXSubjectLibrary, using an in-memory cache backed by a compiled bundle
+    (see `wisc_ecephys_tools.bundles`). The bundle is rebuilt automatically whenever a
+    subject YAML or the parquet cache changes.
 
     Args:
-        force_refresh: If True, bypass the cache and create a new library instance,
-                      reading from the parquet file on disk. Default is False.
+        force_refresh: If True, bypass the in-memory cache and create a new library
+                      instance, reflecting the YAML and parquet files currently on
+                      disk. Default is False.
 
     Returns:
         SGLXSubjectLibrary instance
@@ -33,7 +44,11 @@ def get_subject_library(force_refresh=False) -> SGLXSubjectLibrary:
     global _cached_library
     if _cached_library is None or force_refresh:
         subjectsDir = get_subjects_directory()
-        _cached_library = SGLXSubjectLibrary(subjectsDir)
+        _cached_library = bundles.load_bundle(
+            "sglx_subject_library",
+            get_subject_library_sources(),
+            lambda: SGLXSubjectLibrary(subjectsDir),
+        )
     return _cached_library
 
 
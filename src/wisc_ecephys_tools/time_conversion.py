@@ -0,0 +1,98 @@
+"""
+Batched, cached conversion from datetimes to experiment times.
+
+Calling `SGLXSubject.dt2t` once per datetime rebuilds the experiment frame on every call.
+A `TimeConverter` is built once per subject/experiment/probe, and converts whole arrays
+of datetimes with a single `SGLXSubject.dt2t` call, so results are exactly those of
+`SGLXSubject.dt2t`.
+
+Times are in the experiment's canonical (synced) timebase. For the reference probe
+(imec0), `SGLXSubject.dt2t` already returns canonical times. For any other probe with a
+sync table, its times are mapped to the canonical timebase with the probe's time
+synchronizer.
+
+Example:
+    tc = get_time_converter(subject, "novel_objects_deprivation", "imec1")
+    tc.dt2t(pd.to_datetime(["2023-01-01 09:00", "2023-01-01 21:00"]))
+"""
+
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+from ecephys.wne.sglx import SGLXSubject
+from ecephys.wne.sglx import utils as sglx_utils
+
+from wisc_ecephys_tools import core, sglx_index, subjects
+
+# The probe whose timebase is the experiment's canonical timebase.
+REFERENCE_PROBE = "imec0"
+
+
+class TimeConverter:
+    """Converts datetimes to canonical experiment times for one probe.
+
+    Args:
+        subject: The subject.
+        experiment: The experiment.
+        probe: The probe whose files anchor the conversion.
+        t2t: Maps the probe's timebase to the canonical timebase, as returned by
+            `sglx_utils.get_time_synchronizer`. None for the reference probe.
+    """
+
+    def __init__(self, subject: SGLXSubject, experiment: str, probe: str, t2t=None):
+        self.subject = subject
+        self.experiment = experiment
+        self.probe = probe
+        self._t2t = t2t
+
+    def dt2t(self, dts):
+        """Convert datetime(s) to canonical experiment time(s), in seconds.
+
+        Args:
+            dts: A datetime-like scalar, or an array/Series/Index of them.
+
+        Returns:
+            A float if `dts` is a scalar, otherwise an array of floats.
+        """
+        scalar = np.ndim(dts) == 0
+        dts = np.atleast_1d(np.asarray(pd.to_datetime(dts), dtype="datetime64[ns]"))
+        t = self.subject.dt2t(self.experiment, self.probe, dts)
+        if self._t2t is not None:
+            t = self._t2t(t)
+        t = np.asarray(t, dtype=np.float64)
+        return float(t[0]) if scalar else t
+
+
+@lru_cache(maxsize=64)
+def _get_time_converter(
+    subject_name: str, experiment: str, probe: str, stream: str, key: str
+) -> TimeConverter:
+    subject = subjects.get_sglx_subject(subject_name)
+    t2t = None
+    if probe != REFERENCE_PROBE:
+        t2t = sglx_utils.get_time_synchronizer(
+            core.get_shared_project(), subject, experiment, probe=probe, stream=stream
+        )
+    return TimeConverter(subject, experiment, probe, t2t)
+
+
+def get_time_converter(
+    subject: SGLXSubject | str,
+    experiment: str,
+    probe: str = REFERENCE_PROBE,
+    stream: str = "ap",
+) -> TimeConverter:
+    """Get the (cached) time converter for a subject/experiment/probe.
+
+    Args:
+        subject: A subject from the default subject library, or its name.
+        experiment: The experiment.
+        probe: The reference probe, or any other probe with a sync table in the
+            shared project.
+        stream: The stream whose sync table is used, for non-reference probes.
+    """
+    subject_name = subject if isinstance(subject, str) else subject.name
+    # Keyed by the subject library, so converters are rebuilt when it is refreshed.
+    key = sglx_index.get_index_key(subject_name, experiment, probe, stream)
+    return _get_time_converter(subject_name, experiment, probe, stream, key)